@@ -1,15 +1,33 @@
 """
 イベント写真自動投稿システム - FastAPI バックエンド
 Gemini API を安全に呼び出すためのサーバー
+
+Gemini の呼び出し:
+- モデルオブジェクトは起動時に1度だけ作り、接続も使い回す
+- 同期の generate_content はスレッドプールで実行し、イベントループを塞がない
+- 同時呼び出し数は GEMINI_MAX_CONCURRENCY、1回の待ち時間は GEMINI_TIMEOUT 秒まで
+- GEMINI_API_ENDPOINT を指定するとそのURL（ローカルのフェイクGeminiなど）にRESTで接続する
+
+画像の受け取り:
+- リクエストサイズは MAX_UPLOAD_MB（画像本体）までに制限し、超えたら413
+  （Content-Length の無い chunked 送信も、受信したバイト数を数えて上限で打ち切る）
+- POST /generate-comment/upload で multipart の画像ファイルを受け付ける（base64 JSONより軽い）
+- 画像は長辺 GEMINI_IMAGE_MAX_SIZE に縮小・JPEG再エンコードしてから Gemini に送る
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from typing import BinaryIO, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import google.generativeai as genai
+from PIL import Image, ImageOps
+import asyncio
+import binascii
+import io
 import os
-import base64
 from dotenv import load_dotenv
 
 # 環境変数を読み込む
@@ -32,8 +50,104 @@ app.add_middleware(
 
 # Gemini API設定
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")  # 例: http://127.0.0.1:8081（テスト・ベンチマーク用）
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "20"))  # 1回の呼び出しの上限（秒）
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+
+gemini_model = None
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    if GEMINI_API_ENDPOINT:
+        genai.configure(
+            api_key=GEMINI_API_KEY,
+            transport="rest",
+            client_options={"api_endpoint": GEMINI_API_ENDPOINT},
+        )
+    else:
+        genai.configure(api_key=GEMINI_API_KEY)
+    # リクエスト毎に作らず使い回す（クライアント・接続も共有される）
+    gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+# generate_content（同期・ネットワーク待ち）を実行するスレッドと同時実行数の上限
+gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix="gemini")
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+
+@app.on_event("shutdown")
+def shutdown_gemini_executor():
+    gemini_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 画像アップロード設定
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024)  # 画像本体の上限
+# リクエスト全体の上限（base64は4/3倍 + data URLヘッダ・他のフィールド分）
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES * 4 // 3 + 64 * 1024
+GEMINI_IMAGE_MAX_SIZE = int(os.getenv("GEMINI_IMAGE_MAX_SIZE", "1024"))  # Geminiに送る長辺
+GEMINI_IMAGE_QUALITY = 90
+
+
+class RequestTooLarge(HTTPException):
+    """受信中の本文が上限を超えた（FastAPI の本文パース中に投げても400に化けず413になる）"""
+
+    def __init__(self):
+        super().__init__(status_code=413, detail="Request too large")
+
+
+class RequestSizeLimitMiddleware:
+    """
+    リクエスト本文を max_bytes までに制限する ASGI ミドルウェア
+
+    Content-Length が上限を超えていれば本文を読む前に413を返す。
+    Content-Length が無い（chunked）・実際の本文と違う場合も receive() で受け取ったバイト数を数え、
+    上限を超えた時点で413にする（multipart・base64 JSON のどちらも、上限を超えてメモリに溜めない）。
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise RequestTooLarge()
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except RequestTooLarge:
+            # 通常は FastAPI の例外ハンドラが413を返す。本文を直接読むハンドラなどで漏れてきた場合だけここで返す
+            if started:
+                raise
+            await self._reject(scope, receive, send)
+
+    @staticmethod
+    async def _reject(scope, receive, send):
+        await JSONResponse(status_code=413, content={"detail": "Request too large"})(scope, receive, send)
+
+
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
 
 
 class CommentRequest(BaseModel):
@@ -44,7 +158,7 @@ class CommentRequest(BaseModel):
     expression_type: str = "笑顔"
     focus_point: str = "表情"
     context_match: str = "ブースの雰囲気"
-    image_base64: Optional[str] = None  # オプション: 画像データ
+    image_base64: Optional[str] = Field(default=None, max_length=MAX_REQUEST_BYTES)  # オプション: 画像データ
 
 
 class CommentResponse(BaseModel):
@@ -137,6 +251,98 @@ def build_prompt(request: CommentRequest, has_image: bool) -> str:
     return prompt
 
 
+def _release_gemini_slot(loop: asyncio.AbstractEventLoop):
+    """gemini_semaphore の枠を返す（スレッドプール側から呼ばれる）"""
+    try:
+        loop.call_soon_threadsafe(gemini_semaphore.release)
+    except RuntimeError:
+        pass  # イベントループ終了後（シャットダウン中）
+
+
+async def call_gemini(contents) -> str:
+    """
+    Gemini でテキストを生成（スレッドプールで実行し、イベントループは塞がない）
+
+    Raises:
+        asyncio.TimeoutError: GEMINI_TIMEOUT 秒以内に応答が無い場合
+        ValueError: 応答が空の場合
+    """
+    loop = asyncio.get_running_loop()
+    call = partial(gemini_model.generate_content, contents, request_options={"timeout": GEMINI_TIMEOUT})
+    await gemini_semaphore.acquire()
+    try:
+        future = gemini_executor.submit(call)
+    except BaseException:
+        gemini_semaphore.release()
+        raise
+    # 枠はスレッドの処理が実際に終わった時点で返す（タイムアウトで待つのをやめても、
+    # スレッドが動いている間は埋まったままにして、同時呼び出し数が上限を超えないようにする）
+    future.add_done_callback(lambda _: _release_gemini_slot(loop))
+    # スレッド側も request_options の timeout で打ち切られる
+    response = await asyncio.wait_for(asyncio.wrap_future(future), GEMINI_TIMEOUT)
+    if not response.text:
+        raise ValueError("Empty response from API")
+    return response.text.strip()
+
+
+def decode_image_base64(data: str) -> bytes:
+    """
+    base64（data URL可）を1つのバッファにデコード
+
+    split(',') や b64decode(str) のように本文のコピーを作らず、
+    ASCIIバイト列に1度だけ変換し、ヘッダを飛ばした memoryview をそのままデコードする。
+    """
+    start = data.find(",", 0, 256) + 1 if data.startswith("data:") else 0
+    return binascii.a2b_base64(memoryview(data.encode("ascii"))[start:])
+
+
+def downscale_image(source: Union[bytes, BinaryIO], max_size: int = GEMINI_IMAGE_MAX_SIZE) -> bytes:
+    """
+    画像を長辺 max_size に縮小して JPEG バイト列にする
+
+    JPEGは draft() で縮小デコードするため、フル解像度の画素を展開しない。
+    """
+    image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    if image.format == "JPEG":
+        image.draft("RGB", (max_size, max_size))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=GEMINI_IMAGE_QUALITY)
+    return out.getvalue()
+
+
+async def prepare_image(source: Union[str, BinaryIO]) -> bytes:
+    """base64文字列またはアップロードファイルを、Geminiに送る縮小JPEGにする（スレッドで実行）"""
+    def run():
+        data = decode_image_base64(source) if isinstance(source, str) else source
+        return downscale_image(data)
+
+    try:
+        return await asyncio.to_thread(run)
+    except (ValueError, OSError, Image.DecompressionBombError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+
+
+async def generate(request: CommentRequest, image: Optional[bytes]) -> CommentResponse:
+    """縮小済みの画像（無ければNone）とリクエスト情報からコメントを生成"""
+    try:
+        prompt = build_prompt(request, image is not None)
+        if image is not None:
+            # 画像を含むコンテンツを生成
+            comment = await call_gemini([{"mime_type": "image/jpeg", "data": image}, prompt])
+        else:
+            # テキストのみのリクエスト
+            comment = await call_gemini(prompt)
+        return CommentResponse(comment=comment, source="ai")
+
+    except Exception as e:
+        print(f"Gemini API error: {e!r}")
+        # エラー時はルールベースでフォールバック
+        comment = generate_fallback_comment(request.expression_type)
+        return CommentResponse(comment=comment, source="rule_based")
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """ヘルスチェック"""
@@ -151,7 +357,7 @@ async def generate_comment(request: CommentRequest):
     """
     一言コメントを生成
     
-    - 画像がある場合: Gemini Vision APIで分析して生成
+    - 画像がある場合: 縮小してから Gemini Vision APIで分析して生成
     - 画像がない場合: テキスト情報のみで生成
     - APIエラー時: ルールベースでフォールバック
     """
@@ -161,54 +367,52 @@ async def generate_comment(request: CommentRequest):
         comment = generate_fallback_comment(request.expression_type)
         return CommentResponse(comment=comment, source="rule_based")
     
-    try:
-        # Geminiモデルを初期化
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        # 画像の有無を確認
-        has_image = bool(request.image_base64)
-        
-        # プロンプトを構築
-        prompt = build_prompt(request, has_image)
-        
-        if has_image:
-            # 画像付きリクエスト
-            # Base64から画像データを抽出
-            if request.image_base64.startswith('data:'):
-                # data:image/jpeg;base64,xxxx 形式の場合
-                header, image_data = request.image_base64.split(',', 1)
-                mime_type = header.split(':')[1].split(';')[0]
-            else:
-                # 純粋なbase64の場合
-                image_data = request.image_base64
-                mime_type = "image/jpeg"
-            
-            image_bytes = base64.b64decode(image_data)
-            
-            # 画像を含むコンテンツを生成
-            response = model.generate_content([
-                {
-                    "mime_type": mime_type,
-                    "data": image_bytes
-                },
-                prompt
-            ])
-        else:
-            # テキストのみのリクエスト
-            response = model.generate_content(prompt)
-        
-        # レスポンスからテキストを抽出
-        if response.text:
-            comment = response.text.strip()
-            return CommentResponse(comment=comment, source="ai")
-        else:
-            raise ValueError("Empty response from API")
-            
-    except Exception as e:
-        print(f"Gemini API error: {e}")
-        # エラー時はルールベースでフォールバック
+    image = None
+    if request.image_base64:
+        image = await prepare_image(request.image_base64)
+        request.image_base64 = None  # 元のbase64文字列はここで手放す
+    
+    return await generate(request, image)
+
+
+@app.post("/generate-comment/upload", response_model=CommentResponse)
+async def generate_comment_upload(
+    image: UploadFile = File(...),
+    booth_name: str = Form("ブース"),
+    role: str = Form("モデル"),
+    category: str = Form("ブース"),
+    expression_type: str = Form("笑顔"),
+    focus_point: str = Form("表情"),
+    context_match: str = Form("ブースの雰囲気"),
+):
+    """
+    一言コメントを生成（画像は multipart/form-data のファイルで受け取る）
+    
+    アップロードは一時ファイルに逐次書き出され、そこから直接縮小デコードするため
+    画像全体をメモリに載せない。
+    """
+    request = CommentRequest(
+        booth_name=booth_name,
+        role=role,
+        category=category,
+        expression_type=expression_type,
+        focus_point=focus_point,
+        context_match=context_match,
+    )
+    
+    if image.size is not None and image.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+    
+    if not GEMINI_API_KEY:
         comment = generate_fallback_comment(request.expression_type)
         return CommentResponse(comment=comment, source="rule_based")
+    
+    try:
+        prepared = await prepare_image(image.file)
+    finally:
+        await image.close()
+    
+    return await generate(request, prepared)
 
 
 @app.get("/")
@@ -0,0 +1,102 @@
+"""
+Async I/O: FastAPIハンドラ用のファイルI/Oヘルパー
+
+async def 内で open()/write()/os.remove() を直接呼ぶと、その間イベントループ全体が止まる。
+ファイルシステムへのアクセスは全てここを経由させ、専用スレッドプールで実行する。
+
+使用方法:
+    from async_io import read_bytes, write_temp, remove
+
+    tmp_path = await write_temp(content, suffix=".jpg")
+    data = await read_bytes(tmp_path)
+    await remove(tmp_path)
+"""
+
+import asyncio
+import base64
+import functools
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# ファイルI/O専用プール（推論・HTTPのto_threadとは分けて、ディスク待ちで詰まらないようにする）
+# スレッドを増やしすぎるとbase64化でGILを取り合い、イベントループ側の遅延(p50/p99)が悪化する。
+# 既定はCPU数+1（最大4）に抑える
+FILE_IO_WORKERS = int(os.getenv("KOTARO_FILE_IO_WORKERS", str(min(4, (os.cpu_count() or 1) + 1))))
+
+# base64化は1チャンクずつ行う（b64encode はGILを握ったままなので、4MBを一度に処理すると
+# その間イベントループのスレッドが止まる）。3の倍数にしておけば連結しても結果は同じ
+BASE64_CHUNK_BYTES = 3 * 64 * 1024
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=FILE_IO_WORKERS, thread_name_prefix="file-io")
+    return _executor
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """ブロッキング関数をファイルI/Oプールで実行"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+# =============================================================================
+# 同期実装（プール内で実行される）
+# =============================================================================
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _read_base64(path: str) -> str:
+    parts = []
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(BASE64_CHUNK_BYTES)
+            if not chunk:
+                break
+            parts.append(base64.b64encode(chunk))
+    return b"".join(parts).decode("ascii")
+
+
+def _write_temp(data: bytes, suffix: str) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(data)
+        return tmp.name
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# =============================================================================
+# 非同期API
+# =============================================================================
+
+async def read_bytes(path: str) -> bytes:
+    """ファイルを読み込む"""
+    return await run_blocking(_read_bytes, path)
+
+
+async def read_base64(path: str) -> str:
+    """ファイルを読み込んでbase64文字列にする（エンコードもプール側で行う）"""
+    return await run_blocking(_read_base64, path)
+
+
+async def write_temp(data: bytes, suffix: str = "") -> str:
+    """一時ファイルに書き出してパスを返す（削除は呼び出し側で remove()）"""
+    return await run_blocking(_write_temp, data, suffix)
+
+
+async def remove(path: str):
+    """ファイルを削除（存在しなければ何もしない）"""
+    await run_blocking(_remove, path)
@@ -0,0 +1,288 @@
+"""
+Comment Sampler: いいね数で重み付けしたフォールバックコメントの抽選
+
+call_kotaro_generation_v3 のフォールバックは PATTERN_EXAMPLES（各パターン3件）からの
+random.choice だったため、重複ブロックが続くとすぐ候補が尽きていた。
+ここでは PATTERN_EXAMPLES に feedback_likes のいいね済みコメントを加えた候補プールを作り、
+いいね数で重み付けしたエイリアス表（Walker/Vose法）から O(1) で抽選する。
+
+- 重み = 基本重み（PATTERN_EXAMPLES のみ）+ いいね数
+- いいね済みコメントは validator（生成コメントと同じ検査）に通ったものだけ候補に入れる
+- いいねが追加されたらそのパターンだけ dirty にし、次回抽選時に O(k) で再構築
+- パターン横断の抽選（他パターンから借りる）用に全体表も持つ
+- 未使用の候補だけからの抽選（sample_unused）は、使用済みと分かった候補を重み0にする
+  Fenwick木（UnusedIndex）で O(log n)。プールが埋まってもソートや全件走査をしない
+
+使用方法:
+    sampler = CommentSampler(PATTERN_EXAMPLES, validator=is_servable_comment)
+    sampler.load_likes(feedback_entries)
+    comment = sampler.sample("P01")
+    comment = sampler.sample_unused("P01", comment_cache.is_duplicate)
+    comment = sampler.sample_unused(ALL_PATTERNS, comment_cache.is_duplicate, exclude="P01")
+"""
+
+import random
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+# 全パターン横断の表のキー
+ALL_PATTERNS = "*"
+
+
+class AliasTable:
+    """Vose のエイリアス法による離散分布（構築 O(n)・抽選 O(1)）"""
+
+    def __init__(self, items: Sequence[str], weights: Sequence[float]):
+        if not items:
+            raise ValueError("AliasTable requires at least one item")
+        n = len(items)
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+
+        self.items = list(items)
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self, rng: random.Random) -> str:
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class UnusedIndex:
+    """
+    使用済みを除いた重み付き抽選（Fenwick木、抽選・除外・復帰ともに O(log n)）
+
+    使用済みと分かった候補は重み0の「使用済み側」に移して以後は引かない。
+    使用済み側は移した順に持ち、抽選のたびに古いものから数件だけ再判定して
+    期限切れ（再び使える）ものを戻す（refresh）。未使用側が尽きたときは全件を再判定する（restore）。
+    """
+
+    def __init__(self, items: Sequence[str], weights: Sequence[float]):
+        self.items = list(items)
+        self.weights = [float(w) for w in weights]
+        self.used: Dict[int, None] = {}  # 使用済み側（移した順）
+        self._build()
+
+    def _build(self):
+        """未使用側の重みで木を作り直す（O(n)）"""
+        n = len(self.items)
+        self.tree = [0.0] * (n + 1)
+        for i, w in enumerate(self.weights):
+            if i not in self.used:
+                self.tree[i + 1] += w
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                self.tree[j] += self.tree[i]
+        self.total = sum(w for i, w in enumerate(self.weights) if i not in self.used)
+
+    def _add(self, i: int, delta: float):
+        self.total += delta
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def sample(self, rng: random.Random) -> Optional[int]:
+        """未使用側から重み付きで1件（インデックス）。尽きていればNone"""
+        if len(self.used) >= len(self.items) or self.total <= 0:
+            return None
+        x = rng.random() * self.total
+        pos, step = 0, 1 << (len(self.items).bit_length() - 1)
+        while step:
+            nxt = pos + step
+            if nxt < len(self.tree) and self.tree[nxt] <= x:
+                pos = nxt
+                x -= self.tree[nxt]
+            step >>= 1
+        i = min(pos, len(self.items) - 1)
+        if i in self.used:
+            self._build()  # 浮動小数点の誤差で使用済みに落ちた場合は作り直して引き直す
+            return self.sample(rng)
+        return i
+
+    def mark(self, i: int):
+        """使用済み側に移す"""
+        if i not in self.used:
+            self.used[i] = None
+            self._add(i, -self.weights[i])
+
+    def unmark(self, i: int):
+        """未使用側に戻す"""
+        if i in self.used:
+            del self.used[i]
+            self._add(i, self.weights[i])
+
+    def refresh(self, is_used: Callable[[str], bool], limit: int = 2):
+        """使用済み側の古いものから最大 limit 件を再判定し、期限切れなら戻す（まだ使用済みならそこで止める）"""
+        for _ in range(limit):
+            if not self.used:
+                return
+            i = next(iter(self.used))
+            if is_used(self.items[i]):
+                return
+            self.unmark(i)
+
+    def restore(self, is_used: Callable[[str], bool]) -> int:
+        """使用済み側のうち、もう使用済みでないものを戻す。戻した件数を返す"""
+        back = [i for i in list(self.used) if not is_used(self.items[i])]
+        for i in back:
+            self.unmark(i)
+        return len(back)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class CommentSampler:
+    """パターン別のいいね重み付きコメント抽選"""
+
+    def __init__(
+        self,
+        base_examples: Dict[str, List[str]],
+        base_weight: float = 1.0,
+        rng: Optional[random.Random] = None,
+        validator: Optional[Callable[[str], bool]] = None,
+    ):
+        """
+        Args:
+            base_examples: パターンID → 実例コメント（PATTERN_EXAMPLES）
+            base_weight: 実例コメントの基本重み（いいね1件と同じ重み）
+            rng: 乱数生成器（シミュレーション用に固定可能）
+            validator: いいね済みコメントを候補に入れてよいか（Falseなら add_like で捨てる）
+        """
+        self.base_weight = base_weight
+        self.rng = rng or random.Random()
+        self.validator = validator
+        self.rejected_likes = 0
+        self._weights: Dict[str, Dict[str, float]] = {}
+        self._tables: Dict[str, AliasTable] = {}
+        self._indexes: Dict[str, UnusedIndex] = {}
+        self._dirty = {ALL_PATTERNS}
+        self._dirty_indexes = {ALL_PATTERNS}
+        for pattern_id, examples in base_examples.items():
+            pool = self._weights.setdefault(pattern_id, {})
+            for comment in examples:
+                pool[comment] = pool.get(comment, 0.0) + base_weight
+            self._dirty.add(pattern_id)
+            self._dirty_indexes.add(pattern_id)
+
+    # -------------------------------------------------------------------------
+    # 更新
+    # -------------------------------------------------------------------------
+
+    def add_like(self, pattern_id: str, comment: str, count: int = 1) -> bool:
+        """いいねを反映（該当パターンの表だけ再構築対象にする）。候補に入れたらTrue"""
+        if pattern_id not in self._weights or not comment:
+            return False  # 未知パターン（"unknown"等）は抽選対象外
+        if self.validator is not None and not self.validator(comment):
+            self.rejected_likes += 1
+            return False  # 禁止パターン・長さの検査に通らないコメントは他のユーザーに返さない
+        pool = self._weights[pattern_id]
+        pool[comment] = pool.get(comment, 0.0) + count
+        self._dirty.update((pattern_id, ALL_PATTERNS))
+        self._dirty_indexes.update((pattern_id, ALL_PATTERNS))
+        return True
+
+    def load_likes(self, entries: Iterable[Dict]):
+        """フィードバックログから一括反映"""
+        for entry in entries:
+            self.add_like(entry.get("pattern", "unknown"), entry.get("comment", ""))
+
+    def _pool(self, pattern_id: str) -> Dict[str, float]:
+        """パターンの候補と重み（ALL_PATTERNS なら全パターンを合算）"""
+        if pattern_id != ALL_PATTERNS:
+            return self._weights[pattern_id]
+        merged: Dict[str, float] = {}
+        for pool in self._weights.values():
+            for comment, w in pool.items():
+                merged[comment] = merged.get(comment, 0.0) + w
+        return merged
+
+    def _table(self, pattern_id: str) -> AliasTable:
+        if pattern_id in self._dirty or pattern_id not in self._tables:
+            pool = self._pool(pattern_id)
+            self._tables[pattern_id] = AliasTable(list(pool), list(pool.values()))
+            self._dirty.discard(pattern_id)
+        return self._tables[pattern_id]
+
+    def _index(self, pattern_id: str) -> UnusedIndex:
+        """未使用抽選用の索引（いいね追加で作り直すと使用済み印は消えるが、次の抽選で付け直される）"""
+        if pattern_id in self._dirty_indexes or pattern_id not in self._indexes:
+            pool = self._pool(pattern_id)
+            self._indexes[pattern_id] = UnusedIndex(list(pool), list(pool.values()))
+            self._dirty_indexes.discard(pattern_id)
+        return self._indexes[pattern_id]
+
+    # -------------------------------------------------------------------------
+    # 抽選
+    # -------------------------------------------------------------------------
+
+    def pool_size(self, pattern_id: str = ALL_PATTERNS) -> int:
+        """候補プールの件数"""
+        return len(self._table(pattern_id))
+
+    def sample(self, pattern_id: str) -> str:
+        """重み付きで1件抽選"""
+        if pattern_id not in self._weights:
+            pattern_id = ALL_PATTERNS
+        return self._table(pattern_id).sample(self.rng)
+
+    def sample_unused(
+        self,
+        pattern_id: str,
+        is_used: Callable[[str], bool],
+        exclude: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        使用済みでないコメントを重み付きで抽選
+
+        引いた候補が使用済みなら索引の使用済み側に移して引き直す（1候補につき1回、O(log n)）。
+        毎回、使用済み側の古いものを数件だけ再判定して戻し、
+        未使用側が尽きたときだけ使用済み側を全件再判定して1度だけやり直す。
+
+        Args:
+            pattern_id: パターンID（ALL_PATTERNS で全パターン横断）
+            is_used: 使用済み判定（comment_cache.is_duplicate）
+            exclude: 候補から外すパターンID（他パターンから借りるときの、尽きた元パターン）
+
+        Returns:
+            未使用のコメント。プールが全て使用済みなら None
+        """
+        if pattern_id not in self._weights:
+            pattern_id = ALL_PATTERNS
+        index = self._index(pattern_id)
+        skip = self._weights.get(exclude, {}) if exclude else {}
+        held: List[int] = []  # この呼び出しの間だけ外している exclude の候補
+        index.refresh(lambda c: c in skip or is_used(c))
+        try:
+            for retry in (False, True):
+                if retry and not index.restore(lambda c: c in skip or is_used(c)):
+                    break
+                while True:
+                    i = index.sample(self.rng)
+                    if i is None:
+                        break
+                    comment = index.items[i]
+                    if comment in skip:
+                        held.append(i)
+                    elif not is_used(comment):
+                        return comment
+                    index.mark(i)
+        finally:
+            for i in held:
+                index.unmark(i)
+        return None
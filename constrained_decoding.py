@@ -0,0 +1,243 @@
+"""
+Constrained Decoding: 18文字・NGワード禁止をデコード時に強制する（transformers）
+
+KotaroEngine は num_predict=50 で生成してから text[:18] で切り、NGワードなら捨てて再生成していた。
+ローカルの transformers モデルでは LogitsProcessor で
+- NGワードを完成させるトークンを毎ステップ -inf にする（トークン境界をまたぐ場合も含む）
+- 残り文字数に収まらないトークンを禁止し、18文字に達したらEOSのみ許可する
+- 改行が出たら止める
+ので、生成されたものはそのまま合格する。
+
+NGワードをデコード時に禁止できるのはこの transformers 版だけ。
+Ollama 経由の KotaroEngine(constrained=True) がデコード時に縛れるのは長さ（JSONスキーマの maxLength）のみで、
+NGワードは従来どおり生成後に検査して再生成する（Ollama の generate には logit bias を渡す口が無く、
+スキーマから変換される文法でも「この語を含まない」は表現できない）。
+
+使用方法:
+    from constrained_decoding import TransformersKotaroEngine
+
+    engine = TransformersKotaroEngine("Qwen/Qwen2.5-1.5B-Instruct")
+    comment = engine.generate("栞", "happy")
+
+    python constrained_decoding.py --name "栞" --count 5
+"""
+
+from typing import List, Optional, Sequence
+
+import torch
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    LogitsProcessor,
+    LogitsProcessorList,
+    StoppingCriteria,
+    StoppingCriteriaList,
+)
+
+from generation_cache import CandidateCache
+from kotaro_engine import KotaroEngine, NG_WORDS, GENERATE_OPTIONS
+
+
+# =============================================================================
+# 設定
+# =============================================================================
+
+CONFIG = {
+    "model_id": "Qwen/Qwen2.5-1.5B-Instruct",
+    "max_new_tokens": GENERATE_OPTIONS["num_predict"],  # 上限（通常は18文字でEOSになり手前で止まる）
+}
+
+
+def _token_strings(tokenizer) -> List[str]:
+    """語彙の各トークンを単独でデコードした文字列"""
+    return [tokenizer.decode([i]) for i in range(len(tokenizer))]
+
+
+def _generated_text(tokenizer, input_ids: torch.LongTensor, prompt_len: int) -> List[str]:
+    return tokenizer.batch_decode(input_ids[:, prompt_len:], skip_special_tokens=True)
+
+
+# =============================================================================
+# LogitsProcessor / StoppingCriteria
+# =============================================================================
+
+class NGWordLogitsProcessor(LogitsProcessor):
+    """
+    NGワードを完成させるトークンを禁止
+
+    - トークン単体でNGワードを含むもの: 常に禁止（初期化時に算出）
+    - 生成済みテキストの末尾がNGワードの先頭部分で終わっている場合:
+      残りの部分で始まるトークンを禁止（「た」「だた」のように分割されても止める）
+    """
+
+    def __init__(self, tokenizer, prompt_len: int, ng_words: Sequence[str] = NG_WORDS,
+                 token_strings: Optional[List[str]] = None):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        strings = token_strings or _token_strings(tokenizer)
+
+        self.always = torch.tensor(
+            [i for i, t in enumerate(strings) if any(ng in t for ng in ng_words)], dtype=torch.long
+        )
+        # (NGワードの先頭部分, その続きで始まるトークンID)
+        self.partial = []
+        for ng in ng_words:
+            for k in range(1, len(ng)):
+                head, rest = ng[:k], ng[k:]
+                ids = [i for i, t in enumerate(strings) if t and t.startswith(rest)]
+                if ids:
+                    self.partial.append((head, torch.tensor(ids, dtype=torch.long)))
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        scores[:, self.always.to(scores.device)] = -float("inf")
+        for row, text in enumerate(_generated_text(self.tokenizer, input_ids, self.prompt_len)):
+            for head, ids in self.partial:
+                if text.endswith(head):
+                    scores[row, ids.to(scores.device)] = -float("inf")
+        return scores
+
+
+class MaxCharsLogitsProcessor(LogitsProcessor):
+    """残り文字数に収まらないトークンを禁止し、上限に達したらEOSだけを許可"""
+
+    def __init__(self, tokenizer, prompt_len: int, max_chars: int, eos_token_id: int,
+                 token_strings: Optional[List[str]] = None):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+        self.max_chars = max_chars
+        self.eos_token_id = eos_token_id
+        strings = token_strings or _token_strings(tokenizer)
+        self.lengths = torch.tensor([len(t) for t in strings], dtype=torch.long)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        lengths = self.lengths.to(scores.device)
+        vocab = scores.shape[-1]
+        for row, text in enumerate(_generated_text(self.tokenizer, input_ids, self.prompt_len)):
+            remaining = self.max_chars - len(text)
+            too_long = torch.ones(vocab, dtype=torch.bool, device=scores.device)
+            if remaining > 0:
+                n = min(vocab, lengths.shape[0])
+                too_long[:n] = lengths[:n] > remaining
+            too_long[self.eos_token_id] = False  # 上限に達したら（長さ0の特殊トークンも含め）EOS以外は禁止
+            scores[row, too_long] = -float("inf")
+        return scores
+
+
+class StopOnNewline(StoppingCriteria):
+    """1行目が終わったら止める"""
+
+    def __init__(self, tokenizer, prompt_len: int):
+        self.tokenizer = tokenizer
+        self.prompt_len = prompt_len
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        return all("\n" in text for text in _generated_text(self.tokenizer, input_ids, self.prompt_len))
+
+
+# =============================================================================
+# エンジン
+# =============================================================================
+
+class TransformersKotaroEngine(KotaroEngine):
+    """ローカルの transformers モデルで制約付きデコードする KotaroEngine"""
+
+    def __init__(
+        self,
+        model_id: Optional[str] = None,
+        device: Optional[str] = None,
+        constrained: bool = True,
+        cache: Optional[CandidateCache] = None,
+    ):
+        """
+        Args:
+            model_id: HuggingFaceモデルID（デフォルト: CONFIG["model_id"]）
+            device: "cuda" / "cpu"（デフォルト: CUDAがあればcuda）
+            constrained: Falseなら従来どおり生成後に切り詰め・検証（比較用、use_processors で切り替え可）
+            cache: 生成済みコメントの再利用キャッシュ（キーは (名前, 感情)、KotaroEngine と同じ）
+        """
+        super().__init__(model=model_id or CONFIG["model_id"], cache=cache)
+        self.use_processors = constrained
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model)
+        self.hf_model = AutoModelForCausalLM.from_pretrained(
+            self.model, torch_dtype=torch.float16 if self.device == "cuda" else torch.float32
+        ).to(self.device).eval()
+        self._strings: Optional[List[str]] = None  # 語彙のデコード結果（初回の制約付き生成で作り、プロセッサ間で共有）
+
+    def _complete(self, prompt: str) -> str:
+        messages = [{"role": "user", "content": prompt}]
+        text = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        inputs = self.tokenizer(text, return_tensors="pt").to(self.device)
+        prompt_len = inputs["input_ids"].shape[1]
+
+        kwargs = {}
+        if self.use_processors:
+            if self._strings is None:
+                self._strings = _token_strings(self.tokenizer)
+            eos = self.tokenizer.eos_token_id
+            kwargs["logits_processor"] = LogitsProcessorList([
+                NGWordLogitsProcessor(self.tokenizer, prompt_len, token_strings=self._strings),
+                MaxCharsLogitsProcessor(self.tokenizer, prompt_len, self.max_length, eos,
+                                        token_strings=self._strings),
+            ])
+            kwargs["stopping_criteria"] = StoppingCriteriaList([StopOnNewline(self.tokenizer, prompt_len)])
+
+        with torch.inference_mode():
+            output = self.hf_model.generate(
+                **inputs,
+                do_sample=True,
+                temperature=GENERATE_OPTIONS["temperature"],
+                top_p=GENERATE_OPTIONS["top_p"],
+                max_new_tokens=CONFIG["max_new_tokens"],
+                pad_token_id=self.tokenizer.eos_token_id,
+                **kwargs,
+            )
+        generated = output[0, prompt_len:]
+        self.stats["calls"] += 1  # KotaroEngine.stats（Counter）に生成トークン数も足す
+        self.stats["tokens"] += int(generated.shape[0])
+        return self.tokenizer.decode(generated, skip_special_tokens=True)
+
+    def generate(self, model_name: str, emotion: str = "happy", max_retries: int = 3) -> str:
+        """18文字コメントを生成（制約付きなら通常1回で合格する。キャッシュに未使用の候補があれば生成しない）"""
+        cached = self._cached(model_name, emotion)
+        if cached is not None:
+            return cached
+
+        prompt = self._build_prompt(model_name, emotion)
+        for attempt in range(max_retries):
+            try:
+                cleaned = self._clean_output(self._complete(prompt))
+                if self._validate_output(cleaned):
+                    self._remember(model_name, emotion, cleaned)
+                    return cleaned
+            except Exception as e:
+                print(f"[Kotaro] 生成エラー (試行 {attempt + 1}): {e}")
+        return self._fallback(model_name, emotion)
+
+
+# CLI
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="制約付きデコードで Kotaro コメント生成（transformers）")
+    parser.add_argument("--name", type=str, default="栞", help="モデルさんの名前")
+    parser.add_argument("--emotion", type=str, default="happy", choices=["happy", "neutral", "surprise"])
+    parser.add_argument("--count", type=int, default=3, help="生成数")
+    parser.add_argument("--model-id", type=str, default=None, help="HuggingFaceモデルID")
+    parser.add_argument("--cache", action="store_true",
+                        help="生成済みコメントを1時間以内は重複させずに再利用")
+    args = parser.parse_args()
+
+    engine = TransformersKotaroEngine(args.model_id, cache=CandidateCache() if args.cache else None)
+
+    print("\n🐯 Kotaro-Engine (constrained decoding)")
+    print("=" * 40)
+    for i in range(args.count):
+        comment = engine.generate(args.name, args.emotion)
+        print(f"  [{i+1}] {comment} ({len(comment)}文字)")
+    print(f"  生成トークン: {engine.stats['tokens'] / max(engine.stats['calls'], 1):.1f}/回")
+    print("=" * 40)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+CV Features: OpenCVによるVLMフラグの事前推定（決定的・数ミリ秒）
+
+VLMに毎回聞いていたフラグのうち、画素から直接測れるものを数値特徴として出す。
+- face_count          → group_feeling（複数人）
+- face_height_ratio   → close_dist（顔が画面に占める大きさ）
+- edge_density        → crowd_venue（顔以外の背景のエッジ密度 = ごちゃついた会場）
+- face_yaw / profile  → pose_front_true / pose_side_cool / pose_safe_theory の矛盾チェック
+
+体の向きは顔だけでは分からないため、ポーズ系フラグは上書きせず
+「顔が横を向いているのに正面系」といった矛盾だけを落とす（cross_check_flags）。
+
+使用方法:
+    from cv_features import CvFeatureExtractor, prefill_flags, cross_check_flags
+
+    features = CvFeatureExtractor().extract(image_bgr)
+    flags = prefill_flags(features)                 # close_dist / group_feeling / crowd_venue
+    flags = cross_check_flags(vlm_flags, features)  # ポーズ系の矛盾を除去
+"""
+
+from typing import Dict, Optional
+import threading
+
+import cv2
+import numpy as np
+
+
+# =============================================================================
+# 設定
+# =============================================================================
+
+CONFIG = {
+    # 顔検出（Haar）
+    "face_cascade": "haarcascade_frontalface_default.xml",
+    "profile_cascade": "haarcascade_profileface.xml",
+    "eye_cascade": "haarcascade_eye.xml",
+    "scale_factor": 1.1,
+    "min_neighbors": 6,
+    "min_face_ratio": 0.04,       # 長辺に対する最小の顔サイズ（群衆の小さな顔は数えない）
+
+    # フラグのしきい値
+    "group_min_faces": 2,         # group_feeling
+    "crowd_min_faces": 4,         # crowd_venue（顔数）
+    "crowd_edge_density": 0.12,   # crowd_venue（背景のCannyエッジ画素の割合）
+    "close_face_ratio": 0.30,     # close_dist（最大の顔の高さ / 画像の高さ）
+    "frontal_yaw": 0.08,          # |yaw| がこれ未満なら顔は正面
+    "side_yaw": 0.20,             # |yaw| がこれ以上なら顔は斜め・横
+
+    # Canny
+    "canny_low": 80,
+    "canny_high": 200,
+}
+
+# VLMのプロンプトから外し、CVの値で埋めるフラグ
+PREFILLED_FLAGS = ("close_dist", "group_feeling", "crowd_venue")
+
+
+class CvFeatureExtractor:
+    """
+    顔数・顔サイズ・背景エッジ密度・顔の向きを測る
+
+    CascadeClassifier は検出中の作業バッファを自身に持つためスレッド間で共有できない。
+    カスケードはスレッドごとに1回だけ読み込み（threading.local）、
+    1つのインスタンスを asyncio.to_thread などの複数ワーカーから同時に使えるようにする。
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _detectors(self) -> Dict[str, "cv2.CascadeClassifier"]:
+        """このスレッド用のカスケード（初回だけ読み込む）"""
+        detectors = getattr(self._local, "detectors", None)
+        if detectors is None:
+            base = cv2.data.haarcascades
+            detectors = {
+                name: cv2.CascadeClassifier(base + CONFIG[f"{name}_cascade"])
+                for name in ("face", "profile", "eye")
+            }
+            self._local.detectors = detectors
+        return detectors
+
+    @property
+    def face_detector(self):
+        return self._detectors()["face"]
+
+    @property
+    def profile_detector(self):
+        return self._detectors()["profile"]
+
+    @property
+    def eye_detector(self):
+        return self._detectors()["eye"]
+
+    def _detect(self, detector, gray: np.ndarray):
+        min_size = int(max(gray.shape) * CONFIG["min_face_ratio"])
+        return list(detector.detectMultiScale(
+            gray,
+            scaleFactor=CONFIG["scale_factor"],
+            minNeighbors=CONFIG["min_neighbors"],
+            minSize=(min_size, min_size),
+        ))
+
+    def _profile(self, gray: np.ndarray) -> bool:
+        """横顔があるか（カスケードは片向きのみなので左右反転でも探す）"""
+        return bool(self._detect(self.profile_detector, gray) or
+                    self._detect(self.profile_detector, cv2.flip(gray, 1)))
+
+    def _yaw(self, face: np.ndarray) -> Optional[float]:
+        """
+        両目の中点が顔の中心からどれだけずれているか（顔幅比, -0.5〜0.5）
+
+        正面なら0付近、顔を横に向けるほど絶対値が大きい。両目が取れなければNone。
+        """
+        h, w = face.shape
+        eyes = self.eye_detector.detectMultiScale(face[: h * 2 // 3], scaleFactor=1.1, minNeighbors=5)
+        if len(eyes) < 2:
+            return None
+        eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+        mid_x = sum(x + ew / 2 for x, _, ew, _ in eyes) / 2
+        return round(float(mid_x / w - 0.5), 3)
+
+    def extract_gray(self, gray: np.ndarray) -> Dict:
+        """グレースケール画像から特徴を計算"""
+        h, w = gray.shape
+        faces = self._detect(self.face_detector, gray)
+
+        # 顔の外側だけで背景のエッジ密度を測る
+        edges = cv2.Canny(gray, CONFIG["canny_low"], CONFIG["canny_high"])
+        mask = np.ones_like(gray, dtype=bool)
+        for x, y, fw, fh in faces:
+            mask[y:y + fh, x:x + fw] = False
+        background = mask.sum()
+        edge_density = float((edges[mask] > 0).sum() / background) if background else 0.0
+
+        yaw = None
+        largest = max(faces, key=lambda f: f[2] * f[3]) if faces else None
+        if largest is not None:
+            x, y, fw, fh = largest
+            yaw = self._yaw(gray[y:y + fh, x:x + fw])
+
+        return {
+            "face_count": len(faces),
+            "face_height_ratio": round(largest[3] / h, 3) if largest is not None else 0.0,
+            "face_area_ratio": round(largest[2] * largest[3] / (w * h), 4) if largest is not None else 0.0,
+            "edge_density": round(edge_density, 4),
+            "face_yaw": yaw,
+            "profile": not faces and self._profile(gray),
+        }
+
+    def extract(self, img: np.ndarray) -> Dict:
+        """BGR画像から特徴を計算"""
+        return self.extract_gray(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+
+def prefill_flags(features: Dict) -> Dict[str, bool]:
+    """CVで決めるフラグ（PREFILLED_FLAGS）"""
+    return {
+        "group_feeling": features["face_count"] >= CONFIG["group_min_faces"],
+        "crowd_venue": (features["face_count"] >= CONFIG["crowd_min_faces"] or
+                        features["edge_density"] >= CONFIG["crowd_edge_density"]),
+        "close_dist": features["face_height_ratio"] >= CONFIG["close_face_ratio"],
+    }
+
+
+def cross_check_flags(flags: Dict[str, bool], features: Dict) -> Dict[str, bool]:
+    """
+    顔の向きと矛盾するポーズ系フラグを落とす
+
+    - 横顔しか無い → 顔はカメラを向いていない（pose_front_true / pose_safe_theory は不成立）
+    - 顔が正面 → pose_side_cool（顔も斜め・横）は不成立
+    - 顔が大きく斜め → pose_front_true（顔も真正面）は不成立
+    """
+    checked = dict(flags)
+    yaw = features.get("face_yaw")
+    if features.get("profile"):
+        checked["pose_front_true"] = False
+        checked["pose_safe_theory"] = False
+    elif yaw is not None:
+        if abs(yaw) < CONFIG["frontal_yaw"]:
+            checked["pose_side_cool"] = False
+        elif abs(yaw) >= CONFIG["side_yaw"]:
+            checked["pose_front_true"] = False
+    return checked
@@ -0,0 +1,337 @@
+"""
+Feedback Store: いいねフィードバックの追記専用ストア（JSONL）
+
+旧実装（feedback_likes.json 全体を読み込み→追記→1000件に切り詰め→全書き込み）は
+- 履歴件数に比例してレイテンシが伸びる
+- 並行リクエストで read-modify-write が競合し、いいねが消える
+- 1000件を超えた学習用の履歴を捨ててしまう
+という問題があったため、1件=1行の追記専用ログに置き換える。
+
+設計:
+- 追記は1行のwrite()のみ（O(1)）。書き込みはロックで直列化し、ファイルI/Oプールで実行
+- 履歴は削除しない（保持ポリシーは「全件保持」）
+- 起動時に壊れた行（書き込み途中のクラッシュ等）を検出したらアトミックにコンパクション
+- 旧形式の feedback_likes.json は初回起動時に取り込む（元ファイルは残す）
+
+使用方法:
+    store = FeedbackStore("feedback_likes.jsonl", legacy_path="feedback_likes.json")
+    stats = FeedbackStats.from_entries(store.load())
+    entry = {"comment": "...", "pattern": "P01"}
+    total = await store.append(entry)
+    stats.add(entry)
+"""
+
+import heapq
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from async_io import run_blocking
+
+logger = logging.getLogger("feedback_store")
+
+
+def _atomic_write_lines(path: str, lines: Iterable[str]):
+    """一時ファイルに書き出してからos.replaceで差し替える"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".feedback-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _dump(entry: Dict[str, Any]) -> str:
+    return json.dumps(entry, ensure_ascii=False) + "\n"
+
+
+class FeedbackStore:
+    """追記専用のフィードバックログ"""
+
+    def __init__(self, path: str, legacy_path: Optional[str] = None, fsync: bool = False):
+        """
+        Args:
+            path: JSONLログのパス
+            legacy_path: 旧形式（JSON配列）のパス。ログが無い場合のみ取り込む
+            fsync: 追記毎にfsyncするか（電源断耐性 ↔ レイテンシ）
+        """
+        self.path = path
+        self.legacy_path = legacy_path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._fh = None
+        self._count = 0
+        self._loaded = False
+
+    # -------------------------------------------------------------------------
+    # 読み込み
+    # -------------------------------------------------------------------------
+
+    def _read_log(self) -> Tuple[List[Dict[str, Any]], int]:
+        """ログを読み込み (entries, 壊れた行数) を返す"""
+        entries: List[Dict[str, Any]] = []
+        broken = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    broken += 1
+        return entries, broken
+
+    def _migrate_legacy(self):
+        """旧形式のJSON配列をJSONLに変換（初回のみ）"""
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        with open(self.legacy_path, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+        _atomic_write_lines(self.path, (_dump(e) for e in legacy))
+        logger.info("Migrated %d legacy feedback entries from %s", len(legacy), self.legacy_path)
+
+    def load(self) -> List[Dict[str, Any]]:
+        """
+        ログを読み込んで追記ハンドルを開く（起動時に1回）
+
+        Returns:
+            既存の全エントリ（古い順）
+        """
+        with self._lock:
+            if not os.path.exists(self.path):
+                self._migrate_legacy()
+
+            entries: List[Dict[str, Any]] = []
+            if os.path.exists(self.path):
+                entries, broken = self._read_log()
+                if broken:
+                    logger.warning("Dropping %d broken feedback lines (compacting %s)", broken, self.path)
+                    _atomic_write_lines(self.path, (_dump(e) for e in entries))
+
+            self._count = len(entries)
+            self._fh = open(self.path, "a", encoding="utf-8")
+            self._loaded = True
+            return entries
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        """全エントリを読み込む（学習データ出力・集計の再構築用）"""
+        with self._lock:
+            if not os.path.exists(self.path):
+                return []
+            return self._read_log()[0]
+
+    # -------------------------------------------------------------------------
+    # 書き込み
+    # -------------------------------------------------------------------------
+
+    def append_sync(self, entry: Dict[str, Any]) -> int:
+        """
+        1件追記（同期版）
+
+        Returns:
+            追記後の総件数
+        """
+        if not self._loaded:
+            self.load()
+        line = _dump(entry)
+        with self._lock:
+            self._fh.write(line)
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+            self._count += 1
+            return self._count
+
+    async def append(self, entry: Dict[str, Any]) -> int:
+        """1件追記（イベントループを塞がないようスレッドプールで実行）"""
+        return await run_blocking(self.append_sync, entry)
+
+    def compact(self):
+        """
+        ログをアトミックに書き直す（壊れた行の除去）
+
+        追記中のハンドルは差し替え後のファイルに開き直す。
+        """
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+            entries, _ = self._read_log() if os.path.exists(self.path) else ([], 0)
+            _atomic_write_lines(self.path, (_dump(e) for e in entries))
+            self._count = len(entries)
+            self._fh = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            self._loaded = False
+
+    @property
+    def total(self) -> int:
+        """総件数"""
+        return self._count
+
+
+# =============================================================================
+# 集計（/feedback/stats 用のインメモリ集計）
+# =============================================================================
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# 時間窓ロールアップ {名前: 秒}
+WINDOWS = {"last_hour": 3600, "last_day": 86400}
+
+
+def _entry_time(entry: Dict[str, Any]) -> Optional[float]:
+    """liked_at（ローカル時刻）をepoch秒に変換。読めなければNone（時間窓には数えない）"""
+    try:
+        return time.mktime(time.strptime(str(entry.get("liked_at") or "")[:19], TIME_FORMAT))
+    except (ValueError, OverflowError):
+        return None
+
+
+class _WindowCounter:
+    """
+    直近window秒のパターン別件数
+
+    旧ログの取り込みや時計のずれで時刻順に届かないことがあるため、
+    到着順ではなく時刻の最小ヒープで期限切れを判定する（追加・除去ともにO(log n)）。
+    """
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.events: List[Tuple[float, str]] = []  # (時刻, パターン) の最小ヒープ
+        self.by_pattern: Counter = Counter()
+
+    def add(self, ts: float, pattern: str, now: float):
+        if ts < now - self.seconds:
+            return  # 最初から窓の外
+        heapq.heappush(self.events, (min(ts, now), pattern))  # 未来の時刻は現在時刻に丸める
+        self.by_pattern[pattern] += 1
+
+    def expire(self, now: float):
+        cutoff = now - self.seconds
+        while self.events and self.events[0][0] < cutoff:
+            _, pattern = heapq.heappop(self.events)
+            self.by_pattern[pattern] -= 1
+            if not self.by_pattern[pattern]:
+                del self.by_pattern[pattern]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"total": len(self.events), "by_pattern": dict(self.by_pattern)}
+
+
+class FeedbackStats:
+    """
+    フィードバック集計を書き込み時に差分更新する
+
+    - パターン別・コメント別いいね数
+    - 時間窓ロールアップ（直近1時間・1日）とイベント別件数
+    - パターン別いいね上位N件（書き込み時にO(N)で更新、読み出しはコピーのみ）
+    """
+
+    def __init__(self, top_n: int = 10, recent_size: int = 10):
+        self.top_n = top_n
+        self.total = 0
+        self.by_pattern: Counter = Counter()
+        self.by_comment: Dict[str, Counter] = {}
+        self.by_event: Counter = Counter()
+        self.last_event: Optional[str] = None
+        self.top_comments: Dict[str, List[Tuple[str, int]]] = {}
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=recent_size)
+        self.windows = {name: _WindowCounter(sec) for name, sec in WINDOWS.items()}
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]], **kwargs) -> "FeedbackStats":
+        """ログ全体から集計を再構築（起動時）"""
+        stats = cls(**kwargs)
+        for entry in entries:
+            stats.add(entry)
+        return stats
+
+    def add(self, entry: Dict[str, Any]):
+        """1件分の集計を反映"""
+        pattern = entry.get("pattern", "unknown")
+        comment = entry.get("comment", "")
+
+        self.total += 1
+        self.by_pattern[pattern] += 1
+        counts = self.by_comment.setdefault(pattern, Counter())
+        counts[comment] += 1
+        self._update_top(pattern, comment, counts[comment])
+
+        event = entry.get("event")
+        if event:
+            self.by_event[event] += 1
+            self.last_event = event
+
+        ts = _entry_time(entry)
+        now = time.time()
+        for window in self.windows.values():
+            if ts is not None:
+                window.add(ts, pattern, now)
+            window.expire(now)
+        self.recent.append(entry)
+
+    def _update_top(self, pattern: str, comment: str, count: int):
+        """いいね数は増える一方なので、該当コメントを上に移動するだけでよい"""
+        top = self.top_comments.setdefault(pattern, [])
+        for i, (c, _) in enumerate(top):
+            if c == comment:
+                del top[i]
+                break
+        else:
+            if len(top) >= self.top_n and top[-1][1] >= count:
+                return
+        i = len(top)
+        while i > 0 and top[i - 1][1] < count:
+            i -= 1
+        top.insert(i, (comment, count))
+        del top[self.top_n:]
+
+    def comment_counts(self, pattern: str) -> Dict[str, int]:
+        """パターン内のコメント別いいね数"""
+        return dict(self.by_comment.get(pattern, {}))
+
+    def snapshot(self, top: Optional[int] = None) -> Dict[str, Any]:
+        """
+        統計のスナップショット（/feedback/stats のレスポンス）
+
+        Raises:
+            ValueError: top が負の場合
+        """
+        if top is not None and top < 0:
+            raise ValueError(f"top must be >= 0 (got {top})")
+        now = time.time()
+        for window in self.windows.values():
+            window.expire(now)
+        top = self.top_n if top is None else min(top, self.top_n)
+        return {
+            "total": self.total,
+            "by_pattern": dict(self.by_pattern),
+            "recent": list(self.recent),
+            "windows": {name: w.snapshot() for name, w in self.windows.items()},
+            "by_event": dict(self.by_event),
+            "last_event": {
+                "name": self.last_event,
+                "total": self.by_event[self.last_event] if self.last_event else 0,
+            },
+            "top_comments": {
+                p: [{"comment": c, "likes": n} for c, n in entries[:top]]
+                for p, entries in self.top_comments.items()
+            },
+        }
@@ -0,0 +1,118 @@
+"""
+Generation Cache: プロンプト別の生成済みコメントの再利用
+
+call_kotaro_generation_v3 のプロンプトはパターンID（P01〜P12）だけで決まり、
+KotaroEngine も（名前, 感情）の組み合わせしか無いため、1イベント中のプロンプトは数十種類しかない。
+それでも毎リクエストLLMを呼んでいた。
+
+ここではプロンプトのキーごとに、検証を通った生成結果を最終使用時刻付きで全て保持し、
+- 重複防止の期間（デフォルト1時間）内に使っていない候補があればそれを返す（LLMを呼ばない）
+- 全候補が期間内に使用済みのときだけLLMを呼び、結果を候補に追加する
+期間内に使っていない候補のうち、未使用 → 最も昔に使ったもの の順に選ぶ。
+
+使用方法:
+    from generation_cache import CandidateCache
+
+    cache = CandidateCache(window_seconds=3600)
+    comment = cache.take("P01", comment_cache.is_duplicate)
+    if comment is None:
+        comment = generate()          # LLM呼び出し
+        cache.add("P01", comment)     # 使用済みとして保持
+"""
+
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+
+class CandidateCache:
+    """プロンプトのキー → 生成済みコメントと最終使用時刻"""
+
+    def __init__(
+        self,
+        window_seconds: float = 3600,
+        max_per_key: int = 200,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            window_seconds: 同じコメントを再び出さない期間（0以下でキャッシュ無効）
+            max_per_key: キーごとの候補数の上限（超えたら最も昔に使った候補から捨てる）
+            clock: 時刻関数（シミュレーション用に差し替え可能）
+        """
+        self.window = window_seconds
+        self.max_per_key = max_per_key
+        self.clock = clock
+        self._pools: Dict[Hashable, Dict[str, Optional[float]]] = {}  # {key: {comment: 最終使用時刻 or None}}
+        self.hits = 0
+        self.misses = 0
+
+    def take(self, key: Hashable, is_used: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """
+        期間内に使っていない候補を1つ取り出し、使用済みにする
+
+        Args:
+            key: プロンプトのキー（パターンID、(名前, 感情) など）
+            is_used: 外部の使用済み判定（comment_cache.is_duplicate）。Trueなら候補にしない
+
+        Returns:
+            候補のコメント。無ければ None（LLMを呼ぶ）
+        """
+        if self.window <= 0:
+            return None
+        now = self.clock()
+        best, best_ts = None, None
+        for comment, ts in self._pools.get(key, {}).items():
+            if ts is not None and now - ts < self.window:
+                continue
+            if is_used is not None and is_used(comment):
+                continue
+            if ts is None:
+                best = comment
+                break  # 未使用が最優先（追加順）
+            if best is None or ts < best_ts:
+                best, best_ts = comment, ts
+
+        if best is None:
+            self.misses += 1
+            return None
+        self._pools[key][best] = now
+        self.hits += 1
+        return best
+
+    def add(self, key: Hashable, comment: str, used: bool = True):
+        """
+        生成結果を候補に追加
+
+        Args:
+            used: Trueなら今使ったものとして記録（呼び出し元がそのまま返す場合）。
+                  Falseなら未使用の候補として積む（複数案生成の残りなど）
+        """
+        if self.window <= 0 or not comment:
+            return
+        pool = self._pools.setdefault(key, {})
+        if used:
+            pool[comment] = self.clock()
+        else:
+            pool.setdefault(comment, None)
+
+        if len(pool) > self.max_per_key:
+            # 最も昔に使った候補から捨てる（未使用の候補は残す）
+            used_items = [(ts, c) for c, ts in pool.items() if ts is not None]
+            victim = min(used_items)[1] if used_items else next(iter(pool))
+            del pool[victim]
+
+    def size(self, key: Optional[Hashable] = None) -> int:
+        """候補数（key を省略すると全キーの合計）"""
+        if key is not None:
+            return len(self._pools.get(key, {}))
+        return sum(len(pool) for pool in self._pools.values())
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "keys": len(self._pools),
+            "candidates": self.size(),
+        }
@@ -0,0 +1,189 @@
+"""
+Image Gate: VLMに投げる前の軽量な画像チェック（CPUのみ）
+
+ブレた写真・レンズキャップ・白飛びした写真も全部VLMに送っていたが、
+結局 P11/P12（フラット）に落ちるだけだった。ここで先に
+- 顔の数（OpenCV Haar、cv_features）
+- ブレ（ラプラシアンの分散）
+- 露出（輝度ヒストグラム）
+を見て、明らかに使えない画像は VLM を呼ばずにフラット判定、または拒否する。
+Haar は横顔・マスク・コスプレの顔を取りこぼすため、顔が見つからないだけの画像はフラットにせず
+（横顔カスケードに当たれば顔ありとして）CVのフラグを埋めたうえでVLMに送る。
+デコードできない画像（壊れたファイル・画像でないバイト列）も例外にせず拒否（undecodable）にする。
+顔の数・大きさ・背景のエッジ密度から group_feeling / close_dist / crowd_venue も決める。
+
+使用方法:
+    from image_gate import ImageGate, PASS, FLAT, REJECT
+
+    gate = ImageGate()
+    result = gate.check(image_bytes)
+    if result["decision"] == FLAT:
+        base_scores, flags = flat_scores(result), result["flags"]
+
+    python image_gate.py --image "path/to/image.jpg"
+"""
+
+from typing import Dict, Union
+import os
+
+import cv2
+import numpy as np
+
+from cv_features import CvFeatureExtractor, PREFILLED_FLAGS, prefill_flags
+from image_loader import load_image_bgr
+
+
+# =============================================================================
+# 設定
+# =============================================================================
+
+CONFIG = {
+    # 判定用の長辺サイズ（顔検出・フラグのしきい値は cv_features.CONFIG）
+    "max_image_size": 640,
+
+    # ブレ: ラプラシアン分散がこれ未満ならピンボケ・手ブレ
+    "blur_threshold": 40.0,
+
+    # 露出: 暗部(<16)/明部(>239)の画素がこの割合を超えたら潰れている
+    "clip_ratio": 0.92,
+    # 輝度の標準偏差がこれ未満ならほぼ単色（レンズキャップ・真っ白など）
+    "min_contrast": 6.0,
+
+    # 顔（正面・横顔とも）が見つからない画像もVLMを呼ばずフラットにする（Haarの見落としも巻き込む）
+    "flat_without_face": os.getenv("KOTARO_GATE_FLAT_NO_FACE", "0") == "1",
+}
+
+# 判定結果
+PASS = "pass"        # VLMで通常解析
+FLAT = "flat"        # VLMを呼ばずフラットパターン
+REJECT = "reject"    # 解析不能（422を返す）
+
+
+class ImageGate:
+    """顔数・ブレ・露出による事前判定"""
+
+    def __init__(self):
+        self.features = CvFeatureExtractor()
+
+    def check(self, image: Union[str, bytes, np.ndarray]) -> Dict:
+        """
+        画像を判定
+
+        Args:
+            image: 画像パス、エンコード済みバイト列、またはBGR配列
+
+        Returns:
+            {"decision": PASS/FLAT/REJECT, "reason": 判定理由, "faces": 顔数,
+             "blur": ラプラシアン分散, "exposure": {...}, "features": {...}, "flags": {...}}
+        """
+        try:
+            img = image if isinstance(image, np.ndarray) else load_image_bgr(image, CONFIG["max_image_size"])
+        except Exception:
+            return self._undecodable()
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+        # 露出
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).flatten() / gray.size
+        exposure = {
+            "mean": round(float(gray.mean()), 1),
+            "contrast": round(float(gray.std()), 1),
+            "dark_ratio": round(float(hist[:16].sum()), 3),
+            "bright_ratio": round(float(hist[240:].sum()), 3),
+        }
+
+        # ブレ
+        blur = round(float(cv2.Laplacian(gray, cv2.CV_64F).var()), 1)
+
+        # 顔・背景（CVで決まるフラグもここで出す）
+        features = self.features.extract_gray(gray)
+        faces = features["face_count"]
+        has_face = bool(faces or features["profile"])
+
+        if exposure["contrast"] < CONFIG["min_contrast"]:
+            decision, reason = REJECT, "uniform"
+        elif exposure["dark_ratio"] > CONFIG["clip_ratio"]:
+            decision, reason = REJECT, "underexposed"
+        elif exposure["bright_ratio"] > CONFIG["clip_ratio"]:
+            decision, reason = REJECT, "overexposed"
+        elif blur < CONFIG["blur_threshold"]:
+            decision, reason = FLAT, "blurred"
+        elif not has_face:
+            decision, reason = (FLAT if CONFIG["flat_without_face"] else PASS), "no_face"
+        else:
+            decision, reason = PASS, "ok" if faces else "profile"
+
+        return {
+            "decision": decision,
+            "reason": reason,
+            "faces": faces,
+            "largest_face_ratio": features["face_height_ratio"],
+            "blur": blur,
+            "exposure": exposure,
+            "features": features,
+            "flags": prefill_flags(features),
+        }
+
+    @staticmethod
+    def _undecodable() -> Dict:
+        """読めない画像の判定結果（他の判定と同じキーを持つ）"""
+        return {
+            "decision": REJECT,
+            "reason": "undecodable",
+            "faces": 0,
+            "largest_face_ratio": 0.0,
+            "blur": None,
+            "exposure": None,
+            "features": None,
+            "flags": {key: False for key in PREFILLED_FLAGS},
+        }
+
+
+def flat_scores(gate_result: Dict) -> Dict[str, float]:
+    """
+    VLMを飛ばす場合の基礎スコア（決定木で必ずフラットに落ちる値）
+
+    顔が無い写真は「状況フラット」(P12) になるよう二次加点後の B をちょうど2.0に、
+    それ以外は二次加点後も全要素が2.0以下に収まる低い値にする（会場・群衆なら crowd_venue で P12）。
+    """
+    if gate_result["faces"] == 0:
+        b = 1.3 if gate_result["flags"]["crowd_venue"] else 2.0  # crowd_venue の B+0.7 を見込む
+        return {"A": 0.5, "B": b, "C": 0.5, "D": 0.5, "E": 0}
+    return {"A": 0.5, "B": 0.5, "C": 0.5, "D": 0.5, "E": 0}
+
+
+def merge_flags(vlm_flags: Dict[str, bool], gate_result: Dict) -> Dict[str, bool]:
+    """
+    CVで決まるフラグをVLMのフラグに足す
+
+    VLMに聞いていない（プロンプトから外した）フラグはCVの値がそのまま入り、
+    聞いた場合はVLMが見落とした複数人・近距離・会場を補う。
+    """
+    merged = dict(vlm_flags)
+    for key in PREFILLED_FLAGS:
+        merged[key] = bool(merged.get(key)) or gate_result["flags"][key]
+    return merged
+
+
+# CLI
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Image Gate: VLM前の画像チェック")
+    parser.add_argument("--image", type=str, required=True, help="画像ファイルのパス")
+    args = parser.parse_args()
+
+    result = ImageGate().check(args.image)
+
+    print("\n🚪 Image Gate")
+    print("=" * 40)
+    print(f"  判定: {result['decision']} ({result['reason']})")
+    print(f"  顔: {result['faces']} (最大 {result['largest_face_ratio']:.0%})")
+    print(f"  ブレ: {result['blur']}")
+    print(f"  露出: {result['exposure']}")
+    print(f"  特徴: {result['features']}")
+    print(f"  フラグ: {result['flags']}")
+    print("=" * 40)
+
+
+if __name__ == "__main__":
+    main()
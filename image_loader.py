@@ -0,0 +1,81 @@
+"""
+Image Loader: 縮小デコード対応の共通画像読み込み
+
+VisionCore・VLMスクリプト・SentimentBridge はいずれも最終的に1024px以下に縮めて使うのに、
+24MP級のJPEGをフル解像度で展開してから縮小していた。
+ここでは PIL の draft()（libjpegのDCTスケーリング）で 1/2・1/4・1/8 のまま直接デコードし、
+EXIFの回転情報を反映してから目標サイズに収める。
+
+使用方法:
+    from image_loader import load_image, load_image_bgr
+
+    image = load_image("photo.jpg", max_size=1024)        # PIL.Image (RGB)
+    image = load_image(upload_bytes, max_size=1024)       # バイト列も可
+    bgr = load_image_bgr("photo.jpg", max_size=1024)      # OpenCV/DeepFace用 ndarray
+"""
+
+import io
+from typing import Optional, Union
+
+from PIL import Image, ImageOps
+
+ImageSource = Union[str, bytes, bytearray, memoryview]
+
+
+def open_reduced(source: ImageSource, max_size: Optional[int] = None, mode: str = "RGB") -> Image.Image:
+    """
+    画像を開き、可能なら縮小デコードする（最終リサイズは行わない）
+
+    JPEGで max_size より大きい場合、draft() で max_size 以上を保つ最小のスケールを選ぶ。
+    EXIF Orientation を反映した向きで返す。
+
+    Args:
+        source: ファイルパス、またはエンコード済みのバイト列
+        max_size: 長辺の目標サイズ（Noneなら縮小デコードしない）
+        mode: 出力のカラーモード
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+
+    if max_size and image.format == "JPEG" and max(image.size) > max_size:
+        # 正方形で要求すれば回転（EXIF）後も長辺 >= max_size が保証される
+        image.draft(mode, (max_size, max_size))
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != mode:
+        image = image.convert(mode)
+    return image
+
+
+def fit_within(image: Image.Image, max_size: int) -> Image.Image:
+    """長辺を max_size に収める（LANCZOS）。小さい画像はそのまま返す"""
+    w, h = image.size
+    if max(w, h) <= max_size:
+        return image
+    if w > h:
+        new_w, new_h = max_size, int(h * max_size / w)
+    else:
+        new_w, new_h = int(w * max_size / h), max_size
+    return image.resize((new_w, new_h), Image.Resampling.LANCZOS)
+
+
+def load_image(source: ImageSource, max_size: Optional[int] = None, mode: str = "RGB") -> Image.Image:
+    """縮小デコード + EXIF回転 + 長辺 max_size へのリサイズ"""
+    image = open_reduced(source, max_size, mode)
+    return fit_within(image, max_size) if max_size else image
+
+
+def load_image_bgr(source: ImageSource, max_size: Optional[int] = None):
+    """
+    load_image の結果を OpenCV 形式（BGR, uint8 ndarray）で返す
+
+    PILの raw エンコーダで直接BGR順のバイト列にし、np.frombuffer でコピーせずに配列化する
+    （RGB配列化 → チャンネル反転 → 連続化 の2回のコピーをしない）。
+    返す配列は読み取り専用なので、書き換える場合は .copy() すること。
+    """
+    import numpy as np
+
+    image = load_image(source, max_size, "RGB")
+    w, h = image.size
+    return np.frombuffer(image.tobytes("raw", "BGR"), np.uint8).reshape(h, w, 3)
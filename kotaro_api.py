@@ -8,23 +8,32 @@ Kotaro-Engine API Server (V3.0)
 - ただし誤解の仕方を12通りに制御する
 - 正しさより、刺さり
 """
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import httpx
 import uvicorn
+import asyncio
 import base64
 import tempfile
 import os
 import json
 import logging
+import re
 import time
 from typing import List, Dict, Any, Optional
 from kotaro_scoring_v4 import KotaroScorerV4
+from kotaro_logging import setup_logging, request_id_var, new_request_id, RAW_OUTPUT
+from comment_sampler import CommentSampler, ALL_PATTERNS
+from generation_cache import CandidateCache
+from image_gate import ImageGate, FLAT, REJECT, flat_scores, merge_flags
+from cv_features import PREFILLED_FLAGS, cross_check_flags
+import async_io
 from openai import AsyncOpenAI
 import random
 
-# ロガー設定
-logging.basicConfig(level=logging.INFO)
+# ロガー設定（キュー経由の非同期JSONログ。書式化・書き込みは別スレッド）
+setup_logging()
 logger = logging.getLogger("kotaro_api_v4")
 
 # =============================================================================
@@ -95,9 +104,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def assign_request_id(request, call_next):
+    """リクエストIDを発行し、ログとレスポンスヘッダに付与"""
+    rid = request.headers.get("X-Request-ID") or new_request_id()
+    token = request_id_var.set(rid)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = rid
+    return response
+
 # V4.2 スコアラー
 scorer = KotaroScorerV4()
 
+# VLM前の事前判定（顔数・ブレ・露出）。使えない画像はVLMを呼ばない
+# 検出器はスレッドごとに持つので、1つのインスタンスを asyncio.to_thread から同時に呼んでよい
+USE_IMAGE_GATE = os.getenv("KOTARO_IMAGE_GATE", "1") == "1"
+image_gate = ImageGate() if USE_IMAGE_GATE else None
+# CVで測れるフラグ（close_dist / group_feeling / crowd_venue）はVLMに聞かない（要 image_gate）
+USE_CV_FLAGS = os.getenv("KOTARO_CV_FLAGS", "1") == "1"
+
 # VLM設定
 LMDEPLOY_API_URL = "http://localhost:23334/v1"
 LMDEPLOY_API_KEY = "dummy"
@@ -105,15 +134,125 @@ LMDEPLOY_API_KEY = "dummy"
 # OpenAI Client (Async)
 client = AsyncOpenAI(api_key=LMDEPLOY_API_KEY, base_url=LMDEPLOY_API_URL)
 
+# 起動時ウォームアップ設定
+WARMUP_TIMEOUT = float(os.getenv("KOTARO_WARMUP_TIMEOUT", "300"))   # 2秒間隔で待つ期間(秒)。以降はバックオフで再試行
+WARMUP_MAX_BACKOFF = float(os.getenv("KOTARO_WARMUP_MAX_BACKOFF", "60"))  # 期限後の再試行間隔の上限(秒)
+READY_CHECK_TTL = float(os.getenv("KOTARO_READY_CHECK_TTL", "5"))   # /ready のバックエンド確認キャッシュ(秒)
+
+
+# =============================================================================
+# ウォームアップ・レディネス
+# =============================================================================
+class Readiness:
+    """VLMバックエンドの準備状態と起動時間メトリクス"""
+    
+    def __init__(self):
+        self.started_at = time.time()
+        self.warmed_up = False
+        self.metrics: Dict[str, float] = {}
+        self.last_error: Optional[str] = None
+        self.warmup_task: Optional[asyncio.Task] = None
+        self._last_check = 0.0
+        self._last_check_ok = False
+    
+    @staticmethod
+    def _warmup_image() -> str:
+        """ビジョンエンコーダも通すための小さな画像（Qwen2-VLの最小解像度56px以上）"""
+        from PIL import Image
+        import io
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 64), (128, 128, 128)).save(buf, "JPEG")
+        return base64.b64encode(buf.getvalue()).decode("ascii")
+    
+    async def warmup(self):
+        """
+        LMDeployの起動を待ち、画像付きのダミー生成でビジョンエンコーダ・カーネル・KVキャッシュを確保する
+        
+        WARMUP_TIMEOUT までは2秒間隔、以降は指数バックオフ（最大 WARMUP_MAX_BACKOFF 秒）で
+        成功するまで再試行し続ける（後からLMDeployが上がっても /ready が200になる）。
+        """
+        deadline = time.time() + WARMUP_TIMEOUT
+        delay = 2.0
+        warned = False
+        image = self._warmup_image()
+        while True:
+            try:
+                t0 = time.perf_counter()
+                await client.models.list()
+                self.metrics["backend_wait_s"] = round(time.time() - self.started_at, 2)
+                
+                await client.chat.completions.create(
+                    model="Qwen2-VL-2B-Instruct",
+                    messages=[{"role": "user", "content": [
+                        {"type": "text", "text": "OK"},
+                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image}"}},
+                    ]}],
+                    max_tokens=1,
+                )
+                self.metrics["warmup_s"] = round(time.perf_counter() - t0, 2)
+                self.metrics["startup_s"] = round(time.time() - self.started_at, 2)
+                self.warmed_up = True
+                self.last_error = None
+                logger.info("Warm-up complete", extra={"startup_metrics": self.metrics})
+                return
+            except Exception as e:
+                self.last_error = str(e)
+                if time.time() > deadline:
+                    if not warned:
+                        logger.error("Warm-up not complete after %.0fs, retrying with backoff: %s", WARMUP_TIMEOUT, e)
+                        warned = True
+                    delay = min(delay * 2, WARMUP_MAX_BACKOFF)
+                await asyncio.sleep(delay)
+    
+    def ensure_warmup(self):
+        """ウォームアップ未完了で実行中のタスクが無ければ（例外で終わった等）始め直す"""
+        if not self.warmed_up and (self.warmup_task is None or self.warmup_task.done()):
+            self.warmup_task = asyncio.create_task(self.warmup())
+    
+    async def backend_alive(self) -> bool:
+        """バックエンドの生存確認（READY_CHECK_TTL秒キャッシュ）"""
+        now = time.time()
+        if now - self._last_check < READY_CHECK_TTL:
+            return self._last_check_ok
+        try:
+            await asyncio.wait_for(client.models.list(), timeout=2)
+            self._last_check_ok = True
+            self.last_error = None
+        except Exception as e:
+            self._last_check_ok = False
+            self.last_error = str(e)
+        self._last_check = now
+        return self._last_check_ok
+
+
+readiness = Readiness()
+
+
+@app.on_event("startup")
+async def start_warmup():
+    """ウォームアップはバックグラウンドで実行（/health は即応答、/ready は完了まで503）"""
+    readiness.ensure_warmup()
+
 
 # =============================================================================
 # VLM分析 (A-E採点 + V4フラグ検出)
 # =============================================================================
-async def call_vlm_analysis_v4(image_path: str) -> Dict[str, Any]:
-    """VLMに画像を投げてA-Eスコアと二次加点用フラグを取得"""
+def _omit_flags(prompt: str, names) -> str:
+    """プロンプトから指定フラグの判定基準行と出力例の行を取り除く"""
+    def mentions(line: str) -> bool:
+        stripped = line.strip()
+        return any(stripped.startswith((f"- {n}:", f'"{n}":')) for n in names)
+    return "\n".join(line for line in prompt.split("\n") if not mentions(line))
+
+
+async def call_vlm_analysis_v4(image_path: str, omit_flags=()) -> Dict[str, Any]:
+    """
+    VLMに画像を投げてA-Eスコアと二次加点用フラグを取得
+    
+    omit_flags に指定したフラグはプロンプトから外す（CVで埋める分、生成トークンを減らす）
+    """
     
-    with open(image_path, "rb") as f:
-        b64_img = base64.b64encode(f.read()).decode("utf-8")
+    b64_img = await async_io.read_base64(image_path)
     
     system_prompt = """# Kotaro VLM Analysis Protocol
 ## 0. 位置づけ（最上位）
@@ -209,6 +348,8 @@ E = round((合計ポイント / 15) * 5)
 
 ## Final Output
 """
+    if omit_flags:
+        user_prompt = _omit_flags(user_prompt, omit_flags)
 
     messages = [
         {"role": "system", "content": system_prompt},
@@ -230,7 +371,7 @@ E = round((合計ポイント / 15) * 5)
         )
         
         content = completion.choices[0].message.content
-        logger.info(f"VLM Raw Response: {content}")
+        logger.info("VLM Raw Response: %s", content, extra=RAW_OUTPUT)
         
         # JSONパース
         clean_content = content.replace("```json", "").replace("```", "").strip()
@@ -242,7 +383,7 @@ E = round((合計ポイント / 15) * 5)
         return base_scores, flags
         
     except Exception as e:
-        logger.error(f"VLM Error: {e}")
+        logger.error("VLM Error: %s", e)
         # フォールバック
         return {"A": 3, "B": 3, "C": 3, "D": 3, "E": 3}, {}
 
@@ -270,6 +411,63 @@ PATTERN_EXAMPLES = {
     "P12": ["楽しそうでいいね😊", "笑顔が素敵！✨", "いい瞬間だね。かわいい❤"],
 }
 
+# ハレーション検出: 禁止パターン
+HALLUCINATION_PATTERNS = [
+    # ① 自己言及（絶対禁止）
+    "虎太郎", "純米", "俺", "私が", "僕が", "私は", "僕は", "私の",
+    # ② 呼称禁止（絶対禁止）
+    "モデルさん", "あなた", "貴方", "お嬢さん", "お姉さん",
+    # ③ 不自然な日本語（馬鹿にしているように聞こえる）
+    "極み", "完璧", "素晴らしい", "一番ですね", "最高ですね",
+    "ますね", "でしょうか", "ございます",
+    "まるで", "のように", "ているように",
+    # ④ 場面/構図を褒める（モデルを褒めろ！）
+    "構図が", "背景が", "背景との", "イベント感", "情報量",
+    "世界観が", "空気が", "場の", "お写真は", "写真が",
+    # ⑤ プロンプト漏れ（構造違反）
+    "コメントを生成", "絶対に使わない",
+    "参考コメント", "上記の例", "出力形式", "短いコメント",
+    "【", "】", "・", "「", "」", "- ",
+    # ⑥ 無関係な内容（ハレーション）
+    "愛犬", "犬", "猫", "ペット", "手足を合わせて", "朝から夕まで",
+]
+
+# 生成・いいね済みコメントとして使える長さ
+COMMENT_MIN_LENGTH = 5
+COMMENT_MAX_LENGTH = 50
+
+
+def find_comment_problem(comment: str) -> Optional[str]:
+    """生成コメントの不合格理由（禁止パターン・長すぎる・同じ文字の連続）。合格ならNone"""
+    for pattern in HALLUCINATION_PATTERNS:
+        if pattern in comment:
+            return f"禁止パターン: '{pattern}'"
+    
+    # 長すぎるコメントもハレーションの可能性
+    if len(comment) > COMMENT_MAX_LENGTH:
+        return f"長すぎる ({len(comment)}文字)"
+    
+    # 絵文字連続検出（✨✨✨...など）
+    if re.search(r'(.)\1{2,}', comment):  # 同じ文字が3回以上連続
+        return "文字/絵文字の連続"
+    
+    return None
+
+
+def is_servable_comment(comment: str) -> bool:
+    """他のユーザーに返してよいコメントか（生成コメントと同じ検査 + 最低文字数）"""
+    return len(comment) >= COMMENT_MIN_LENGTH and find_comment_problem(comment) is None
+
+
+# フォールバック抽選（PATTERN_EXAMPLES + いいね済みコメントを、いいね数で重み付け）
+# いいね履歴はフィードバックAPIの初期化時に読み込む。いいね済みコメントは生成コメントと同じ検査に通ったものだけ候補に入れる
+comment_sampler = CommentSampler(PATTERN_EXAMPLES, validator=is_servable_comment)
+
+# 生成済みコメントの再利用（プロンプトはパターンIDだけで決まるため、キーはパターンID）
+# 重複防止期間（comment_cache と同じ1時間）内に未使用の候補があればLLMを呼ばない
+USE_GENERATION_CACHE = os.getenv("KOTARO_GENERATION_CACHE", "1") == "1"
+generation_cache = CandidateCache(window_seconds=comment_cache.ttl if USE_GENERATION_CACHE else 0)
+
 async def call_kotaro_generation_v3(pattern_info: Dict, element_scores: Dict[str, int], name: str) -> str:
     """V3.0: パターン情報とA-Eスコアからコメントを生成（修正版）"""
     
@@ -278,6 +476,13 @@ async def call_kotaro_generation_v3(pattern_info: Dict, element_scores: Dict[str
     if pattern_id not in PATTERN_EXAMPLES:
         pattern_id = 'P01'  # フォールバック
     
+    # 同じパターンで以前生成した合格コメントのうち、1時間以内に使っていないものがあればそれを使う
+    cached = generation_cache.take(pattern_id, comment_cache.is_duplicate)
+    if cached is not None:
+        comment_cache.add(cached)
+        logger.debug("Generation cache hit: '%.25s...' (%s)", cached, generation_cache.stats())
+        return cached
+    
     # 実例コメントを取得
     examples = PATTERN_EXAMPLES.get(pattern_id, PATTERN_EXAMPLES['P01'])
     examples_text = "\n".join([f"・{ex}" for ex in examples])
@@ -341,100 +546,65 @@ async def call_kotaro_generation_v3(pattern_info: Dict, element_scores: Dict[str
         # クリーンアップ: 引用符、改行、余計な文字を除去
         comment = raw.replace('"', '').replace("'", '').replace('\n', '').strip()
         
-        # ハレーション検出: 禁止パターン
-        hallucination_patterns = [
-            # ① 自己言及（絶対禁止）
-            "虎太郎", "純米", "俺", "私が", "僕が", "私は", "僕は", "私の",
-            # ② 呼称禁止（絶対禁止）
-            "モデルさん", "あなた", "貴方", "お嬢さん", "お姉さん",
-            # ③ 不自然な日本語（馬鹿にしているように聞こえる）
-            "極み", "完璧", "素晴らしい", "一番ですね", "最高ですね",
-            "ますね", "でしょうか", "ございます",
-            "まるで", "のように", "ているように",
-            # ④ 場面/構図を褒める（モデルを褒めろ！）
-            "構図が", "背景が", "背景との", "イベント感", "情報量",
-            "世界観が", "空気が", "場の", "お写真は", "写真が",
-            # ⑤ プロンプト漏れ（構造違反）
-            "コメントを生成", "絶対に使わない",
-            "参考コメント", "上記の例", "出力形式", "短いコメント",
-            "【", "】", "・", "「", "」", "- ",
-            # ⑥ 無関係な内容（ハレーション）
-            "愛犬", "犬", "猫", "ペット", "手足を合わせて", "朝から夕まで",
-        ]
-        
-        is_hallucination = False
-        hallucination_reason = ""
-        
-        for pattern in hallucination_patterns:
-            if pattern in comment:
-                hallucination_reason = f"禁止パターン: '{pattern}'"
-                is_hallucination = True
-                break
-        
-        # 長すぎるコメントもハレーションの可能性
-        if not is_hallucination and len(comment) > 50:
-            hallucination_reason = f"長すぎる ({len(comment)}文字)"
-            is_hallucination = True
-        
-        # 絵文字連続検出（✨✨✨...など）
-        import re
-        if not is_hallucination and re.search(r'(.)\1{2,}', comment):  # 同じ文字が3回以上連続
-            hallucination_reason = "文字/絵文字の連続"
-            is_hallucination = True
+        # ハレーション検出（禁止パターン・長さ・同じ文字の連続）
+        hallucination_reason = find_comment_problem(comment)
         
         # ハレーション時はフォールバック
-        if is_hallucination:
-            logger.warning(f"Hallucination detected ({hallucination_reason}): '{comment[:40]}...'")
-            comment = random.choice(examples)
+        generated = None
+        if hallucination_reason:
+            logger.warning("Hallucination detected (%s): '%.40s...'", hallucination_reason, comment)
+            comment = comment_sampler.sample(pattern_id)
+        elif len(comment) >= COMMENT_MIN_LENGTH:
+            generated = comment
         
         # 空になったらフォールバック
-        if not comment or len(comment) < 5:
-            comment = random.choice(examples)
+        if not comment or len(comment) < COMMENT_MIN_LENGTH:
+            comment = comment_sampler.sample(pattern_id)
         
         # 重複キャッシュチェック（1時間以内に使用されたコメントをブロック）
         if comment_cache.is_duplicate(comment):
-            logger.warning(f"Duplicate blocked: '{comment[:30]}...' (cache: {comment_cache.size()})")
+            logger.warning("Duplicate blocked: '%.30s...' (cache: %d)", comment, comment_cache.size())
+            if generated is not None:
+                # 返さなかった合格コメントは未使用の候補として保持（comment_cache から消えれば再利用できる）
+                generation_cache.add(pattern_id, generated, used=False)
+                generated = None
             found_fallback = False
             
-            # Step 1: 同じパターンのサンプルから探す
-            for fallback in random.sample(examples, len(examples)):
-                if not comment_cache.is_duplicate(fallback):
-                    comment = fallback
-                    found_fallback = True
-                    logger.info(f"Using same-pattern fallback: '{fallback[:20]}...'")
-                    break
+            # Step 1: 同じパターンの候補（実例 + いいね済み）から重み付きで探す
+            fallback = comment_sampler.sample_unused(pattern_id, comment_cache.is_duplicate)
+            if fallback:
+                comment = fallback
+                found_fallback = True
+                logger.info("Using same-pattern fallback: '%.20s...'", fallback)
             
-            # Step 2: 同じパターンが全て使用済み → 他パターンから借りる
+            # Step 2: 同じパターンが全て使用済み → 他パターンから借りる（尽きた元パターンは除く）
             if not found_fallback:
-                all_examples = []
-                for pid, exs in PATTERN_EXAMPLES.items():
-                    if pid != pattern_id:  # 他のパターンから
-                        all_examples.extend(exs)
-                random.shuffle(all_examples)
-                
-                for fallback in all_examples:
-                    if not comment_cache.is_duplicate(fallback):
-                        comment = fallback
-                        found_fallback = True
-                        logger.info(f"Using cross-pattern fallback: '{fallback[:20]}...'")
-                        break
+                fallback = comment_sampler.sample_unused(
+                    ALL_PATTERNS, comment_cache.is_duplicate, exclude=pattern_id
+                )
+                if fallback:
+                    comment = fallback
+                    found_fallback = True
+                    logger.info("Using cross-pattern fallback: '%.20s...'", fallback)
             
-            # Step 3: それでも見つからない（全36+サンプルが1時間以内に使用済み）
+            # Step 3: それでも見つからない（候補プール全てが1時間以内に使用済み）
             if not found_fallback:
                 # ユニークなタイムスタンプを付けて強制的にユニーク化
                 unique_suffix = f"_{int(time.time()) % 1000}"
                 comment = random.choice(examples).rstrip("❤✨😊😍") + unique_suffix + random.choice(["❤", "✨"])
-                logger.warning(f"All examples exhausted, forced unique: '{comment}'")
+                logger.warning("All examples exhausted, forced unique: '%s'", comment)
         
-        # 使用したコメントをキャッシュに追加
+        # 使用したコメントをキャッシュに追加（生成したものをそのまま返すなら生成キャッシュにも使用済みで積む）
         comment_cache.add(comment)
-        logger.info(f"Cache add: '{comment[:25]}...' (total: {comment_cache.size()})")
+        if generated is not None:
+            generation_cache.add(pattern_id, generated)
+        logger.debug("Cache add: '%.25s...' (total: %d)", comment, len(comment_cache.cache))
         
         return comment
         
     except Exception as e:
-        logger.error(f"Comment Generation Error: {e}")
-        fallback = random.choice(examples)
+        logger.error("Comment Generation Error: %s", e)
+        fallback = comment_sampler.sample(pattern_id)
         comment_cache.add(fallback)
         return fallback  # フォールバック
 
@@ -446,9 +616,26 @@ async def call_kotaro_generation_v3(pattern_info: Dict, element_scores: Dict[str
 # =============================================================================
 @app.get("/health")
 async def health_check():
+    """生存確認（プロセスが応答できるか）"""
     return {"status": "ok", "version": "3.0", "engine": "kotaro_v3"}
 
 
+@app.get("/ready")
+async def ready_check():
+    """準備完了確認（ウォームアップ済みかつVLMバックエンドが応答する場合のみ200）"""
+    readiness.ensure_warmup()  # ウォームアップが止まっていたら再開
+    ready = readiness.warmed_up and await readiness.backend_alive()
+    body = {
+        "ready": ready,
+        "warmed_up": readiness.warmed_up,
+        "uptime_s": round(time.time() - readiness.started_at, 1),
+        "metrics": readiness.metrics,
+    }
+    if not ready:
+        body["error"] = readiness.last_error
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
 @app.post("/generate")
 async def generate_comment(
     image: UploadFile = File(...),
@@ -457,35 +644,52 @@ async def generate_comment(
 ):
     """V4.2 コメント生成エンドポイント"""
     
+    content = await image.read()
+    
+    # 0. 事前判定（CPU）: 解析不能な画像はここで拒否
+    gate = await asyncio.to_thread(image_gate.check, content) if image_gate else None
+    if gate and gate["decision"] == REJECT:
+        logger.info("Image rejected by gate: %s", gate["reason"], extra={"gate": gate})
+        raise HTTPException(status_code=422, detail=f"Unusable image: {gate['reason']}")
+    
     # 画像一時保存
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-        content = await image.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+    tmp_path = await async_io.write_temp(content, suffix=".jpg")
         
     try:
-        # 1. VLM分析（A-E採点 + フラグ）
-        logger.info("Calling VLM for V4 analysis...")
-        base_scores, flags = await call_vlm_analysis_v4(tmp_path)
-        logger.info(f"Base Scores: {base_scores}")
-        logger.info(f"Flags: {flags}")
+        # 1. VLM分析（A-E採点 + フラグ）。ブレた画像はVLMを飛ばしてフラット判定（顔が見つからないだけならVLMへ）
+        t_start = time.perf_counter()
+        if gate and gate["decision"] == FLAT:
+            base_scores, flags = flat_scores(gate), dict(gate["flags"])
+        else:
+            omit = PREFILLED_FLAGS if (gate and USE_CV_FLAGS) else ()
+            base_scores, flags = await call_vlm_analysis_v4(tmp_path, omit_flags=omit)
+            if gate:
+                # CVのフラグで埋め・補い、顔の向きと矛盾するポーズ系フラグを落とす
+                flags = cross_check_flags(merge_flags(flags, gate), gate["features"])
+        t_vlm = time.perf_counter()
         
         # 2. 二次加点 (分布散らし)
-        logger.info("Applying secondary scoring...")
         adj_scores = scorer.apply_secondary_scoring(base_scores, flags)
-        logger.info(f"Adjusted Scores: {adj_scores}")
         
         # 3. パターン決定 (V4.2決定木)
-        logger.info("Determining pattern (V4.2)...")
         pattern_result = scorer.decide_pattern(adj_scores, flags)
         pattern_id = pattern_result["pattern_id"]
         pattern_info = scorer.get_pattern_info(pattern_id)
         
-        logger.info(f"Pattern: {pattern_id} ({pattern_info['name']})")
-        logger.info(f"Result: {pattern_result}")
+        # 1リクエスト1レコードに集約（構造化フィールドで検索可能）
+        logger.info(
+            "Pattern: %s (%s)", pattern_id, pattern_info["name"],
+            extra={
+                "base_scores": base_scores,
+                "flags": flags,
+                "adj_scores": adj_scores,
+                "result": pattern_result,
+                "vlm_ms": round((t_vlm - t_start) * 1000, 1),
+                "gate": gate,
+            },
+        )
         
         # 4. コメント生成
-        logger.info("Generating Kotaro comment...")
         comments = []
         # TODO: generate function needs update to handle new pattern keys if necessary, strictly reusing v3 generator logic for now
         # V3 generator uses pattern_id/name/attack, which V4 pattern_info provides.
@@ -520,88 +724,79 @@ async def generate_comment(
             "element_scores": adj_scores,  # V4.2 Adjusted Scores
             "base_scores": base_scores,    # Raw Scores
             "flags": [k for k, v in flags.items() if v],
+            "gate": {k: gate[k] for k in ("decision", "reason", "faces")} if gate else None,
             "comments": comments,
         }
         
     except Exception as e:
-        logger.error(f"Generation Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Generation Error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
         
     finally:
-        os.remove(tmp_path)
+        await async_io.remove(tmp_path)
 
 
 # =============================================================================
 # フィードバックAPI（コメント学習用）
 # =============================================================================
-FEEDBACK_FILE = os.path.join(os.path.dirname(__file__), "feedback_likes.json")
+FEEDBACK_FILE = os.path.join(os.path.dirname(__file__), "feedback_likes.jsonl")
+FEEDBACK_LEGACY_FILE = os.path.join(os.path.dirname(__file__), "feedback_likes.json")
 
 from pydantic import BaseModel
+from feedback_store import FeedbackStore, FeedbackStats
+
+# 追記専用ストア（旧 feedback_likes.json は初回起動時に取り込み）
+feedback_store = FeedbackStore(FEEDBACK_FILE, legacy_path=FEEDBACK_LEGACY_FILE)
+# 集計・フォールバック抽選は起動時にログから再構築し、以降は書き込み時に差分更新
+_feedback_entries = feedback_store.load()
+feedback_stats = FeedbackStats.from_entries(_feedback_entries)
+comment_sampler.load_likes(_feedback_entries)
+if comment_sampler.rejected_likes:
+    logger.info("Liked comments excluded from fallback pool: %d", comment_sampler.rejected_likes)
+del _feedback_entries
 
 class FeedbackRequest(BaseModel):
     comment: str
     pattern: str = "unknown"
     timestamp: str = ""
+    event: str = ""
 
 @app.post("/feedback/like")
 async def save_feedback(request: FeedbackRequest):
-    """いいねされたコメントを保存（将来の学習用）"""
+    """いいねされたコメントを保存（将来の学習用・全履歴保持）"""
     try:
-        # 既存のフィードバックを読み込み
-        feedback_data = []
-        if os.path.exists(FEEDBACK_FILE):
-            with open(FEEDBACK_FILE, 'r', encoding='utf-8') as f:
-                feedback_data = json.load(f)
-        
-        # 新しいフィードバックを追加
-        feedback_data.append({
+        entry = {
             "comment": request.comment,
             "pattern": request.pattern,
             "timestamp": request.timestamp or time.strftime("%Y-%m-%dT%H:%M:%S"),
             "liked_at": time.strftime("%Y-%m-%dT%H:%M:%S")
-        })
-        
-        # 最新1000件のみ保持（肥大化防止）
-        if len(feedback_data) > 1000:
-            feedback_data = feedback_data[-1000:]
+        }
+        if request.event:
+            entry["event"] = request.event
         
-        # 保存
-        with open(FEEDBACK_FILE, 'w', encoding='utf-8') as f:
-            json.dump(feedback_data, f, ensure_ascii=False, indent=2)
+        # 1行追記のみ（履歴件数に依存しない）
+        total = await feedback_store.append(entry)
+        feedback_stats.add(entry)
+        # 履歴には残すが、フォールバック候補には生成コメントと同じ検査に通ったものだけ入れる
+        if not comment_sampler.add_like(request.pattern, request.comment) and request.pattern in PATTERN_EXAMPLES:
+            logger.info("Liked comment not added to fallback pool: %s",
+                        find_comment_problem(request.comment) or "too short")
         
-        logger.info(f"Feedback saved: '{request.comment[:30]}...' (pattern: {request.pattern}, total: {len(feedback_data)})")
+        logger.info("Feedback saved: '%.30s...' (pattern: %s, total: %d)", request.comment, request.pattern, total)
         
-        return {"success": True, "total_likes": len(feedback_data)}
+        return {"success": True, "total_likes": total}
     
     except Exception as e:
-        logger.error(f"Feedback save error: {e}")
+        logger.error("Feedback save error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/feedback/stats")
-async def get_feedback_stats():
-    """フィードバック統計を取得"""
+async def get_feedback_stats(top: int = Query(10, ge=0)):
+    """フィードバック統計を取得（メモリ上の集計から返す。ファイルは読まない）"""
     try:
-        if not os.path.exists(FEEDBACK_FILE):
-            return {"total": 0, "by_pattern": {}}
-        
-        with open(FEEDBACK_FILE, 'r', encoding='utf-8') as f:
-            feedback_data = json.load(f)
-        
-        # パターン別集計
-        by_pattern = {}
-        for item in feedback_data:
-            p = item.get("pattern", "unknown")
-            by_pattern[p] = by_pattern.get(p, 0) + 1
-        
-        return {
-            "total": len(feedback_data),
-            "by_pattern": by_pattern,
-            "recent": feedback_data[-10:] if len(feedback_data) > 0 else []
-        }
+        return feedback_stats.snapshot(top=top)
     except Exception as e:
-        logger.error(f"Feedback stats error: {e}")
+        logger.error("Feedback stats error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
         
 if __name__ == "__main__":
@@ -4,12 +4,22 @@ CANDY虎太郎MD v2.1 準拠
 
 使用方法:
     python kotaro_engine.py --image "path/to/image.jpg" --name "栞"
+    python kotaro_engine.py --name "栞" --count 10 --async
+    python kotaro_engine.py --name "栞" --best 5
+    python kotaro_engine.py --name "栞" --constrained
+    python kotaro_engine.py --name "栞" --count 20 --cache
 """
 
+import asyncio
+import json
 import ollama
+import os
 import random
 import re
-from typing import Optional, Dict, List
+from collections import Counter
+from typing import Optional, Dict, List, Union
+
+from generation_cache import CandidateCache
 
 # =============================================================================
 # CANDY虎太郎MD v2.1 設定
@@ -24,6 +34,21 @@ NG_WORDS = [
     "ただただ", "驚愕", "圧倒", "感動"
 ]
 
+# NGワード判定は1本の正規表現で（候補をまとめて検査するため）
+NG_PATTERN = re.compile("|".join(map(re.escape, NG_WORDS)))
+
+# 締めの絵文字
+EMOJIS = ("✨", "📸")
+
+# 候補行の先頭に付く箇条書き・番号・括弧
+CANDIDATE_PREFIX = re.compile(r"^\s*(?:[-・*•]|\d+[.)．、]|[（(]?\d+[)）])\s*")
+
+# 候補ではない行（「以下5案です：」のような前置き・指示文の復唱）
+INSTRUCTION_PATTERN = re.compile(r"文字以内|[0-9０-９一二三四五六七八九十]+案|以下|【|】|お手本|出力")
+
+# コメントらしい文字（かな・カナ・漢字・英字）
+COMMENT_CHARS = re.compile(r"[ぁ-んァ-ヶ一-龥A-Za-zＡ-Ｚａ-ｚ]")
+
 # 90点例文（Few-shot用）- 虎太郎スタイル
 # DJ/HipHop/カメラ/ライター/会社代表/永遠の30代おっさん
 EXAMPLES = {
@@ -48,6 +73,37 @@ EXAMPLES = {
     ]
 }
 
+# 生成オプション（短く・ほどよくばらつかせる）
+GENERATE_OPTIONS = {
+    "temperature": 0.8,
+    "top_p": 0.9,
+    "num_predict": 50,  # 短く制限
+}
+
+# 複数候補モード: 1候補あたりのトークン上限（改行込み）
+TOKENS_PER_CANDIDATE = 40
+
+# 制約付きデコード（Ollama）: JSONスキーマを llama.cpp の文法に変換させ、
+# 18文字を超える文字列はデコード時点で出せないようにする。閉じ括弧で生成が終わる。
+# NGワードは文法で表現できないため、こちらでは生成後の _validate_output で弾く
+# （デコード時にNGワードを禁止するのは constrained_decoding.TransformersKotaroEngine のみ）
+COMMENT_SCHEMA = {
+    "type": "object",
+    "properties": {"comment": {"type": "string", "minLength": 4, "maxLength": 18}},
+    "required": ["comment"],
+}
+CONSTRAINED_OPTIONS = dict(GENERATE_OPTIONS, num_predict=40)  # JSONの枠 + 18文字分
+
+# 複数候補モードの制約付きデコード: 18文字以内の文字列の配列（maxItems は案数に合わせる）
+CANDIDATES_SCHEMA = {
+    "type": "object",
+    "properties": {"comments": {"type": "array", "items": COMMENT_SCHEMA["properties"]["comment"]}},
+    "required": ["comments"],
+}
+
+# 非同期版: 1コメントあたり同時に走らせる試行数（デフォルトの max_retries と同じ3。1で順番にリトライ）
+ASYNC_FANOUT = int(os.getenv("KOTARO_FANOUT", "3"))
+
 # =============================================================================
 # コアエンジン
 # =============================================================================
@@ -55,12 +111,26 @@ EXAMPLES = {
 class KotaroEngine:
     """18文字エモコメント生成エンジン"""
     
-    def __init__(self, model: str = "qwen2.5:7b-instruct-q4_K_M"):
+    def __init__(
+        self,
+        model: str = "qwen2.5:7b-instruct-q4_K_M",
+        constrained: bool = False,
+        cache: Optional[CandidateCache] = None,
+    ):
+        """
+        Args:
+            model: Ollamaモデル名
+            constrained: JSONスキーマ（maxLength）で出力長をデコード時に制限する（NGワードは生成後に検査）
+            cache: 生成済みコメントの再利用キャッシュ（キーは (名前, 感情)）
+        """
         self.model = model
+        self.constrained = constrained
+        self.cache = cache
         self.max_length = 18
+        self.stats = Counter()  # 複数候補モードの集計（calls / candidates / valid / fallbacks）
         
-    def _build_prompt(self, model_name: str, emotion: str = "happy") -> str:
-        """虎太郎プロンプトを構築"""
+    def _build_prompt(self, model_name: str, emotion: str = "happy", candidates: int = 1) -> str:
+        """虎太郎プロンプトを構築（candidates > 1 なら1行1案で複数出させる）"""
         
         # Few-shot例文を選択
         examples = EXAMPLES.get(emotion, EXAMPLES["happy"])
@@ -79,6 +149,16 @@ class KotaroEngine:
 
 【出力】18文字以内で1つ："""
         
+        if candidates > 1 and self.constrained:
+            prompt = prompt.replace(
+                "【出力】18文字以内で1つ：",
+                f'【出力】18文字以内で{candidates}案、JSON {{"comments": ["...", ...]}} で：',
+            )
+        elif candidates > 1:
+            prompt = prompt.replace("【出力】18文字以内で1つ：", f"【出力】18文字以内で{candidates}案、1行に1つずつ：")
+        elif self.constrained:
+            prompt = prompt.replace("【出力】18文字以内で1つ：", '【出力】18文字以内で1つ、JSON {"comment": "..."} で：')
+        
         return prompt
     
     def _validate_output(self, text: str) -> bool:
@@ -88,12 +168,32 @@ class KotaroEngine:
             return False
         
         # NGワードチェック
-        for ng in NG_WORDS:
-            if ng in text:
-                return False
+        if NG_PATTERN.search(text):
+            return False
         
         return True
     
+    def _generate_kwargs(self, candidates: int = 1) -> Dict:
+        """ollama.generate に渡す生成設定（制約付きならスキーマで長さを縛る）"""
+        if candidates > 1:
+            options = dict(GENERATE_OPTIONS, num_predict=TOKENS_PER_CANDIDATE * candidates)
+            if self.constrained:
+                comments = dict(CANDIDATES_SCHEMA["properties"]["comments"], maxItems=candidates)
+                return {"format": dict(CANDIDATES_SCHEMA, properties={"comments": comments}), "options": options}
+            return {"options": options}
+        if self.constrained:
+            return {"format": COMMENT_SCHEMA, "options": CONSTRAINED_OPTIONS}
+        return {"options": GENERATE_OPTIONS}
+    
+    def _extract(self, raw: str) -> str:
+        """応答本文からコメントを取り出す（制約付きならJSONの comment）"""
+        if self.constrained:
+            try:
+                return str(json.loads(raw)["comment"])
+            except (ValueError, KeyError, TypeError):
+                pass
+        return raw
+    
     def _clean_output(self, text: str) -> str:
         """出力のクリーニング"""
         # 改行を除去
@@ -111,8 +211,21 @@ class KotaroEngine:
         
         return text[:self.max_length]
     
+    def _cached(self, model_name: str, emotion: str) -> Optional[str]:
+        """キャッシュに期間内未使用の候補があれば返す"""
+        return self.cache.take((model_name, emotion)) if self.cache is not None else None
+    
+    def _remember(self, model_name: str, emotion: str, comment: str, used: bool = True):
+        """合格した生成結果をキャッシュに積む"""
+        if self.cache is not None:
+            self.cache.add((model_name, emotion), comment, used)
+    
     def generate(self, model_name: str, emotion: str = "happy", max_retries: int = 3) -> str:
-        """18文字コメントを生成"""
+        """18文字コメントを生成（キャッシュに未使用の候補があればLLMを呼ばない）"""
+        
+        cached = self._cached(model_name, emotion)
+        if cached is not None:
+            return cached
         
         prompt = self._build_prompt(model_name, emotion)
         
@@ -121,27 +234,214 @@ class KotaroEngine:
                 response = ollama.generate(
                     model=self.model,
                     prompt=prompt,
-                    options={
-                        "temperature": 0.8,
-                        "top_p": 0.9,
-                        "num_predict": 50,  # 短く制限
-                    }
+                    **self._generate_kwargs(),
                 )
                 
-                raw_output = response["response"]
+                raw_output = self._extract(response["response"])
                 cleaned = self._clean_output(raw_output)
                 
                 if self._validate_output(cleaned):
+                    self._remember(model_name, emotion, cleaned)
                     return cleaned
                     
             except Exception as e:
                 print(f"[Kotaro] 生成エラー (試行 {attempt + 1}): {e}")
         
-        # フォールバック
+        return self._fallback(model_name, emotion)
+    
+    def _split_candidates(self, raw: str) -> List[str]:
+        """
+        複数案の出力を1行1候補に分ける（制約付きならJSONの comments）
+        
+        箇条書き・番号・鉤括弧を除去し、絵文字が無ければ補う。
+        「以下5案です：」のような前置き・指示文の復唱・記号だけの行は候補にしない。
+        """
+        lines = raw.splitlines()
+        if self.constrained:
+            try:
+                lines = [str(c) for c in json.loads(raw)["comments"]]
+            except (ValueError, KeyError, TypeError):
+                pass
+        
+        candidates = []
+        for line in lines:
+            text = CANDIDATE_PREFIX.sub("", line).strip().strip("「」\"'")
+            if len(text) < 4 or text.endswith((":", "：")):
+                continue
+            if INSTRUCTION_PATTERN.search(text) or not COMMENT_CHARS.search(text):
+                continue
+            if not text.endswith(EMOJIS) and len(text) <= self.max_length - 2:
+                text += "✨"
+            candidates.append(text)
+        return candidates
+    
+    def _score(self, text: str, model_name: str, emotion: str) -> float:
+        """候補の採点（18文字に近いほど高く、絵文字1つで締める、お手本の丸写しは減点）"""
+        score = -abs(self.max_length - len(text))
+        if text.endswith(EMOJIS) and sum(text.count(e) for e in EMOJIS) == 1:
+            score += 2
+        if text in (ex.replace("栞", model_name) for ex in EXAMPLES.get(emotion, EXAMPLES["happy"])):
+            score -= 5
+        return score
+    
+    def generate_best(
+        self,
+        model_name: str,
+        emotion: str = "happy",
+        candidates: int = 5,
+        max_calls: int = 2,
+    ) -> str:
+        """
+        1回の呼び出しで複数案を出させ、合格した中から最良の1つを返す
+        
+        不合格のたびに1往復するリトライループの代わりに、candidates 案をまとめて検査・採点する。
+        全案不合格の場合のみ次の呼び出しへ進み、max_calls 回で尽きたら例文にフォールバック。
+        キャッシュがあれば、選ばなかった合格案は未使用の候補として積む。
+        制約付きなら18文字以内の文字列の配列（JSON）をスキーマで縛って出させる。
+        """
+        cached = self._cached(model_name, emotion)
+        if cached is not None:
+            return cached
+        
+        prompt = self._build_prompt(model_name, emotion, candidates)
+        
+        for attempt in range(max_calls):
+            try:
+                response = ollama.generate(model=self.model, prompt=prompt, **self._generate_kwargs(candidates))
+            except Exception as e:
+                print(f"[Kotaro] 生成エラー (試行 {attempt + 1}): {e}")
+                continue
+            
+            found = self._split_candidates(response["response"])
+            valid = [c for c in found if self._validate_output(c)]
+            self.stats.update(calls=1, candidates=len(found), valid=len(valid))
+            if valid:
+                best = max(valid, key=lambda c: self._score(c, model_name, emotion))
+                for c in valid:
+                    self._remember(model_name, emotion, c, used=c == best)
+                return best
+        
+        self.stats["fallbacks"] += 1
+        return self._fallback(model_name, emotion)
+    
+    def _fallback(self, model_name: str, emotion: str) -> str:
+        """全試行が不合格だった場合の例文"""
         fallback = random.choice(EXAMPLES.get(emotion, EXAMPLES["happy"]))
         return fallback.replace("栞", model_name)[:self.max_length]
 
 
+class AsyncKotaroEngine(KotaroEngine):
+    """
+    非同期版 Kotaro-Engine
+    
+    - 試行は fanout 本ずつ並行に投げ、最初に合格したものを採用（残りはキャンセル）。
+      デフォルトは KOTARO_FANOUT（未設定なら3）。fanout=1 で同期版と同じく1本ずつ順番に試す
+    - ollama.AsyncClient（httpxの接続プール）を使い回す
+    - generate_many で複数コメントを並行生成
+    
+    Ollama 側の同時処理数は OLLAMA_NUM_PARALLEL で決まるため、
+    それを超える分は max_concurrency で待たせる。fanout を上げると
+    1コメントの待ち時間は縮むが、合格が1本目で出る場合も GPU を fanout 倍使う。
+    """
+    
+    def __init__(
+        self,
+        model: str = "qwen2.5:7b-instruct-q4_K_M",
+        host: Optional[str] = None,
+        max_concurrency: int = 32,
+        constrained: bool = False,
+        cache: Optional[CandidateCache] = None,
+        fanout: Optional[int] = None,
+    ):
+        """
+        Args:
+            model: Ollamaモデル名
+            host: OllamaサーバーのURL（デフォルト: OLLAMA_HOST または http://localhost:11434）
+            max_concurrency: 同時に投げるリクエスト数の上限
+            fanout: 1コメントあたり同時に走らせる試行数（デフォルト: ASYNC_FANOUT。1なら順番にリトライ）
+            constrained: JSONスキーマ（maxLength）で出力長をデコード時に制限する
+            cache: 生成済みコメントの再利用キャッシュ（キーは (名前, 感情)）
+        """
+        super().__init__(model, constrained, cache)
+        self.client = ollama.AsyncClient(host=host)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.fanout = max(1, ASYNC_FANOUT if fanout is None else fanout)
+    
+    async def _attempt(self, prompt: str, attempt: int) -> Optional[str]:
+        """1回生成して、合格ならクリーニング済みの文字列を返す"""
+        try:
+            async with self._semaphore:
+                response = await self.client.generate(model=self.model, prompt=prompt, **self._generate_kwargs())
+            cleaned = self._clean_output(self._extract(response["response"]))
+            if self._validate_output(cleaned):
+                return cleaned
+        except Exception as e:
+            print(f"[Kotaro] 生成エラー (試行 {attempt + 1}): {e}")
+        return None
+    
+    async def generate(self, model_name: str, emotion: str = "happy", max_retries: int = 3) -> str:
+        """18文字コメントを生成（最大 max_retries 回。fanout 本ずつ並行に試し、最初の合格を採用）"""
+        
+        cached = self._cached(model_name, emotion)
+        if cached is not None:
+            return cached
+        
+        prompt = self._build_prompt(model_name, emotion)
+        pending = set()
+        started = 0
+        
+        try:
+            while pending or started < max_retries:
+                # 不合格で空いた枠に次の試行を入れる
+                while started < max_retries and len(pending) < self.fanout:
+                    pending.add(asyncio.create_task(self._attempt(prompt, started)))
+                    started += 1
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        self._remember(model_name, emotion, result)
+                        return result
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        return self._fallback(model_name, emotion)
+    
+    async def generate_many(
+        self,
+        names: List[str],
+        emotions: Union[str, List[str]] = "happy",
+        max_retries: int = 3,
+    ) -> List[str]:
+        """
+        複数のコメントを並行生成
+        
+        Args:
+            names: モデルさんの名前（同じ名前を並べれば1人分を複数案）
+            emotions: 感情（1つ指定で全員共通、リストなら names と同じ長さ）
+            
+        Returns:
+            names と同じ順序のコメント
+        """
+        if isinstance(emotions, str):
+            emotions = [emotions] * len(names)
+        return await asyncio.gather(
+            *(self.generate(name, emotion, max_retries) for name, emotion in zip(names, emotions))
+        )
+    
+    async def close(self):
+        """接続プールを閉じる"""
+        await self.client.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
 # =============================================================================
 # CLI
 # =============================================================================
@@ -153,18 +453,42 @@ def main():
     parser.add_argument("--name", type=str, default="栞", help="モデルさんの名前")
     parser.add_argument("--emotion", type=str, default="happy", choices=["happy", "neutral", "surprise"])
     parser.add_argument("--count", type=int, default=1, help="生成数")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="非同期エンジンで --count 件を並行生成")
+    parser.add_argument("--best", type=int, default=0,
+                        help="1回の呼び出しでN案を出させて最良を選ぶ（0でリトライ方式）")
+    parser.add_argument("--fanout", type=int, default=None,
+                        help=f"--async: 1コメントあたり同時に走らせる試行数（デフォルト: {ASYNC_FANOUT}、1で順番にリトライ）")
+    parser.add_argument("--constrained", action="store_true",
+                        help="JSONスキーマで18文字以内に制限してデコード")
+    parser.add_argument("--cache", action="store_true",
+                        help="生成済みコメントを1時間以内は重複させずに再利用")
     
     args = parser.parse_args()
     
-    engine = KotaroEngine()
+    cache = CandidateCache() if args.cache else None
     
     print("\n🐯 Kotaro-Engine v1.0")
     print("=" * 40)
     
-    for i in range(args.count):
-        comment = engine.generate(args.name, args.emotion)
+    if args.use_async:
+        async def run():
+            async with AsyncKotaroEngine(constrained=args.constrained, cache=cache, fanout=args.fanout) as engine:
+                return await engine.generate_many([args.name] * args.count, args.emotion)
+        
+        comments = asyncio.run(run())
+    elif args.best:
+        engine = KotaroEngine(constrained=args.constrained, cache=cache)
+        comments = (engine.generate_best(args.name, args.emotion, args.best) for _ in range(args.count))
+    else:
+        engine = KotaroEngine(constrained=args.constrained, cache=cache)
+        comments = (engine.generate(args.name, args.emotion) for _ in range(args.count))
+    
+    for i, comment in enumerate(comments):
         print(f"  [{i+1}] {comment} ({len(comment)}文字)")
     
+    if cache is not None:
+        print(f"  キャッシュ: {cache.stats()}")
     print("=" * 40)
 
 
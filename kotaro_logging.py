@@ -0,0 +1,191 @@
+"""
+Kotaro Logging: APIホットパス向けの非同期・構造化ロギング
+
+設計:
+- ログ出力はQueueHandler経由でバックグラウンドスレッド(QueueListener)に委譲
+  → イベントループ上では「キューに積むだけ」で、書式化とstderr書き込みは行わない
+- レコードはJSON 1行形式（request_id付き）で出力
+- VLM生出力などの巨大レコードはサンプリングして出力量を抑える
+
+使用方法:
+    from kotaro_logging import setup_logging, request_id_var, RAW_OUTPUT
+
+    setup_logging()
+    logger = logging.getLogger("kotaro_api_v4")
+    logger.info("Pattern: %s", pattern_id)              # 遅延フォーマット
+    logger.info("VLM Raw Response: %s", content, extra=RAW_OUTPUT)  # サンプリング対象
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from typing import Optional, TextIO
+
+
+# =============================================================================
+# 設定値
+# =============================================================================
+
+CONFIG = {
+    # 生出力ログのサンプリング率（0.0〜1.0）
+    "raw_sample_rate": float(os.getenv("KOTARO_LOG_RAW_SAMPLE_RATE", "0.05")),
+
+    # JSON出力（falseなら従来の1行テキスト）
+    "json_output": os.getenv("KOTARO_LOG_JSON", "1") != "0",
+
+    # ログレベル
+    "level": os.getenv("KOTARO_LOG_LEVEL", "INFO"),
+}
+
+# 生出力ログに付与するextra（RawOutputSamplerの判定キー）
+RAW_OUTPUT = {"raw_output": True}
+
+# リクエストID（ミドルウェアで設定、ログレコードに自動付与）
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# LogRecordの標準属性（これ以外をextraとしてJSONに含める）
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "raw_output",
+}
+
+
+def new_request_id() -> str:
+    """短いリクエストIDを発行"""
+    return uuid.uuid4().hex[:12]
+
+
+# =============================================================================
+# フィルタ・フォーマッタ
+# =============================================================================
+
+class RequestIdFilter(logging.Filter):
+    """呼び出し元コンテキストのrequest_idをレコードに埋め込む"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RawOutputSampler(logging.Filter):
+    """raw_output=True のレコードを一定確率でのみ通す"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "raw_output", False):
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """1レコード = 1行のJSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                  + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    書式化をリスナースレッドへ遅延させるQueueHandler
+
+    標準のQueueHandler.prepare()は呼び出し元スレッドでformat()を実行するため、
+    イベントループ上で文字列化が走ってしまう。ここではmsg/argsをそのまま渡す。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # トレースバックオブジェクトはスレッドを跨ぐと解放が遅れるので先に文字列化
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# =============================================================================
+# セットアップ
+# =============================================================================
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(
+    level: Optional[str] = None,
+    json_output: Optional[bool] = None,
+    raw_sample_rate: Optional[float] = None,
+    stream: Optional[TextIO] = None,
+) -> logging.handlers.QueueListener:
+    """
+    ルートロガーをキュー経由の非同期出力に切り替える（冪等）
+
+    Args:
+        level: ログレベル（デフォルト: CONFIG["level"]）
+        json_output: JSON形式で出力するか
+        raw_sample_rate: 生出力ログのサンプリング率
+        stream: 出力先（デフォルト: stderr）
+
+    Returns:
+        起動済みのQueueListener
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    json_output = CONFIG["json_output"] if json_output is None else json_output
+    rate = CONFIG["raw_sample_rate"] if raw_sample_rate is None else raw_sample_rate
+
+    sink = logging.StreamHandler(stream or sys.stderr)
+    if json_output:
+        sink.setFormatter(JsonFormatter())
+    else:
+        sink.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = LazyQueueHandler(log_queue)
+    # フィルタは呼び出し元スレッドで評価される（request_idのコンテキスト取得のため）
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(RawOutputSampler(rate))
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(handler)
+    root.setLevel(level or CONFIG["level"])
+
+    _listener = logging.handlers.QueueListener(log_queue, sink, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """キューに残ったレコードを書き出してリスナーを停止"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+KotaroEngine 制約付きデコード ベンチマーク: 生成後に切り詰め vs デコード時に制約
+
+同じ件数のコメントを生成し、
+- 1回の呼び出しで生成されたトークン数（Ollama の eval_count / transformers の生成長）
+- 切り詰め前の出力がそのまま合格した割合（18文字以内・NGワード無し）
+- 1コメントあたりの呼び出し回数とレイテンシ（p50 / p95）
+を比べる。Ollama が起動している必要がある。
+--transformers を付けると constrained_decoding.TransformersKotaroEngine（LogitsProcessor）も比較する。
+Ollama の json schema はデコード時に長さだけを縛り、NGワードは生成後の検査で弾く
+（NGワードまでデコード時に禁止するのは hf (logits processor) のみ）。
+
+使用方法:
+    python scripts/benchmark_constrained_decoding.py
+    python scripts/benchmark_constrained_decoding.py --count 30 --transformers Qwen/Qwen2.5-1.5B-Instruct
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import kotaro_engine  # noqa: E402
+from kotaro_engine import KotaroEngine, EXAMPLES, NG_PATTERN  # noqa: E402
+
+
+def raw_valid(engine, raw: str) -> bool:
+    """切り詰め・絵文字補完の前の出力が条件を満たしているか"""
+    text = engine._extract(raw).replace("\n", "").strip()
+    return 0 < len(text) <= engine.max_length and not NG_PATTERN.search(text)
+
+
+class OllamaCounter:
+    """ollama.generate をラップして eval_count と切り詰め前の合否を集計"""
+
+    def __init__(self, engine: KotaroEngine):
+        self.engine = engine
+        self.calls = 0
+        self.tokens = 0
+        self.valid = 0
+        self._generate = kotaro_engine.ollama.generate
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        response = self._generate(**kwargs)
+        self.tokens += response.get("eval_count") or 0
+        self.valid += raw_valid(self.engine, response["response"])
+        return response
+
+
+class TransformersCounter:
+    """TransformersKotaroEngine._complete をラップして同じ値を集計"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.calls = 0
+        self.valid = 0
+        self._complete = engine._complete
+        self.tokens_before = engine.stats["tokens"]
+
+    @property
+    def tokens(self):
+        return self.engine.stats["tokens"] - self.tokens_before
+
+    def __call__(self, prompt):
+        self.calls += 1
+        raw = self._complete(prompt)
+        self.valid += raw_valid(self.engine, raw)
+        return raw
+
+
+def run(label, engine, counter, install, uninstall, count, name, emotion):
+    fallbacks = {ex.replace("栞", name)[:engine.max_length] for ex in EXAMPLES[emotion]}
+    latencies, fell_back = [], 0
+    install(counter)
+    try:
+        for _ in range(count):
+            t0 = time.perf_counter()
+            comment = engine.generate(name, emotion)
+            latencies.append(1000 * (time.perf_counter() - t0))
+            fell_back += comment in fallbacks
+    finally:
+        uninstall(counter)
+
+    latencies.sort()
+    calls = max(counter.calls, 1)
+    print(f"  {label:>22}: tokens/call={counter.tokens / calls:5.1f}  "
+          f"raw-valid={counter.valid / calls:4.0%}  calls/comment={counter.calls / count:.2f}  "
+          f"p50={statistics.median(latencies):6.0f}ms  p95={latencies[int(0.95 * (count - 1))]:6.0f}ms  "
+          f"fallback={fell_back / count:.0%}")
+
+
+def run_ollama(label, engine, args):
+    def install(counter):
+        kotaro_engine.ollama.generate = counter
+
+    def uninstall(counter):
+        kotaro_engine.ollama.generate = counter._generate
+
+    run(label, engine, OllamaCounter(engine), install, uninstall, args.count, args.name, args.emotion)
+
+
+def run_transformers(label, engine, args):
+    def install(counter):
+        engine._complete = counter
+
+    def uninstall(counter):
+        engine._complete = counter._complete
+
+    run(label, engine, TransformersCounter(engine), install, uninstall, args.count, args.name, args.emotion)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KotaroEngine 制約付きデコード ベンチマーク")
+    parser.add_argument("--count", type=int, default=20, help="生成するコメント数")
+    parser.add_argument("--name", type=str, default="栞")
+    parser.add_argument("--emotion", type=str, default="happy", choices=list(EXAMPLES))
+    parser.add_argument("--model", type=str, default="qwen2.5:7b-instruct-q4_K_M", help="Ollamaモデル名")
+    parser.add_argument("--transformers", type=str, default=None, metavar="MODEL_ID",
+                        help="transformers の LogitsProcessor 版も比較する（HuggingFaceモデルID）")
+    args = parser.parse_args()
+
+    print("\n" + "=" * 100)
+    print(f"🐯 KotaroEngine constrained decoding benchmark ({args.count} comments)")
+    print("=" * 100)
+    run_ollama("ollama (truncate)", KotaroEngine(model=args.model), args)
+    run_ollama("ollama (json schema)", KotaroEngine(model=args.model, constrained=True), args)
+
+    if args.transformers:
+        from constrained_decoding import TransformersKotaroEngine
+
+        engine = TransformersKotaroEngine(args.transformers, constrained=False)
+        run_transformers("hf (truncate)", engine, args)
+        engine.use_processors = True  # 同じモデルで制約ありに切り替え
+        run_transformers("hf (logits processor)", engine, args)
+    print("=" * 100 + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+動的バッチ（BatchDispatcher）スループットベンチマーク
+
+1 / 4 / 16 並列の呼び出し元が analyze_simple を繰り返し呼ぶ場合と、
+BatchDispatcher 経由でまとめてバッチ推論する場合のスループットを比較する。
+
+--simulate-ms を指定するとモデルの代わりに「1回の呼び出しコスト + 1枚あたりコスト」で
+待機する模擬コアを使う（GPUの無い環境でディスパッチャの挙動だけを確認する用途）。
+
+使用方法:
+    python scripts/benchmark_dispatcher.py --image test_images/test.png
+    python scripts/benchmark_dispatcher.py --simulate-ms 800 --per-image-ms 120
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+class SimulatedCore:
+    """推論1回 = fixed_ms + per_image_ms × 枚数 の模擬コア（GPUは1本なのでロックで直列化）"""
+
+    def __init__(self, fixed_ms: float, per_image_ms: float):
+        self.fixed = fixed_ms / 1000
+        self.per_image = per_image_ms / 1000
+        self._gpu = threading.Lock()
+
+    def analyze_simple(self, image_path: str) -> str:
+        return self.analyze_batch([image_path])[0]
+
+    def analyze_batch(self, image_paths, mode="simple", batch_size=None):
+        with self._gpu:
+            time.sleep(self.fixed + self.per_image * len(image_paths))
+        return [f"result:{p}" for p in image_paths]
+
+
+def run(callers: int, per_caller: int, call) -> float:
+    """callers 本のスレッドが per_caller 回ずつ call() し、全体のimages/secを返す"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(lambda _: [call() for _ in range(per_caller)], range(callers)))
+    return callers * per_caller / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BatchDispatcher スループットベンチマーク")
+    parser.add_argument("--image", type=str, default="test_images/test.png")
+    parser.add_argument("--per-caller", type=int, default=4, help="呼び出し元1つあたりの要求数")
+    parser.add_argument("--simulate-ms", type=float, default=0, help="模擬コアの1回あたり固定コスト(ms)")
+    parser.add_argument("--per-image-ms", type=float, default=100, help="模擬コアの1枚あたりコスト(ms)")
+    parser.add_argument("--window-ms", type=float, default=20)
+    parser.add_argument("--max-batch", type=int, default=8)
+    args = parser.parse_args()
+
+    from vision_core import BatchDispatcher, get_vision_core
+
+    if args.simulate_ms:
+        core = SimulatedCore(args.simulate_ms, args.per_image_ms)
+        label = f"simulated ({args.simulate_ms:.0f}ms + {args.per_image_ms:.0f}ms/img)"
+    else:
+        core = get_vision_core()
+        core.warmup()
+        label = core.model_id
+
+    dispatcher = BatchDispatcher(core_getter=lambda: core, window_ms=args.window_ms, max_batch=args.max_batch)
+
+    print("\n" + "=" * 64)
+    print(f"🚦 Dispatcher benchmark: {label}")
+    print("=" * 64)
+    for callers in (1, 4, 16):
+        direct = run(callers, args.per_caller, lambda: core.analyze_simple(args.image))
+        batched = run(callers, args.per_caller, lambda: dispatcher.analyze(args.image))
+        print(f"  {callers:>2} callers: direct={direct:6.2f} img/s  dispatcher={batched:6.2f} img/s  "
+              f"({batched / direct:.2f}x)")
+    print(f"  dispatcher stats: {dispatcher.stats()}")
+    print("=" * 64 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+イベントループ遅延ベンチマーク: ハンドラ内の同期ファイルI/O vs async_io
+
+/generate 1回分のファイル操作（アップロード一時保存 → 読み込み+base64化 → 削除）を
+100並列で実行し、その間のイベントループ遅延（lag）を比較する。
+
+lag は1ms間隔のタイマーが何ms遅れて起きたかの分布。blocking はループが止まっている間は
+サンプル自体が取れない（1.7秒の停止も1サンプル）ため、p50/p99 は低めに出る。max と合わせて見ること。
+async_io 側の p50/p99 はワーカースレッドとのGIL取り合いで決まるので、
+KOTARO_FILE_IO_WORKERS を変えて確認する。
+
+使用方法:
+    python scripts/benchmark_event_loop_lag.py
+    python scripts/benchmark_event_loop_lag.py --uploads 100 --size-mb 4
+    KOTARO_FILE_IO_WORKERS=8 python scripts/benchmark_event_loop_lag.py
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import async_io  # noqa: E402
+
+
+async def handler_blocking(content: bytes):
+    """旧実装: async def 内で直接ファイルI/O"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
+        tmp.write(content)
+        tmp_path = tmp.name
+    try:
+        with open(tmp_path, "rb") as f:
+            b64 = base64.b64encode(f.read()).decode("utf-8")
+        await asyncio.sleep(0.005)  # VLM呼び出しの代わり
+        return len(b64)
+    finally:
+        os.remove(tmp_path)
+
+
+async def handler_async(content: bytes):
+    """新実装: async_io 経由"""
+    tmp_path = await async_io.write_temp(content, suffix=".jpg")
+    try:
+        b64 = await async_io.read_base64(tmp_path)
+        await asyncio.sleep(0.005)
+        return len(b64)
+    finally:
+        await async_io.remove(tmp_path)
+
+
+async def lag_monitor(samples: list, stop: asyncio.Event, interval: float = 0.001):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - t0 - interval) * 1000)
+
+
+async def run(handler, n: int, content: bytes) -> dict:
+    samples: list = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(lag_monitor(samples, stop))
+    await asyncio.sleep(0.01)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(handler(content) for _ in range(n)))
+    elapsed = time.perf_counter() - t0
+
+    stop.set()
+    await monitor
+    samples.sort()
+    return {
+        "wall_s": elapsed,
+        "p50": statistics.median(samples),
+        "p99": samples[max(0, int(len(samples) * 0.99) - 1)],
+        "max": samples[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="イベントループ遅延ベンチマーク")
+    parser.add_argument("--uploads", type=int, default=100, help="並列アップロード数")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="1枚あたりのサイズ(MB)")
+    args = parser.parse_args()
+
+    content = os.urandom(int(args.size_mb * 1024 * 1024))
+
+    print("\n" + "=" * 64)
+    print(f"⏱️  Event-loop lag: {args.uploads} concurrent uploads × {args.size_mb}MB")
+    print("=" * 64)
+    for name, handler in (("blocking", handler_blocking), ("async_io", handler_async)):
+        r = asyncio.run(run(handler, args.uploads, content))
+        print(f"  {name:>8}: wall={r['wall_s']:.2f}s  lag p50={r['p50']:.1f}ms  "
+              f"p99={r['p99']:.1f}ms  max={r['max']:.1f}ms")
+    print("=" * 64 + "\n")
+
+
+if __name__ == "__main__":
+    main()
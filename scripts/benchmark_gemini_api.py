@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+api/main.py Gemini 呼び出しベンチマーク: リクエスト毎のモデル生成＋同期呼び出し vs 共有モデル＋スレッドプール
+
+ローカルにフェイクGemini（generateContent に固定の遅延で応答するHTTPサーバー）を立て、
+GEMINI_API_ENDPOINT でそこへ向けた api/main.py に /generate-comment を同時に投げて
+スループット（req/s）とレイテンシ（p50 / p95）を比べる。
+
+- before: 旧ハンドラ（async def 内で GenerativeModel を作り、generate_content を同期で呼ぶ）
+          を同じアプリに /generate-comment-legacy として追加して計測
+- after:  現在の /generate-comment（call_gemini）
+
+google-generativeai と httpx が必要（Gemini本体への通信は発生しない）。
+
+使用方法:
+    python scripts/benchmark_gemini_api.py
+    python scripts/benchmark_gemini_api.py --requests 64 --concurrency 16 --latency-ms 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def start_fake_gemini(latency_ms: float) -> ThreadingHTTPServer:
+    """models/*:generateContent に latency_ms 後に固定のコメントを返すサーバー"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency_ms / 1000)
+            body = json.dumps({
+                "candidates": [{
+                    "content": {"parts": [{"text": "自然な笑顔がブースの雰囲気にぴったりでした✨"}], "role": "model"},
+                    "finishReason": "STOP",
+                    "index": 0,
+                }],
+            }).encode()
+            self.send_response(200 if self.path.endswith(":generateContent") else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_legacy_route(api):
+    """旧 generate_comment の呼び出し部分（毎回モデル生成・同期呼び出し）を再現"""
+
+    @api.app.post("/generate-comment-legacy", response_model=api.CommentResponse)
+    async def generate_comment_legacy(request: api.CommentRequest):
+        model = api.genai.GenerativeModel(api.GEMINI_MODEL_NAME)
+        response = model.generate_content(api.build_prompt(request, False))
+        return api.CommentResponse(comment=response.text.strip(), source="ai")
+
+
+async def run(client, path: str, n: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, sources = [], []
+
+    async def one():
+        async with semaphore:
+            t0 = time.perf_counter()
+            response = await client.post(path, json={"expression_type": "笑顔"})
+            latencies.append(1000 * (time.perf_counter() - t0))
+            sources.append(response.json()["source"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "throughput": n / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (n - 1))],
+        "ai": sources.count("ai") / n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="api/main.py Gemini 呼び出しベンチマーク")
+    parser.add_argument("--requests", type=int, default=32, help="リクエスト数")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時リクエスト数")
+    parser.add_argument("--latency-ms", type=float, default=200, help="フェイクGeminiの応答遅延")
+    args = parser.parse_args()
+
+    server = start_fake_gemini(args.latency_ms)
+    os.environ["GEMINI_API_KEY"] = "dummy"
+    os.environ["GEMINI_API_ENDPOINT"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ.setdefault("GEMINI_MAX_CONCURRENCY", str(args.concurrency))
+    sys.path.insert(0, os.path.join(ROOT, "api"))
+
+    import httpx
+    import main as api
+
+    add_legacy_route(api)
+
+    async def bench():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=120) as client:
+            await client.post("/generate-comment", json={})  # 接続・スレッドのウォームアップ
+            return {
+                "before": await run(client, "/generate-comment-legacy", args.requests, args.concurrency),
+                "after": await run(client, "/generate-comment", args.requests, args.concurrency),
+            }
+
+    try:
+        results = asyncio.run(bench())
+    finally:
+        server.shutdown()
+
+    print("\n" + "=" * 72)
+    print(f"♊ Gemini API benchmark ({args.requests} req, concurrency {args.concurrency}, "
+          f"fake latency {args.latency_ms:.0f}ms)")
+    print("=" * 72)
+    for label, r in results.items():
+        print(f"  {label:>6}: {r['throughput']:6.1f} req/s  p50={r['p50']:6.0f}ms  p95={r['p95']:6.0f}ms  "
+              f"ai={r['ai']:.0%}")
+    print(f"  → {results['after']['throughput'] / results['before']['throughput']:.1f}x")
+    print("=" * 72 + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+VisionCore 画像キャッシュベンチマーク: 同じ写真を full → simple の順に解析
+
+キャッシュ無効（予算0）と有効で、2回目（simple）の解析時間と各キャッシュのヒット率を比較する。
+有効時の simple は読み込み・デコード・リサイズ・ビジョンエンコードを省き、言語モデルのデコードのみになる。
+
+使用方法:
+    python scripts/benchmark_image_cache.py
+    python scripts/benchmark_image_cache.py --dir Xpost-EX/pattern_images --limit 8
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VisionCore 画像キャッシュベンチマーク")
+    parser.add_argument("--dir", type=str, default="Xpost-EX/pattern_images", help="画像ディレクトリ")
+    parser.add_argument("--limit", type=int, default=8, help="使用する画像枚数")
+    args = parser.parse_args()
+
+    images = sorted(str(p) for p in Path(args.dir).iterdir() if p.suffix.lower() in IMAGE_EXTS)[:args.limit]
+    if not images:
+        print(f"❌ 画像が見つかりません: {args.dir}")
+        return 1
+
+    from vision_core import VisionCore, ImageCache, CONFIG
+
+    vision = VisionCore()
+    vision.warmup()
+
+    print("\n" + "=" * 64)
+    print(f"🗃️  VisionCore image cache benchmark ({len(images)} images, full → simple)")
+    print("=" * 64)
+
+    for label, enabled in (("no-cache", False), ("cache", True)):
+        vision.image_cache = ImageCache(CONFIG["image_cache_mb"] if enabled else 0)
+        vision.state_cache = ImageCache(CONFIG["state_cache_mb"] if enabled else 0)
+
+        full_s = simple_s = 0.0
+        for path in images:
+            t0 = time.perf_counter()
+            vision.analyze(path)
+            t1 = time.perf_counter()
+            vision.analyze_simple(path)
+            t2 = time.perf_counter()
+            full_s += t1 - t0
+            simple_s += t2 - t1
+
+        stats = vision.cache_stats()
+        print(f"  {label:>8}: full={full_s / len(images):.2f}s/img  simple={simple_s / len(images):.2f}s/img")
+        if enabled:
+            for name, s in stats.items():
+                print(f"            {name:>13}: hit_rate={s['hit_rate']:.0%}  used={s['used_mb']}MB "
+                      f"/ {s['budget_mb']}MB  evictions={s['evictions']}")
+    print("=" * 64 + "\n")
+
+    vision.unload()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+画像デコードベンチマーク（24MP JPEG → 長辺1024px）
+
+- pil_full    : Image.open → convert → thumbnail（旧実装）
+- loader      : image_loader.load_image（draftによる縮小デコード + EXIF回転）
+- cv2_full    : cv2.imread → cv2.resize
+- cv2_reduced : cv2.imread(IMREAD_REDUCED_COLOR_4) → cv2.resize
+
+方式毎に別プロセスで実行し、1枚あたりのデコード時間とピークRSSを比較する。
+
+使用方法:
+    python scripts/benchmark_image_decode.py --generate 10
+    python scripts/benchmark_image_decode.py --dir path/to/24mp_jpegs
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+METHODS = ["pil_full", "loader", "cv2_full", "cv2_reduced"]
+MAX_SIZE = 1024
+
+
+def decode(method: str, path: str):
+    if method == "pil_full":
+        from PIL import Image
+        image = Image.open(path).convert("RGB")
+        image.thumbnail((MAX_SIZE, MAX_SIZE), Image.Resampling.LANCZOS)
+        return image.size
+    if method == "loader":
+        from image_loader import load_image
+        return load_image(path, MAX_SIZE).size
+    import cv2
+    flag = cv2.IMREAD_REDUCED_COLOR_4 if method == "cv2_reduced" else cv2.IMREAD_COLOR
+    img = cv2.imread(path, flag)
+    h, w = img.shape[:2]
+    scale = MAX_SIZE / max(h, w)
+    if scale < 1:
+        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return img.shape[1], img.shape[0]
+
+
+def run_method(method: str, paths: list) -> dict:
+    decode(method, paths[0])  # importとコーデック初期化を除外
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for path in paths:
+        decode(method, path)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "method": method,
+        "ms_per_image": 1000 * elapsed / len(paths),
+        "peak_rss_mb": peak_rss / 1024,  # Linuxの ru_maxrss はKB
+        "delta_rss_mb": (peak_rss - base_rss) / 1024,
+    }
+
+
+def generate_jpegs(directory: str, count: int, size=(6000, 4000)):
+    from PIL import Image
+    base = Image.linear_gradient("L").resize(size).convert("RGB")
+    noise = Image.effect_noise(size, 40).convert("RGB")
+    image = Image.blend(base, noise, 0.3)
+    for i in range(count):
+        image.save(os.path.join(directory, f"24mp_{i:03d}.jpg"), quality=92)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="画像デコードベンチマーク")
+    parser.add_argument("--dir", type=str, help="24MP JPEGのディレクトリ")
+    parser.add_argument("--generate", type=int, default=0, help="6000x4000の合成JPEGを生成して使う")
+    parser.add_argument("--method", choices=METHODS, help="(内部用) 単一方式の実行")
+    args = parser.parse_args()
+
+    tmpdir = None
+    if args.generate:
+        tmpdir = tempfile.TemporaryDirectory()
+        generate_jpegs(tmpdir.name, args.generate)
+        directory = tmpdir.name
+    elif args.dir:
+        directory = args.dir
+    else:
+        parser.error("--dir か --generate を指定してください")
+
+    paths = sorted(str(p) for p in Path(directory).iterdir() if p.suffix.lower() in (".jpg", ".jpeg"))
+
+    if args.method:
+        print(json.dumps(run_method(args.method, paths)))
+        return
+
+    print("\n" + "=" * 64)
+    print(f"🖼️  Decode benchmark: {len(paths)} images → {MAX_SIZE}px")
+    print("=" * 64)
+    for method in METHODS:
+        out = subprocess.run([sys.executable, __file__, "--method", method, "--dir", directory],
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"  {method:>12}: skipped ({out.stderr.strip().splitlines()[-1]})")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"  {r['method']:>12}: {r['ms_per_image']:7.1f} ms/img  "
+              f"peak RSS={r['peak_rss_mb']:6.0f}MB (+{r['delta_rss_mb']:.0f}MB)")
+    print("=" * 64 + "\n")
+
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+KotaroEngine 生成方式ベンチマーク: リトライループ vs 複数案生成（generate_best）
+
+同じ件数のコメントを生成し、
+- バックエンド呼び出し1回あたりの合格出力数
+- 1コメントあたりのレイテンシ（p50 / p95）と呼び出し回数
+- フォールバック（例文）率
+を比べる。Ollama が起動している必要がある。
+
+使用方法:
+    python scripts/benchmark_kotaro_generation.py
+    python scripts/benchmark_kotaro_generation.py --count 30 --candidates 5 --model qwen2.5:7b-instruct-q4_K_M
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import kotaro_engine  # noqa: E402
+from kotaro_engine import KotaroEngine, EXAMPLES  # noqa: E402
+
+
+class CallCounter:
+    """ollama.generate の呼び出し回数と、検証を通った出力の数を数える"""
+
+    def __init__(self, engine: KotaroEngine):
+        self.engine = engine
+        self.calls = 0
+        self.valid = 0
+        self._generate = kotaro_engine.ollama.generate
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        response = self._generate(**kwargs)
+        if kwargs["options"]["num_predict"] == kotaro_engine.GENERATE_OPTIONS["num_predict"]:
+            self.valid += self.engine._validate_output(self.engine._clean_output(response["response"]))
+        else:
+            self.valid += sum(self.engine._validate_output(c)
+                              for c in self.engine._split_candidates(response["response"]))
+        return response
+
+
+def run(label, engine, generate, count, name, emotion):
+    counter = CallCounter(engine)
+    kotaro_engine.ollama.generate = counter
+    fallbacks = {ex.replace("栞", name)[:engine.max_length] for ex in EXAMPLES[emotion]}
+    latencies, fell_back = [], 0
+    try:
+        for _ in range(count):
+            t0 = time.perf_counter()
+            comment = generate()
+            latencies.append(1000 * (time.perf_counter() - t0))
+            fell_back += comment in fallbacks
+    finally:
+        kotaro_engine.ollama.generate = counter._generate
+
+    latencies.sort()
+    print(f"  {label:>10}: calls/comment={counter.calls / count:.2f}  "
+          f"valid/call={counter.valid / max(counter.calls, 1):.2f}  "
+          f"p50={statistics.median(latencies):6.0f}ms  p95={latencies[int(0.95 * (count - 1))]:6.0f}ms  "
+          f"fallback={fell_back / count:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KotaroEngine 生成方式ベンチマーク")
+    parser.add_argument("--count", type=int, default=20, help="生成するコメント数")
+    parser.add_argument("--candidates", type=int, default=5, help="generate_best の1回あたりの案数")
+    parser.add_argument("--name", type=str, default="栞")
+    parser.add_argument("--emotion", type=str, default="happy", choices=list(EXAMPLES))
+    parser.add_argument("--model", type=str, default="qwen2.5:7b-instruct-q4_K_M")
+    args = parser.parse_args()
+
+    engine = KotaroEngine(model=args.model)
+
+    print("\n" + "=" * 72)
+    print(f"🐯 KotaroEngine generation benchmark ({args.count} comments, {args.model})")
+    print("=" * 72)
+    run("retry", engine, lambda: engine.generate(args.name, args.emotion), args.count, args.name, args.emotion)
+    run(f"best-of-{args.candidates}", engine,
+        lambda: engine.generate_best(args.name, args.emotion, args.candidates),
+        args.count, args.name, args.emotion)
+    print("=" * 72 + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+VisionCore 前処理ベンチマーク（6000px級JPEG）
+
+- baseline : Image.open → convert("RGB") → LANCZOSリサイズ を推論スレッドで逐次実行（旧実装）
+- draft    : draft() による縮小デコード + リサイズ（逐次）
+- pipeline : PreprocessPipeline（並列デコード + 先読みキュー）
+
+推論時間は --infer-ms で模擬し、pipeline で前処理が推論の裏に隠れるかを見る。
+
+使用方法:
+    python scripts/benchmark_preprocess.py --dir path/to/6000px_jpegs
+    python scripts/benchmark_preprocess.py --generate 24   # 6000x4000の合成JPEGを生成して計測
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image  # noqa: E402
+
+IMAGE_EXTS = {".jpg", ".jpeg"}
+
+
+def generate_jpegs(directory: str, count: int, size=(6000, 4000)):
+    """グラデーション + ノイズの合成JPEG（実写に近い圧縮率にするためノイズを混ぜる）"""
+    base = Image.linear_gradient("L").resize(size).convert("RGB")
+    noise = Image.effect_noise(size, 40).convert("RGB")
+    image = Image.blend(base, noise, 0.3)
+    for i in range(count):
+        image.save(os.path.join(directory, f"synthetic_{i:03d}.jpg"), quality=92)
+
+
+def baseline(path: str, max_size: int) -> Image.Image:
+    image = Image.open(path).convert("RGB")
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return image
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VisionCore 前処理ベンチマーク")
+    parser.add_argument("--dir", type=str, help="6000px級JPEGのディレクトリ")
+    parser.add_argument("--generate", type=int, default=0, help="合成JPEGを指定枚数生成して使う")
+    parser.add_argument("--infer-ms", type=float, default=150, help="1枚あたりの模擬推論時間(ms)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--prefetch", type=int, default=8)
+    args = parser.parse_args()
+
+    from vision_core import VisionCore, PreprocessPipeline, CONFIG
+
+    tmpdir = None
+    if args.generate:
+        tmpdir = tempfile.TemporaryDirectory()
+        print(f"🧪 合成JPEGを{args.generate}枚生成中...")
+        generate_jpegs(tmpdir.name, args.generate)
+        directory = tmpdir.name
+    elif args.dir:
+        directory = args.dir
+    else:
+        parser.error("--dir か --generate を指定してください")
+
+    paths = sorted(str(p) for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_EXTS)
+    core = VisionCore(device="cpu")  # モデルはロードしない（前処理のみ使用）
+    max_size = CONFIG["max_image_size"]
+    infer_s = args.infer_ms / 1000
+
+    print("\n" + "=" * 64)
+    print(f"📐 Preprocess benchmark: {len(paths)} images → {max_size}px, infer={args.infer_ms:.0f}ms/img")
+    print("=" * 64)
+
+    # baseline: 推論スレッド上で逐次
+    start = time.perf_counter()
+    decode_total = 0.0
+    for path in paths:
+        t0 = time.perf_counter()
+        baseline(path, max_size)
+        decode_total += time.perf_counter() - t0
+        time.sleep(infer_s)
+    wall = time.perf_counter() - start
+    print(f"  baseline : wall={wall:.2f}s  preprocess={1000 * decode_total / len(paths):.1f}ms/img")
+
+    # draft: 逐次だが縮小デコード
+    start = time.perf_counter()
+    decode_total = resize_total = 0.0
+    for path in paths:
+        t0 = time.perf_counter()
+        image = core._decode_image(path)
+        t1 = time.perf_counter()
+        core._resize_image(image)
+        t2 = time.perf_counter()
+        decode_total += t1 - t0
+        resize_total += t2 - t1
+        time.sleep(infer_s)
+    wall = time.perf_counter() - start
+    print(f"  draft    : wall={wall:.2f}s  decode={1000 * decode_total / len(paths):.1f}ms/img  "
+          f"resize={1000 * resize_total / len(paths):.1f}ms/img")
+
+    # pipeline: 並列デコード + 先読み
+    pipeline = PreprocessPipeline(core, workers=args.workers, prefetch=args.prefetch)
+    start = time.perf_counter()
+    for _ in pipeline.run(paths):
+        time.sleep(infer_s)
+    wall = time.perf_counter() - start
+    s = pipeline.summary()
+    print(f"  pipeline : wall={wall:.2f}s  decode={s['decode_ms']}ms/img  resize={s['resize_ms']}ms/img  "
+          f"infer-wait={s['wait_ms']}ms/img")
+    print(f"  (推論のみの下限: {infer_s * len(paths):.2f}s)")
+    print("=" * 64 + "\n")
+
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+SentimentBridge スループットベンチマーク（CPU）
+
+- per-call : 1枚ごとに DeepFace.analyze（毎回バックエンド解決・検出・分類）
+- many     : SentimentBridge.analyze_many（検出器・感情モデルは常駐、分類は1回の predict）
+
+使用方法:
+    python scripts/benchmark_sentiment.py
+    python scripts/benchmark_sentiment.py --dir Xpost-EX/pattern_images --limit 32
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SentimentBridge スループットベンチマーク")
+    parser.add_argument("--dir", type=str, default="Xpost-EX/pattern_images", help="画像ディレクトリ")
+    parser.add_argument("--limit", type=int, default=16, help="使用する画像枚数")
+    args = parser.parse_args()
+
+    images = sorted(str(p) for p in Path(args.dir).iterdir() if p.suffix.lower() in IMAGE_EXTS)[:args.limit]
+    if not images:
+        print(f"❌ 画像が見つかりません: {args.dir}")
+        return 1
+
+    from image_loader import load_image_bgr
+    from sentiment_bridge import SentimentBridge, ANALYSIS_MAX_SIZE, get_deepface
+
+    DeepFace = get_deepface()
+    # 初回のモデルダウンロード・構築は両方式とも計測から除く
+    bridge = SentimentBridge(preload=True)
+    bridge.analyze_many(images[:1])
+    bridge.reset_timings()
+    DeepFace.analyze(img_path=load_image_bgr(images[0], ANALYSIS_MAX_SIZE), actions=["emotion"],
+                     enforce_detection=False, detector_backend="opencv")
+
+    print("\n" + "=" * 64)
+    print(f"😊 SentimentBridge benchmark ({len(images)} images, CPU)")
+    print("=" * 64)
+
+    start = time.perf_counter()
+    for path in images:
+        DeepFace.analyze(img_path=load_image_bgr(path, ANALYSIS_MAX_SIZE), actions=["emotion"],
+                         enforce_detection=False, detector_backend="opencv")
+    per_call = len(images) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    bridge.analyze_many(images)
+    many = len(images) / (time.perf_counter() - start)
+
+    print(f"  per-call : {per_call:6.2f} img/s")
+    print(f"  many     : {many:6.2f} img/s  ({many / per_call:.1f}x)")
+    print(f"  stages   : {bridge.timing_summary()}")
+    print("=" * 64 + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+SentimentBridge.analyze_image_bytes ベンチマーク: 一時ファイル経由 vs メモリ上
+
+- tempfile : デコード → cv2.imwrite で一時JPEG → パスから再デコード（従来の方式）
+- in-memory: アップロードのバッファを1回だけデコードし、配列のまま解析
+
+1回あたりのレイテンシと、tracemalloc で測ったピーク確保量（numpy配列を含む）を比べる。
+
+使用方法:
+    python scripts/benchmark_sentiment_bytes.py --image test_images/test.png
+    python scripts/benchmark_sentiment_bytes.py --image photo.jpg --repeat 50
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def legacy_analyze_bytes(bridge, image_bytes: bytes):
+    """従来の analyze_image_bytes（一時ファイル経由）"""
+    import cv2
+    from image_loader import load_image_bgr
+    from sentiment_bridge import ANALYSIS_MAX_SIZE
+
+    img = load_image_bgr(image_bytes, ANALYSIS_MAX_SIZE)
+    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
+        cv2.imwrite(f.name, img)
+        result = bridge.analyze_image(f.name)
+        os.unlink(f.name)
+    return result
+
+
+def measure(func, repeat: int):
+    """(p50 ms, p95 ms, ピーク確保量 MB)"""
+    latencies = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        latencies.append(1000 * (time.perf_counter() - t0))
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))], peak / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="analyze_image_bytes ベンチマーク")
+    parser.add_argument("--image", type=str, required=True, help="テスト用画像のパス")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from sentiment_bridge import SentimentBridge
+
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+
+    bridge = SentimentBridge(preload=True)
+    bridge.analyze_image_bytes(image_bytes)  # ウォームアップ
+
+    print("\n" + "=" * 64)
+    print(f"📦 analyze_image_bytes benchmark ({len(image_bytes) / 1024:.0f} KB, {args.repeat} calls)")
+    print("=" * 64)
+    for label, func in (
+        ("tempfile", lambda: legacy_analyze_bytes(bridge, image_bytes)),
+        ("in-memory", lambda: bridge.analyze_image_bytes(image_bytes)),
+    ):
+        p50, p95, peak = measure(func, args.repeat)
+        print(f"  {label:>9}: p50={p50:7.1f}ms  p95={p95:7.1f}ms  peak alloc={peak:6.1f}MB")
+    print("=" * 64 + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+SentimentBridgeLite vs SentimentBridge（DeepFace）ベンチマーク
+
+- import時間: 別プロセスで各モジュール（+ DeepFace本体）を import するまでの時間
+- 1枚あたりの処理時間（p50 / p95）
+- kotaro_emotion の一致率（DeepFace の結果を基準）
+
+使用方法:
+    python scripts/benchmark_sentiment_lite.py
+    python scripts/benchmark_sentiment_lite.py --dir Xpost-EX/pattern_images --limit 30
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+IMPORTS = {
+    "lite": "from sentiment_bridge_lite import SentimentBridgeLite",
+    "deepface": "from sentiment_bridge import get_deepface; get_deepface()",
+}
+
+
+def import_seconds(statement: str) -> float:
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def timed(func, images):
+    results, latencies = [], []
+    for path in images:
+        t0 = time.perf_counter()
+        results.append(func(path))
+        latencies.append(1000 * (time.perf_counter() - t0))
+    latencies.sort()
+    return results, statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SentimentBridgeLite ベンチマーク")
+    parser.add_argument("--dir", type=str, default="Xpost-EX/pattern_images", help="画像ディレクトリ")
+    parser.add_argument("--limit", type=int, default=20, help="使用する画像枚数")
+    args = parser.parse_args()
+
+    images = sorted(str(p) for p in Path(args.dir).iterdir() if p.suffix.lower() in IMAGE_EXTS)[:args.limit]
+    if not images:
+        print(f"❌ 画像が見つかりません: {args.dir}")
+        return 1
+
+    print("\n" + "=" * 64)
+    print(f"⚡ SentimentBridgeLite vs DeepFace ({len(images)} images, CPU)")
+    print("=" * 64)
+    for name, statement in IMPORTS.items():
+        print(f"  import {name:>8}: {import_seconds(statement):.2f}s")
+
+    from sentiment_bridge import SentimentBridge
+    from sentiment_bridge_lite import SentimentBridgeLite
+
+    lite = SentimentBridgeLite()
+    full = SentimentBridge(preload=True)
+    lite.analyze_image(images[0])  # ウォームアップ
+    full.analyze_image(images[0])
+
+    lite_results, lite_p50, lite_p95 = timed(lite.analyze_image, images)
+    full_results, full_p50, full_p95 = timed(full.analyze_image, images)
+
+    agree = sum(a["kotaro_emotion"] == b["kotaro_emotion"] for a, b in zip(lite_results, full_results))
+    faces = sum(r["face_detected"] for r in lite_results)
+
+    print(f"  lite    : p50={lite_p50:6.1f}ms  p95={lite_p95:6.1f}ms  faces={faces}/{len(images)}  "
+          f"({'FER+ ONNX' if lite.emotion_net is not None else 'smile cascade'})")
+    print(f"  deepface: p50={full_p50:6.1f}ms  p95={full_p95:6.1f}ms")
+    print(f"  kotaro_emotion agreement: {agree / len(images):.0%}")
+    print("=" * 64 + "\n")
+
+    lite.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+VisionCore バッチ推論ベンチマーク: 1枚ずつのループ vs analyze_batch
+
+使用方法:
+    python scripts/benchmark_vision_batch.py
+    python scripts/benchmark_vision_batch.py --dir Xpost-EX/pattern_images --limit 16 --batch-size 4
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VisionCore バッチ推論ベンチマーク")
+    parser.add_argument("--dir", type=str, default="Xpost-EX/pattern_images", help="画像ディレクトリ")
+    parser.add_argument("--limit", type=int, default=8, help="使用する画像枚数")
+    parser.add_argument("--batch-size", type=int, default=4, help="analyze_batch のバッチサイズ")
+    parser.add_argument("--mode", type=str, default="simple", choices=["simple", "full"])
+    args = parser.parse_args()
+
+    images = sorted(str(p) for p in Path(args.dir).iterdir() if p.suffix.lower() in IMAGE_EXTS)[:args.limit]
+    if not images:
+        print(f"❌ 画像が見つかりません: {args.dir}")
+        return 1
+
+    from vision_core import VisionCore
+
+    vision = VisionCore()
+    single = vision.analyze_simple if args.mode == "simple" else vision.analyze
+
+    print("\n" + "=" * 60)
+    print(f"👁️  VisionCore batch benchmark ({len(images)} images, mode={args.mode})")
+    print("=" * 60)
+
+    # ウォームアップ（モデルロード・カーネル初期化を計測から除外）
+    single(images[0])
+
+    start = time.perf_counter()
+    for path in images:
+        single(path)
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = vision.analyze_batch(images, mode=args.mode, batch_size=args.batch_size)
+    batch_s = time.perf_counter() - start
+    assert len(results) == len(images)
+
+    print(f"  per-image loop : {len(images) / loop_s:.2f} images/sec ({loop_s:.1f}s)")
+    print(f"  analyze_batch  : {len(images) / batch_s:.2f} images/sec ({batch_s:.1f}s, batch={args.batch_size})")
+    print(f"  speedup        : {loop_s / batch_s:.2f}x")
+    print("=" * 60 + "\n")
+
+    vision.unload()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
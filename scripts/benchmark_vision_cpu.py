@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+VisionCore CPUレイテンシベンチマーク（参照画像 Xpost-EX/pattern_images）
+
+CPUノード・CI向け。小さいモデルを --model で指定して計測する。
+
+使用方法:
+    python scripts/benchmark_vision_cpu.py --model openbmb/MiniCPM-V-2_6 --limit 3
+    python scripts/benchmark_vision_cpu.py --threads 8 --quantize dynamic_int8 --dtype float32
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VisionCore CPUベンチマーク")
+    parser.add_argument("--dir", type=str, default="Xpost-EX/pattern_images", help="参照画像ディレクトリ")
+    parser.add_argument("--limit", type=int, default=5, help="使用する画像枚数")
+    parser.add_argument("--model", type=str, default=None, help="モデルID（デフォルト: CONFIG['cpu_model_id']）")
+    parser.add_argument("--threads", type=int, default=0, help="torchスレッド数（0=デフォルト）")
+    parser.add_argument("--dtype", type=str, default="bfloat16", choices=["bfloat16", "float32"])
+    parser.add_argument("--quantize", type=str, default="none", choices=["none", "dynamic_int8"])
+    args = parser.parse_args()
+
+    images = sorted(str(p) for p in Path(args.dir).iterdir() if p.suffix.lower() in IMAGE_EXTS)[:args.limit]
+    if not images:
+        print(f"❌ 画像が見つかりません: {args.dir}")
+        return 1
+
+    import vision_core
+    from vision_core import VisionCore
+
+    vision_core.CONFIG["cpu_threads"] = args.threads
+    vision_core.CONFIG["cpu_dtype"] = args.dtype
+    vision_core.CONFIG["cpu_quantize"] = args.quantize
+
+    vision = VisionCore(model_id=args.model, device="cpu")
+
+    print("\n" + "=" * 60)
+    print(f"🖥️  VisionCore CPU benchmark: {vision.model_id}")
+    print(f"   dtype={args.dtype} quantize={args.quantize} threads={args.threads or 'default'}")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    vision._load_model()
+    print(f"  load        : {time.perf_counter() - start:.1f}s")
+
+    latencies = []
+    for path in images:
+        start = time.perf_counter()
+        vision.analyze_simple(path)
+        latencies.append(time.perf_counter() - start)
+        print(f"  {Path(path).name:<24}: {latencies[-1]:.1f}s")
+
+    # 1枚目はカーネル初期化を含むので分けて表示
+    steady = latencies[1:] or latencies
+    print("-" * 60)
+    print(f"  first image : {latencies[0]:.1f}s")
+    print(f"  steady p50  : {statistics.median(steady):.1f}s  mean: {statistics.mean(steady):.1f}s")
+    print("=" * 60 + "\n")
+
+    vision.unload()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
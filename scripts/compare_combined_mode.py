@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+combined モード比較: analyze + analyze_simple（2回の推論） vs analyze_combined（1回）
+
+画像キャッシュは無効にして、両方式ともエンコードから計測する。
+- 時間: 1枚あたりの合計解析時間
+- 形式: 4項目の見出しが揃っている率、褒め要素JSONが取り出せた率
+- 一致度: 褒め要素（expression/gesture/atmosphere）の文字bigram Jaccard（2回呼びの結果との比較）
+
+使用方法:
+    python scripts/compare_combined_mode.py
+    python scripts/compare_combined_mode.py --dir Xpost-EX/pattern_images --limit 10
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+SECTIONS = ("■ 主役の要素", "■ 光と色の空気感", "■ 背景とシチュエーション", "■ エモーショナル・キーワード")
+
+
+def parse_simple(text):
+    """褒め要素JSONを辞書で取り出す（```json 囲みにも対応）"""
+    if not text:
+        return None
+    match = re.search(r"\{[^{}]*\}", text)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+
+
+def bigram_jaccard(a: str, b: str) -> float:
+    ga = {a[i:i + 2] for i in range(len(a) - 1)}
+    gb = {b[i:i + 2] for i in range(len(b) - 1)}
+    if not ga and not gb:
+        return 1.0
+    return len(ga & gb) / len(ga | gb)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="combined モード比較")
+    parser.add_argument("--dir", type=str, default="Xpost-EX/pattern_images", help="画像ディレクトリ")
+    parser.add_argument("--limit", type=int, default=8, help="使用する画像枚数")
+    args = parser.parse_args()
+
+    images = sorted(str(p) for p in Path(args.dir).iterdir() if p.suffix.lower() in IMAGE_EXTS)[:args.limit]
+    if not images:
+        print(f"❌ 画像が見つかりません: {args.dir}")
+        return 1
+
+    from vision_core import VisionCore, ImageCache, SIMPLE_KEYS
+
+    vision = VisionCore()
+    vision.warmup()
+    # 2方式を同じ条件で比べるため、前処理・エンコーダ出力のキャッシュは使わない
+    vision.image_cache = ImageCache(0)
+    vision.state_cache = ImageCache(0)
+
+    totals = {"two_call_s": 0.0, "combined_s": 0.0}
+    counts = {"two_call_sections": 0, "combined_sections": 0,
+              "two_call_json": 0, "combined_json": 0, "fallbacks": 0}
+    similarity = {k: [] for k in SIMPLE_KEYS}
+
+    for path in images:
+        t0 = time.perf_counter()
+        full = vision.analyze(path)
+        simple = parse_simple(vision.analyze_simple(path))
+        t1 = time.perf_counter()
+        combined = vision.analyze_combined(path, fallback=False)
+        t2 = time.perf_counter()
+
+        totals["two_call_s"] += t1 - t0
+        totals["combined_s"] += t2 - t1
+        counts["two_call_sections"] += all(s in full for s in SECTIONS)
+        counts["combined_sections"] += all(s in combined["full"] for s in SECTIONS)
+        counts["two_call_json"] += simple is not None
+        combined_simple = parse_simple(combined["simple"])
+        counts["combined_json"] += combined_simple is not None
+        counts["fallbacks"] += combined_simple is None
+
+        if simple and combined_simple:
+            for key in SIMPLE_KEYS:
+                similarity[key].append(bigram_jaccard(str(simple.get(key, "")), str(combined_simple.get(key, ""))))
+        print(f"  {Path(path).name}: two-call={t1 - t0:.1f}s  combined={t2 - t1:.1f}s")
+
+    n = len(images)
+    print("\n" + "=" * 64)
+    print(f"🔀 combined vs two-call ({n} images)")
+    print("=" * 64)
+    print(f"  time/img   : two-call={totals['two_call_s'] / n:.2f}s  combined={totals['combined_s'] / n:.2f}s  "
+          f"({totals['combined_s'] / totals['two_call_s']:.0%})")
+    print(f"  4 sections : two-call={counts['two_call_sections'] / n:.0%}  "
+          f"combined={counts['combined_sections'] / n:.0%}")
+    print(f"  JSON parsed: two-call={counts['two_call_json'] / n:.0%}  combined={counts['combined_json'] / n:.0%}  "
+          f"(fallback needed: {counts['fallbacks']})")
+    for key in SIMPLE_KEYS:
+        values = similarity[key]
+        avg = sum(values) / len(values) if values else 0.0
+        print(f"  {key:>11} similarity (bigram Jaccard): {avg:.2f}")
+    print("=" * 64 + "\n")
+
+    vision.unload()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+api/main.py 画像アップロードのピークRSS計測（20MB級の画像1枚あたり）
+
+api/main.py を別プロセスで起動し（Gemini はローカルのフェイク）、
+同じ画像を次の3通りで送って、1リクエストの間にサーバーのRSSがどれだけ増えたか（ピーク - 直前）を測る。
+- legacy:    旧ハンドラ（split(',') + base64.b64decode → 原寸のままGeminiへ）を /generate-comment-legacy に再現
+- base64:    現在の /generate-comment（1バッファでデコード → 縮小してからGeminiへ）
+- multipart: /generate-comment/upload（一時ファイルから直接縮小デコード）
+最後に上限超えのリクエストが413になることも確認する。
+
+ピークは /proc/<pid>/status の VmHWM を clear_refs で毎回リセットして読むため Linux 専用。
+google-generativeai・Pillow・httpx・uvicorn が必要。
+
+使用方法:
+    python scripts/measure_api_upload_rss.py
+    python scripts/measure_api_upload_rss.py --image-mb 20 --repeat 5
+"""
+
+import argparse
+import base64
+import io
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_gemini_api import start_fake_gemini  # noqa: E402
+
+# サーバープロセス: api/main.py に旧ハンドラを足して起動
+LAUNCHER = """
+import base64, sys, uvicorn
+sys.path.insert(0, {api_dir!r})
+import main as api
+
+@api.app.post("/generate-comment-legacy", response_model=api.CommentResponse)
+async def generate_comment_legacy(request: api.CommentRequest):
+    header, image_data = request.image_base64.split(",", 1)
+    mime_type = header.split(":")[1].split(";")[0]
+    image_bytes = base64.b64decode(image_data)
+    comment = await api.call_gemini([{{"mime_type": mime_type, "data": image_bytes}}, api.build_prompt(request, True)])
+    return api.CommentResponse(comment=comment, source="ai")
+
+uvicorn.run(api.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+
+def make_jpeg(target_mb: float) -> bytes:
+    """ノイズ画像をJPEGにして target_mb 以上になるまで大きくする（圧縮が効かない最悪ケース）"""
+    from PIL import Image
+
+    w, h = 4000, 3000
+    while True:
+        out = io.BytesIO()
+        Image.frombytes("RGB", (w, h), os.urandom(w * h * 3)).save(out, "JPEG", quality=95)
+        data = out.getvalue()
+        if len(data) >= target_mb * 1024 * 1024:
+            return data
+        scale = (target_mb * 1024 * 1024 / len(data)) ** 0.5 * 1.02
+        w, h = int(w * scale), int(h * scale)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def read_status(pid: int) -> dict:
+    """VmRSS / VmHWM（MB）"""
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(rest.split()[0]) / 1024
+    return values
+
+
+def reset_peak(pid: int):
+    with open(f"/proc/{pid}/clear_refs", "w") as f:
+        f.write("5")
+
+
+def measure(client, pid: int, send, repeat: int):
+    deltas, statuses = [], set()
+    for _ in range(repeat):
+        reset_peak(pid)
+        before = read_status(pid)["VmRSS"]
+        statuses.add(send(client).status_code)
+        deltas.append(read_status(pid)["VmHWM"] - before)
+    return statistics.median(deltas), max(deltas), statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="api/main.py アップロードのピークRSS計測")
+    parser.add_argument("--image-mb", type=float, default=20, help="送る画像のサイズ（MB）")
+    parser.add_argument("--repeat", type=int, default=3, help="方式ごとのリクエスト数")
+    args = parser.parse_args()
+
+    import httpx
+
+    image = make_jpeg(args.image_mb)
+    data_url = "data:image/jpeg;base64," + base64.b64encode(image).decode()
+
+    fake = start_fake_gemini(latency_ms=50)
+    port = free_port()
+    env = dict(os.environ, GEMINI_API_KEY="dummy", GEMINI_API_ENDPOINT=f"http://127.0.0.1:{fake.server_port}")
+    server = subprocess.Popen(
+        [sys.executable, "-c", LAUNCHER.format(api_dir=os.path.join(ROOT, "api"), port=port)], env=env
+    )
+
+    modes = {
+        "legacy": lambda c: c.post("/generate-comment-legacy", json={"image_base64": data_url}),
+        "base64": lambda c: c.post("/generate-comment", json={"image_base64": data_url}),
+        "multipart": lambda c: c.post("/generate-comment/upload",
+                                      files={"image": ("photo.jpg", image, "image/jpeg")}),
+    }
+
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            for _ in range(100):
+                try:
+                    client.get("/health")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+            for send in modes.values():
+                send(client)  # ウォームアップ（アロケータ・スレッドの初期化分を除く）
+
+            print("\n" + "=" * 72)
+            print(f"📦 Upload peak RSS per request ({len(image) / 1024 / 1024:.1f}MB JPEG, "
+                  f"base64 {len(data_url) / 1024 / 1024:.1f}MB)")
+            print("=" * 72)
+            print(f"  idle RSS: {read_status(server.pid)['VmRSS']:.0f}MB")
+            for label, send in modes.items():
+                median, worst, statuses = measure(client, server.pid, send, args.repeat)
+                print(f"  {label:>9}: +{median:6.1f}MB (max +{worst:.1f}MB)  status={sorted(statuses)}")
+
+            try:
+                oversized = client.post("/generate-comment", content=b"{" + b" " * (64 * 1024 * 1024) + b"}",
+                                        headers={"Content-Type": "application/json"})
+                print(f"  oversized (64MB body): status={oversized.status_code}")
+            except httpx.TransportError as e:
+                # 413を返した後にサーバーが接続を閉じ、送信途中で切れることがある
+                print(f"  oversized (64MB body): rejected ({type(e).__name__})")
+            print("=" * 72 + "\n")
+    finally:
+        server.terminate()
+        server.wait()
+        fake.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+CVフラグ計測: VLMプロンプト短縮によるトークン削減と、CV推定とVLM判定の一致率
+
+各画像について
+- full   : 従来のプロンプト（全フラグをVLMに聞く）
+- reduced: close_dist / group_feeling / crowd_venue を外したプロンプト
+の2回 call_vlm_analysis_v4 を呼び、usage のトークン数と時間を記録する。
+full の VLM フラグを基準に、CV（cv_features）の推定値との一致率を出す。
+
+LMDeploy サーバー（kotaro_api.LMDEPLOY_API_URL）が起動している必要がある。
+
+使用方法:
+    python scripts/measure_cv_flags.py
+    python scripts/measure_cv_flags.py --dir Xpost-EX/pattern_images --limit 30
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+POSE_FLAGS = ("pose_safe_theory", "pose_front_true", "pose_side_cool")
+
+
+async def run(images):
+    import kotaro_api
+    from cv_features import CvFeatureExtractor, PREFILLED_FLAGS, prefill_flags, cross_check_flags
+    from image_loader import load_image_bgr
+    from image_gate import CONFIG as GATE_CONFIG
+
+    # usage を記録するため、APIクライアントの呼び出しを包む
+    usage = []
+    create = kotaro_api.client.chat.completions.create
+
+    async def recording_create(**kwargs):
+        completion = await create(**kwargs)
+        usage.append(completion.usage)
+        return completion
+
+    kotaro_api.client.chat.completions.create = recording_create
+
+    extractor = CvFeatureExtractor()
+    totals = {mode: Counter() for mode in ("full", "reduced")}
+    agree, vetoed = Counter(), Counter()
+    cv_ms = 0.0
+
+    for path in images:
+        t0 = time.perf_counter()
+        features = extractor.extract(load_image_bgr(path, GATE_CONFIG["max_image_size"]))
+        cv_ms += 1000 * (time.perf_counter() - t0)
+        cv_flags = prefill_flags(features)
+
+        for mode, omit in (("full", ()), ("reduced", PREFILLED_FLAGS)):
+            t0 = time.perf_counter()
+            _, flags = await kotaro_api.call_vlm_analysis_v4(path, omit_flags=omit)
+            totals[mode]["seconds"] += time.perf_counter() - t0
+            totals[mode]["prompt_tokens"] += usage[-1].prompt_tokens
+            totals[mode]["completion_tokens"] += usage[-1].completion_tokens
+            if mode == "full":
+                vlm_flags = flags
+
+        for key in PREFILLED_FLAGS:
+            agree[key] += bool(vlm_flags.get(key)) == cv_flags[key]
+        checked = cross_check_flags(vlm_flags, features)
+        for key in POSE_FLAGS:
+            vetoed[key] += bool(vlm_flags.get(key)) and not checked.get(key)
+
+    return totals, agree, vetoed, cv_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CVフラグ計測")
+    parser.add_argument("--dir", type=str, default="Xpost-EX/pattern_images", help="画像ディレクトリ")
+    parser.add_argument("--limit", type=int, default=20, help="使用する画像枚数")
+    args = parser.parse_args()
+
+    images = sorted(str(p) for p in Path(args.dir).iterdir() if p.suffix.lower() in IMAGE_EXTS)[:args.limit]
+    if not images:
+        print(f"❌ 画像が見つかりません: {args.dir}")
+        return 1
+
+    totals, agree, vetoed, cv_ms = asyncio.run(run(images))
+    n = len(images)
+    full, reduced = totals["full"], totals["reduced"]
+
+    print("\n" + "=" * 64)
+    print(f"🧮 CV flags vs VLM ({n} images)")
+    print("=" * 64)
+    for mode, t in totals.items():
+        print(f"  {mode:>7}: prompt={t['prompt_tokens'] / n:6.0f} tok  completion={t['completion_tokens'] / n:5.0f} tok  "
+              f"vlm={t['seconds'] / n:.2f}s/img")
+    saved = 1 - reduced["completion_tokens"] / full["completion_tokens"]
+    print(f"  completion tokens saved: {saved:.0%}  (CV: {cv_ms / n:.1f}ms/img)")
+    for key, count in agree.items():
+        print(f"  agreement {key:>14}: {count / n:.0%}")
+    print(f"  pose flags dropped by face-yaw cross-check: {dict(vetoed)}")
+    print("=" * 64 + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Image Gate 計測: イベントフォルダ1つ分で VLM 呼び出しをどれだけ省けるか
+
+各画像を ImageGate で判定し、判定別の枚数・理由・1枚あたりの判定時間と、
+フラット判定になった画像がどのパターン（P11/P12）に落ちるかを集計する。
+
+使用方法:
+    python scripts/measure_image_gate.py --dir /path/to/event_folder
+    python scripts/measure_image_gate.py --dir Xpost-EX/pattern_images --vlm-seconds 2.5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from image_gate import ImageGate, PASS, FLAT, REJECT, flat_scores  # noqa: E402
+from kotaro_scoring_v4 import KotaroScorerV4  # noqa: E402
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Image Gate 計測")
+    parser.add_argument("--dir", type=str, default="Xpost-EX/pattern_images", help="画像ディレクトリ")
+    parser.add_argument("--vlm-seconds", type=float, default=2.0, help="VLM 1回あたりの想定時間（節約時間の試算用）")
+    parser.add_argument("--verbose", action="store_true", help="画像ごとの判定を表示")
+    args = parser.parse_args()
+
+    images = sorted(str(p) for p in Path(args.dir).rglob("*") if p.suffix.lower() in IMAGE_EXTS)
+    if not images:
+        print(f"❌ 画像が見つかりません: {args.dir}")
+        return 1
+
+    gate = ImageGate()
+    scorer = KotaroScorerV4()
+    decisions, reasons, flat_patterns = Counter(), Counter(), Counter()
+    latencies = []
+
+    for path in images:
+        t0 = time.perf_counter()
+        result = gate.check(path)
+        latencies.append(1000 * (time.perf_counter() - t0))
+
+        decisions[result["decision"]] += 1
+        reasons[result["reason"]] += 1
+        if result["decision"] == FLAT:
+            flags = result["flags"]
+            scores = scorer.apply_secondary_scoring(flat_scores(result), flags)
+            flat_patterns[scorer.decide_pattern(scores, flags)["pattern_id"]] += 1
+        if args.verbose:
+            print(f"  {Path(path).name}: {result['decision']:>6} ({result['reason']}, faces={result['faces']}, "
+                  f"blur={result['blur']})")
+
+    n = len(images)
+    skipped = decisions[FLAT] + decisions[REJECT]
+    latencies.sort()
+
+    print("\n" + "=" * 64)
+    print(f"🚪 Image Gate: {n} images in {args.dir}")
+    print("=" * 64)
+    for decision in (PASS, FLAT, REJECT):
+        print(f"  {decision:>6}: {decisions[decision]:4d} ({decisions[decision] / n:.0%})")
+    print(f"  reasons: {dict(reasons)}")
+    print(f"  flat → patterns: {dict(flat_patterns)}")
+    print(f"  gate time: p50={statistics.median(latencies):.1f}ms  "
+          f"p95={latencies[int(0.95 * (n - 1))]:.1f}ms")
+    print(f"  VLM calls saved: {skipped}/{n} ({skipped / n:.0%}) "
+          f"≈ {skipped * args.vlm_seconds:.0f}s of GPU time at {args.vlm_seconds}s/call")
+    print("=" * 64 + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+フォールバック候補プールのシミュレーション（重複ブロック率）
+
+call_kotaro_generation_v3 の重複防止（1時間TTL）を模擬クロックで再現し、
+- baseline: PATTERN_EXAMPLES（各3件）から random.choice
+- feedback: PATTERN_EXAMPLES + いいね済みコメントを CommentSampler で重み付き抽選
+の2方式で、持続負荷時の重複ブロック率・パターン越境率・強制ユニーク化率を比較する。
+
+LLM出力は「参考例のオウム返し」「ハレーション」「新規コメント」の3種を確率で模擬する。
+
+使用方法:
+    python scripts/simulate_fallback_duplicates.py
+    python scripts/simulate_fallback_duplicates.py --rate 900 --hours 6 --synthetic-likes 40
+"""
+
+import argparse
+import ast
+import json
+import os
+import random
+import sys
+from collections import Counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from comment_sampler import CommentSampler, ALL_PATTERNS  # noqa: E402
+
+TTL = 3600
+
+# 合成いいねコメント用の断片（実データが少ない環境での大規模プール模擬用）
+FRAGMENTS_A = ["笑顔", "目線", "表情", "立ち姿", "ポーズ", "雰囲気", "仕草", "目力", "衣装", "横顔"]
+FRAGMENTS_B = ["いいね！", "たまらん…", "好きすぎる", "かわいい！", "決まってる！", "刺さる", "ほっとする", "最強"]
+EMOJIS = ["✨", "❤", "😊", "😍"]
+
+
+def load_pattern_examples() -> dict:
+    """kotaro_api.py の PATTERN_EXAMPLES をASTから取り出す（サーバー依存をimportしない）"""
+    with open(os.path.join(ROOT, "kotaro_api.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", "") == "PATTERN_EXAMPLES":
+            return ast.literal_eval(node.value)
+    raise RuntimeError("PATTERN_EXAMPLES not found in kotaro_api.py")
+
+
+def load_likes() -> list:
+    """実際のフィードバックログ（JSONL優先、無ければ旧JSON）"""
+    jsonl = os.path.join(ROOT, "feedback_likes.jsonl")
+    legacy = os.path.join(ROOT, "feedback_likes.json")
+    if os.path.exists(jsonl):
+        with open(jsonl, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if os.path.exists(legacy):
+        with open(legacy, encoding="utf-8") as f:
+            return json.load(f)
+    return []
+
+
+def synthetic_likes(patterns, per_pattern: int, rng: random.Random) -> list:
+    """パターン毎に per_pattern 種類のいいね済みコメントを合成（いいね数はZipf風）"""
+    entries = []
+    for pid in patterns:
+        seen = set()
+        while len(seen) < per_pattern:
+            seen.add(f"{rng.choice(FRAGMENTS_A)}{rng.choice(FRAGMENTS_B)}{rng.choice(EMOJIS)}")
+        for rank, comment in enumerate(sorted(seen), start=1):
+            entries.extend({"pattern": pid, "comment": comment} for _ in range(max(1, 20 // rank)))
+    return entries
+
+
+class SimCache:
+    """CommentCache のTTL判定を模擬クロックで再現"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.used = {}
+
+    def is_duplicate(self, comment: str) -> bool:
+        ts = self.used.get(comment)
+        return ts is not None and self.now - ts < TTL
+
+    def add(self, comment: str):
+        self.used[comment] = self.now
+
+
+def simulate(policy: str, examples: dict, likes: list, args) -> Counter:
+    rng = random.Random(args.seed)
+    cache = SimCache()
+    sampler = CommentSampler(examples, rng=random.Random(args.seed + 1))
+    sampler.load_likes(likes)
+    patterns = list(examples)
+    # パターン出現頻度は偏る（P11/P12/P08 が多い想定）
+    pattern_weights = [1 + 3 * (pid in ("P08", "P11", "P12")) for pid in patterns]
+
+    stats = Counter()
+    n_requests = int(args.rate * args.hours)
+    for i in range(n_requests):
+        cache.now = i * 3600.0 / args.rate
+        pid = rng.choices(patterns, pattern_weights)[0]
+        pool = examples[pid]
+
+        # LLM出力の模擬
+        r = rng.random()
+        if r < args.parrot:
+            comment = rng.choice(pool)  # 参考例のオウム返し
+        elif r < args.parrot + args.halluc:
+            stats["hallucination"] += 1
+            comment = rng.choice(pool) if policy == "baseline" else sampler.sample(pid)
+        else:
+            comment = f"new-{i}"
+
+        stats["requests"] += 1
+        if cache.is_duplicate(comment):
+            stats["duplicate_blocked"] += 1
+            if policy == "baseline":
+                same = [c for c in rng.sample(pool, len(pool)) if not cache.is_duplicate(c)]
+                other = [c for p, exs in examples.items() if p != pid for c in exs]
+                rng.shuffle(other)
+                other = [c for c in other if not cache.is_duplicate(c)]
+                fallback = same[0] if same else (other[0] if other else None)
+                kind = "same" if same else ("cross" if other else None)
+            else:
+                fallback = sampler.sample_unused(pid, cache.is_duplicate)
+                kind = "same" if fallback else None
+                if not fallback:
+                    fallback = sampler.sample_unused(ALL_PATTERNS, cache.is_duplicate, exclude=pid)
+                    kind = "cross" if fallback else None
+
+            if fallback:
+                stats[f"fallback_{kind}"] += 1
+                comment = fallback
+            else:
+                stats["forced_unique"] += 1
+                comment = f"forced-{i}"
+        cache.add(comment)
+
+    stats["pool_size"] = sum(len(v) for v in examples.values()) if policy == "baseline" else sampler.pool_size()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="フォールバック重複ブロック率シミュレーション")
+    parser.add_argument("--rate", type=int, default=600, help="1時間あたりのリクエスト数")
+    parser.add_argument("--hours", type=float, default=4, help="シミュレーション時間")
+    parser.add_argument("--parrot", type=float, default=0.5, help="LLMが参考例をそのまま返す確率")
+    parser.add_argument("--halluc", type=float, default=0.15, help="ハレーション判定される確率")
+    parser.add_argument("--synthetic-likes", type=int, default=30,
+                        help="パターン毎に合成するいいね済みコメント種類数（0で実データのみ）")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    examples = load_pattern_examples()
+    likes = load_likes()
+    if args.synthetic_likes:
+        likes = likes + synthetic_likes(examples, args.synthetic_likes, random.Random(args.seed))
+
+    print("\n" + "=" * 64)
+    print(f"🎲 Fallback simulation: {args.rate} req/h × {args.hours}h "
+          f"(parrot={args.parrot}, halluc={args.halluc}, likes={len(likes)})")
+    print("=" * 64)
+    for policy in ("baseline", "feedback"):
+        s = simulate(policy, examples, likes, args)
+        n = s["requests"]
+        print(f"  {policy:>8}: pool={s['pool_size']:4d}  "
+              f"dup-blocked={s['duplicate_blocked'] / n:6.1%}  "
+              f"cross-pattern={s['fallback_cross'] / n:6.1%}  "
+              f"forced-unique={s['forced_unique'] / n:6.1%}")
+    print("=" * 64 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+生成キャッシュのシミュレーション（1イベント分のLLM呼び出し削減数）
+
+模擬クロックで1イベント（デフォルト1,000枚）を流し、
+- call_kotaro_generation_v3: キーはパターンID（P01〜P12、出現頻度は偏る）
+- KotaroEngine: キーは (名前, 感情)
+のそれぞれについて、CandidateCache 有り/無しのLLM呼び出し数と重複ブロック数を比べる。
+
+LLM出力は「参考例のオウム返し」「ハレーション（不合格）」「新規コメント」の3種を確率で模擬する
+（simulate_fallback_duplicates.py と同じモデル）。
+
+使用方法:
+    python scripts/simulate_generation_cache.py
+    python scripts/simulate_generation_cache.py --photos 1000 --hours 5 --models 8
+"""
+
+import argparse
+import os
+import random
+import sys
+from collections import Counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from generation_cache import CandidateCache  # noqa: E402
+from simulate_fallback_duplicates import SimCache, TTL, load_pattern_examples  # noqa: E402
+
+EMOTIONS = ["happy", "neutral", "surprise"]
+
+
+def simulate(keys, key_weights, examples, use_cache: bool, args) -> Counter:
+    rng = random.Random(args.seed)
+    dedup = SimCache()
+    cache = CandidateCache(window_seconds=TTL if use_cache else 0, clock=lambda: dedup.now)
+
+    stats = Counter()
+    for i in range(args.photos):
+        dedup.now = i * args.hours * 3600.0 / args.photos
+        key = rng.choices(keys, key_weights)[0]
+        stats["requests"] += 1
+
+        comment = cache.take(key, dedup.is_duplicate)
+        if comment is None:
+            stats["llm_calls"] += 1
+            r = rng.random()
+            if r < args.parrot:
+                comment = rng.choice(examples[key])
+            elif r < args.parrot + args.halluc:
+                comment = None  # 不合格 → フォールバック（キャッシュには積まない）
+                stats["fallback"] += 1
+            else:
+                comment = f"new-{i}"
+            if comment is not None:
+                if dedup.is_duplicate(comment):
+                    # 返さなかった合格コメントは未使用の候補として積む
+                    stats["duplicate_blocked"] += 1
+                    cache.add(key, comment, used=False)
+                else:
+                    cache.add(key, comment)
+            comment = comment or f"fallback-{i}"
+        dedup.add(comment)
+
+    stats["candidates"] = cache.size()
+    return stats
+
+
+def report(label, keys, key_weights, examples, args):
+    base = simulate(keys, key_weights, examples, False, args)
+    cached = simulate(keys, key_weights, examples, True, args)
+    avoided = base["llm_calls"] - cached["llm_calls"]
+    print(f"  {label} ({len(keys)} prompts)")
+    for name, s in (("no cache", base), ("cache", cached)):
+        print(f"    {name:>8}: llm_calls={s['llm_calls']:5d}  "
+              f"dup-blocked={s['duplicate_blocked']:4d}  fallback={s['fallback']:4d}  "
+              f"candidates={s['candidates']:4d}")
+    print(f"    → LLM呼び出し削減: {avoided} 回 ({avoided / max(base['llm_calls'], 1):.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成キャッシュ LLM呼び出し削減シミュレーション")
+    parser.add_argument("--photos", type=int, default=1000, help="イベント中の写真枚数")
+    parser.add_argument("--hours", type=float, default=5, help="イベントの長さ（時間）")
+    parser.add_argument("--models", type=int, default=8, help="KotaroEngine側: モデルさんの人数")
+    parser.add_argument("--parrot", type=float, default=0.3, help="LLMが参考例をそのまま返す確率")
+    parser.add_argument("--halluc", type=float, default=0.15, help="ハレーション判定される確率")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print("\n" + "=" * 72)
+    print(f"🗃️ Generation cache simulation: {args.photos} photos / {args.hours}h "
+          f"(parrot={args.parrot}, halluc={args.halluc})")
+    print("=" * 72)
+
+    examples = load_pattern_examples()
+    patterns = list(examples)
+    # パターン出現頻度は偏る（P11/P12/P08 が多い想定）
+    report("call_kotaro_generation_v3", patterns,
+           [1 + 3 * (pid in ("P08", "P11", "P12")) for pid in patterns], examples, args)
+
+    keys = [(f"model{m}", e) for m in range(args.models) for e in EMOTIONS]
+    engine_examples = {k: [f"{k[0]}-{k[1]}-ex{j}" for j in range(4)] for k in keys}
+    report("KotaroEngine", keys, [3 if e == "happy" else 1 for _, e in keys], engine_examples, args)
+    print("=" * 72 + "\n")
+
+
+if __name__ == "__main__":
+    main()
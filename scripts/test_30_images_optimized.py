@@ -4,10 +4,13 @@ import json
 import base64
 import time
 import re
+import sys
 from openai import OpenAI
-from PIL import Image
 import io
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from image_loader import load_image
+
 # LMDeploy setup
 client = OpenAI(api_key="dummy", base_url="http://localhost:23334/v1")
 IMAGE_DIR = "Xpost-EX/pattern_images"
@@ -40,18 +43,11 @@ CRITERIA_TEXT = [
 
 def resize_and_encode_image(image_path, max_size=1024):
     try:
-        with Image.open(image_path) as img:
-            # Resize if strictly larger
-            if max(img.size) > max_size:
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            
-            # Convert to RGB if RGBA (to save as JPEG)
-            if img.mode == 'RGBA':
-                img = img.convert('RGB')
-                
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG", quality=85)
-            return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        # Reduced-scale decode (JPEG draft) + EXIF orientation + fit to max_size, as RGB for JPEG
+        img = load_image(image_path, max_size=max_size)
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=85)
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
     except Exception as e:
         print(f"Error resizing image {image_path}: {e}")
         return None
@@ -1,13 +1,39 @@
 """
 SentimentBridge: 写真から感情を抽出してKotaro-Engineに連携
 
+顔検出器（OpenCV Haar）と感情モデル（DeepFace Emotion）は初回に1回だけ用意して使い回す。
+複数枚は analyze_many で顔を切り出してから1回の predict でまとめて分類する。
+DeepFace が無い・重みが読めない・推論に失敗した場合も例外は出さず neutral を返す。
+
 使用方法:
     python sentiment_bridge.py --image "path/to/image.jpg"
+    python sentiment_bridge.py --image a.jpg --image b.jpg --timings
 """
 
+import time
+from collections import deque
 import cv2
 import numpy as np
-from typing import Dict, Optional, Tuple
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+from image_loader import load_image_bgr
+
+# 顔検出・感情推定に十分な長辺サイズ（24MPをフル展開しない）
+ANALYSIS_MAX_SIZE = 1024
+
+# DeepFace Emotion モデルの出力順と入力サイズ（48x48 グレースケール）
+EMOTION_LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+EMOTION_INPUT_SIZE = 48
+
+# DeepFace の detector_backend="opencv" と同じ検出パラメータ
+FACE_CASCADE = "haarcascade_frontalface_default.xml"
+DETECT_SCALE_FACTOR = 1.1
+DETECT_MIN_NEIGHBORS = 10
+
+# ステージ別の処理時間は直近この回数分だけ保持する（常駐プロセスでも増え続けない）
+TIMING_WINDOW = 1000
+
+ImageInput = Union[str, bytes, np.ndarray]
 
 # DeepFace は重いので遅延インポート
 _deepface = None
@@ -20,6 +46,17 @@ def get_deepface():
     return _deepface
 
 
+def build_emotion_model():
+    """DeepFace の感情モデル（Keras）を1回だけ構築して返す"""
+    DeepFace = get_deepface()
+    try:
+        model = DeepFace.build_model(model_name="Emotion", task="facial_attribute")
+    except TypeError:
+        model = DeepFace.build_model("Emotion")  # deepface < 0.0.93
+    # 0.0.80以降は Kerasモデルをクライアントクラスで包んでいる
+    return getattr(model, "model", model)
+
+
 class SentimentBridge:
     """写真から感情を抽出してKotaro-Engineに連携"""
     
@@ -34,65 +71,137 @@ class SentimentBridge:
         "neutral": "neutral",
     }
     
-    def __init__(self):
+    def __init__(self, preload: bool = False):
+        """
+        Args:
+            preload: 感情モデルを今ロードする（デフォルトは初回の分析時。失敗しても例外にせず遅延ロードに戻る）
+        """
         self.last_analysis = None
+        self.detector = cv2.CascadeClassifier(cv2.data.haarcascades + FACE_CASCADE)
+        self._emotion_model = None
+        self.timings: Dict[str, Deque[float]] = {}
+        self.reset_timings()
+        if preload:
+            try:
+                self.emotion_model
+            except Exception as e:
+                print(f"[SentimentBridge] 感情モデルの事前ロードに失敗（初回分析時に再試行）: {e}")
+    
+    @property
+    def emotion_model(self):
+        if self._emotion_model is None:
+            self._emotion_model = build_emotion_model()
+        return self._emotion_model
+    
+    @staticmethod
+    def _empty_result() -> Dict:
+        return {
+            "raw_emotions": {},
+            "dominant": "neutral",
+            "kotaro_emotion": "neutral",
+            "confidence": 0
+        }
+    
+    def _decode(self, image: ImageInput) -> np.ndarray:
+        """パス・バイト列は縮小デコード（JPEGはdraft）+ EXIF回転、配列はそのまま"""
+        if isinstance(image, np.ndarray):
+            return image
+        return load_image_bgr(image, ANALYSIS_MAX_SIZE)
+    
+    def _detect_face(self, img: np.ndarray) -> Optional[np.ndarray]:
+        """最大の顔を 48x48 グレースケール [0, 1] で切り出す（顔が無ければNone）"""
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        faces = self.detector.detectMultiScale(
+            gray, scaleFactor=DETECT_SCALE_FACTOR, minNeighbors=DETECT_MIN_NEIGHBORS
+        )
+        if len(faces) == 0:
+            return None
+        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+        face = cv2.resize(gray[y:y + h, x:x + w], (EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE))
+        return face.astype(np.float32) / 255.0
     
-    def analyze_image(self, image_path: str) -> Dict:
-        """画像から感情を分析"""
+    def _to_result(self, probs: np.ndarray) -> Dict:
+        emotions = {label: float(p) * 100 for label, p in zip(EMOTION_LABELS, probs)}
+        dominant = EMOTION_LABELS[int(np.argmax(probs))]
+        return {
+            "raw_emotions": emotions,
+            "dominant": dominant,
+            "kotaro_emotion": self.EMOTION_MAP.get(dominant, "neutral"),
+            "confidence": emotions[dominant]
+        }
+    
+    def analyze_many(self, images: List[ImageInput]) -> List[Dict]:
+        """
+        複数画像の感情をまとめて分析
         
-        DeepFace = get_deepface()
+        デコード・顔検出は1枚ずつ、感情分類は切り出した顔を積み重ねて1回の predict で行う。
+        顔が見つからない・読めない画像は neutral（confidence 0）を返す。
         
-        try:
-            # 感情分析を実行
-            result = DeepFace.analyze(
-                img_path=image_path,
-                actions=["emotion"],
-                enforce_detection=True,
-                detector_backend="opencv"  # 軽量なバックエンド
-            )
-            
-            if isinstance(result, list):
-                result = result[0]
-            
-            # 感情スコアを取得
-            emotions = result.get("emotion", {})
-            dominant = result.get("dominant_emotion", "neutral")
+        Args:
+            images: 画像パス、エンコード済みバイト列、またはデコード済みのBGR配列
             
-            self.last_analysis = {
-                "raw_emotions": emotions,
-                "dominant": dominant,
-                "kotaro_emotion": self.EMOTION_MAP.get(dominant, "neutral"),
-                "confidence": emotions.get(dominant, 0)
-            }
-            
-            return self.last_analysis
-            
-        except Exception as e:
-            print(f"[SentimentBridge] 分析エラー: {e}")
-            return {
-                "raw_emotions": {},
-                "dominant": "neutral",
-                "kotaro_emotion": "neutral",
-                "confidence": 0
-            }
-    
-    def analyze_image_bytes(self, image_bytes: bytes) -> Dict:
-        """バイトデータから感情を分析"""
+        Returns:
+            各画像の分析結果（imagesと同じ順序）
+        """
+        results = [self._empty_result() for _ in images]
+        faces: List[np.ndarray] = []
+        face_index: List[int] = []
         
-        # NumPy配列に変換
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        for i, image in enumerate(images):
+            try:
+                t0 = time.perf_counter()
+                img = self._decode(image)
+                t1 = time.perf_counter()
+                face = self._detect_face(img)
+                t2 = time.perf_counter()
+            except Exception as e:
+                print(f"[SentimentBridge] 分析エラー: {e}")
+                continue
+            self.timings["decode"].append(t1 - t0)
+            self.timings["detect"].append(t2 - t1)
+            if face is not None:
+                faces.append(face)
+                face_index.append(i)
         
-        # 一時ファイルに保存（DeepFaceはパスが必要）
-        import tempfile
-        import os
+        if faces:
+            t0 = time.perf_counter()
+            batch = np.stack(faces)[..., np.newaxis]  # (N, 48, 48, 1)
+            try:
+                probs = self.emotion_model.predict(batch, verbose=0)
+            except Exception as e:
+                # モデルが読めない・推論に失敗した場合は顔ありの画像も neutral のまま返す
+                print(f"[SentimentBridge] 分析エラー: {e}")
+                return results
+            self.timings["classify"].append(time.perf_counter() - t0)
+            for i, p in zip(face_index, probs):
+                results[i] = self._to_result(p)
         
-        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
-            cv2.imwrite(f.name, img)
-            result = self.analyze_image(f.name)
-            os.unlink(f.name)
+        return results
+    
+    def analyze_image(self, image_path: ImageInput) -> Dict:
+        """画像から感情を分析（パス、バイト列、またはデコード済みのBGR配列）"""
+        self.last_analysis = self.analyze_many([image_path])[0]
+        return self.last_analysis
+    
+    def reset_timings(self):
+        """ステージ別の処理時間の記録を空にする"""
+        self.timings = {stage: deque(maxlen=TIMING_WINDOW) for stage in ("decode", "detect", "classify")}
+    
+    def timing_summary(self) -> Dict[str, float]:
+        """ステージ別の平均時間(ms、直近 TIMING_WINDOW 回)。classify は1回の predict あたり"""
+        return {
+            f"{stage}_ms": round(1000 * sum(v) / len(v), 1) if v else 0.0
+            for stage, v in self.timings.items()
+        }
+    
+    def analyze_image_bytes(self, image_bytes: bytes) -> Dict:
+        """
+        バイトデータから感情を分析
         
-        return result
+        アップロードされたバッファを1回だけデコードし、配列のまま解析する
+        （一時ファイルへの再エンコード・再読み込みはしない）。
+        """
+        return self.analyze_image(image_bytes)
     
     def get_prompt_modifier(self, analysis: Dict) -> str:
         """分析結果からプロンプト修飾子を生成"""
@@ -122,7 +231,9 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description="SentimentBridge: 写真から感情を抽出")
-    parser.add_argument("--image", type=str, required=True, help="画像ファイルのパス")
+    parser.add_argument("--image", type=str, required=True, action="append",
+                        help="画像ファイルのパス（複数指定でまとめて分析）")
+    parser.add_argument("--timings", action="store_true", help="ステージ別の処理時間を表示")
     
     args = parser.parse_args()
     
@@ -130,15 +241,18 @@ def main():
     
     print("\n🔍 SentimentBridge v1.0")
     print("=" * 40)
-    print(f"画像: {args.image}")
-    print("-" * 40)
     
-    result = bridge.analyze_image(args.image)
+    for image, result in zip(args.image, bridge.analyze_many(args.image)):
+        print(f"画像: {image}")
+        print("-" * 40)
+        print(f"  検出された感情: {result['dominant']}")
+        print(f"  Kotaro用: {result['kotaro_emotion']}")
+        print(f"  確信度: {result['confidence']:.1f}%")
+        print(f"  プロンプト: {bridge.get_prompt_modifier(result)}")
     
-    print(f"  検出された感情: {result['dominant']}")
-    print(f"  Kotaro用: {result['kotaro_emotion']}")
-    print(f"  確信度: {result['confidence']:.1f}%")
-    print(f"  プロンプト: {bridge.get_prompt_modifier(result)}")
+    if args.timings:
+        print("-" * 40)
+        print(f"  ⏱️ {bridge.timing_summary()}")
     
     print("=" * 40)
 
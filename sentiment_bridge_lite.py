@@ -1,23 +1,123 @@
 """
-SentimentBridge Simple: 写真解析なしの簡易版
-まず動かすことを優先
+SentimentBridge Lite: OpenCVだけで動く軽量な顔・感情推定
+
+DeepFace/TensorFlow を読み込む SentimentBridge は import・起動に数秒かかるため、
+こちらは低レイテンシ層として OpenCV のみで完結させる。
+- 顔検出: Haar カスケード（OpenCV同梱）
+- 感情推定: FER+ の ONNX モデルを cv2.dnn で実行（CPU）
+- ONNXモデルが無い場合は笑顔カスケードで happy / neutral を判定
+
+FER+ モデル（emotion-ferplus-8.onnx）は ONNX Model Zoo から取得して
+CONFIG["emotion_onnx"]（環境変数 KOTARO_EMOTION_ONNX）に置く。
+
+画像は image_loader（縮小デコード）で読むため Pillow が必要。
+読めない・壊れた画像も例外にせず neutral（face_detected: False）を返す。
 
 使用方法:
     python sentiment_bridge_lite.py --image "path/to/image.jpg"
 """
 
-from typing import Dict
+from typing import Dict, Optional
 import os
 
+import cv2
+import numpy as np
+
+from image_loader import load_image_bgr
+
+
+# =============================================================================
+# 設定
+# =============================================================================
+
+CONFIG = {
+    # FER+ ONNXモデルのパス（無ければ笑顔カスケードにフォールバック）
+    "emotion_onnx": os.getenv("KOTARO_EMOTION_ONNX", "models/emotion-ferplus-8.onnx"),
+
+    # 検出用の長辺サイズ（Haarは解像度に比例して遅くなる）
+    "max_image_size": 640,
+
+    # 顔検出（Haar）
+    "face_cascade": "haarcascade_frontalface_default.xml",
+    "scale_factor": 1.1,
+    "min_neighbors": 5,
+    "min_face_ratio": 0.05,  # 長辺に対する最小の顔サイズ
+
+    # 笑顔カスケード（フォールバック）
+    "smile_cascade": "haarcascade_smile.xml",
+    "smile_min_neighbors": 20,
+}
+
+# FER+ の出力順（DeepFace と同じ感情名に揃える）
+FERPLUS_LABELS = ["neutral", "happy", "surprise", "sad", "angry", "disgust", "fear", "contempt"]
+FERPLUS_INPUT_SIZE = 64
+
+# 感情 → Kotaro-Engineの感情（SentimentBridge.EMOTION_MAP と同じ方針）
+KOTARO_EMOTION = {"happy": "happy", "surprise": "surprise"}
+
+
 class SentimentBridgeLite:
-    """写真から顔を検出してKotaro-Engineに連携（簡易版）"""
-    
-    def __init__(self):
-        pass
-    
+    """写真から顔を検出してKotaro-Engineに連携（OpenCVのみの軽量版）"""
+
+    def __init__(self, emotion_onnx: Optional[str] = None):
+        """
+        Args:
+            emotion_onnx: FER+ ONNXモデルのパス（デフォルト: CONFIG["emotion_onnx"]）
+        """
+        self.face_detector = cv2.CascadeClassifier(cv2.data.haarcascades + CONFIG["face_cascade"])
+        self.smile_detector = None
+        self.emotion_net = None
+
+        path = emotion_onnx or CONFIG["emotion_onnx"]
+        if os.path.exists(path):
+            self.emotion_net = cv2.dnn.readNetFromONNX(path)
+            self.emotion_net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.emotion_net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        else:
+            print(f"[SentimentBridgeLite] ⚠️ {path} が無いため笑顔検出で代用します")
+            self.smile_detector = cv2.CascadeClassifier(cv2.data.haarcascades + CONFIG["smile_cascade"])
+
+    def _detect_face(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        """
+        最大の顔領域（グレースケール）を返す
+
+        ヒストグラム平坦化は Haar 検出にだけ使い、切り出す顔は元の輝度のまま
+        （FER+ は平坦化していない顔で学習されているため）。
+        """
+        min_size = int(max(gray.shape) * CONFIG["min_face_ratio"])
+        faces = self.face_detector.detectMultiScale(
+            cv2.equalizeHist(gray),
+            scaleFactor=CONFIG["scale_factor"],
+            minNeighbors=CONFIG["min_neighbors"],
+            minSize=(min_size, min_size),
+        )
+        if len(faces) == 0:
+            return None
+        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+        return gray[y:y + h, x:x + w]
+
+    def _classify(self, face: np.ndarray):
+        """(感情, 確信度0-1) を返す"""
+        if self.emotion_net is not None:
+            # FER+ は 0-255 のグレースケール 64x64 をそのまま入力する
+            blob = cv2.dnn.blobFromImage(face, 1.0, (FERPLUS_INPUT_SIZE, FERPLUS_INPUT_SIZE))
+            self.emotion_net.setInput(blob)
+            logits = self.emotion_net.forward().flatten()
+            probs = np.exp(logits - logits.max())
+            probs /= probs.sum()
+            best = int(np.argmax(probs))
+            return FERPLUS_LABELS[best], float(probs[best])
+
+        # フォールバック: 顔の下半分で笑顔を探す
+        h = face.shape[0]
+        smiles = self.smile_detector.detectMultiScale(
+            cv2.equalizeHist(face[h // 2:]), scaleFactor=1.7, minNeighbors=CONFIG["smile_min_neighbors"]
+        )
+        return ("happy", 0.7) if len(smiles) else ("neutral", 0.5)
+
     def analyze_image(self, image_path: str) -> Dict:
-        """画像を解析（簡易版：ファイル存在確認のみ）"""
-        
+        """画像を解析（顔検出 + 感情推定）"""
+
         # ファイル存在確認
         if not os.path.exists(image_path):
             return {
@@ -25,42 +125,67 @@ class SentimentBridgeLite:
                 "emotion": "neutral",
                 "kotaro_emotion": "neutral"
             }
-        
-        # 今は常にhappyを返す（後で本格的な解析を追加）
+
+        try:
+            img = load_image_bgr(image_path, CONFIG["max_image_size"])
+        except Exception as e:
+            # 壊れた・未対応形式のファイルは顔なしと同じ扱い
+            print(f"[SentimentBridgeLite] 画像を読めません: {e}")
+            img = None
+
+        face = None
+        if img is not None:
+            face = self._detect_face(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+        if face is None:
+            return {
+                "face_detected": False,
+                "confidence": 0.0,
+                "emotion": "neutral",
+                "kotaro_emotion": "neutral"
+            }
+
+        emotion, confidence = self._classify(face)
         return {
             "face_detected": True,
-            "confidence": 0.9,
-            "emotion": "happy",
-            "kotaro_emotion": "happy"
+            "confidence": confidence,
+            "emotion": emotion,
+            "kotaro_emotion": KOTARO_EMOTION.get(emotion, "neutral")
         }
-    
+
     def close(self):
-        pass
+        self.emotion_net = None
+        self.face_detector = None
+        self.smile_detector = None
 
 
 # CLI
 def main():
     import argparse
-    
+    import time
+
     parser = argparse.ArgumentParser(description="SentimentBridge Lite")
     parser.add_argument("--image", type=str, required=True, help="画像ファイルのパス")
-    
+
     args = parser.parse_args()
-    
+
     bridge = SentimentBridgeLite()
-    
-    print("\n🔍 SentimentBridge Lite v1.0 (Simple)")
+
+    print("\n🔍 SentimentBridge Lite v2.0 (OpenCV)")
     print("=" * 40)
     print(f"画像: {args.image}")
     print("-" * 40)
-    
+
+    start = time.perf_counter()
     result = bridge.analyze_image(args.image)
-    
-    print(f"  ファイル存在: {'✅' if result['face_detected'] else '❌'}")
+    elapsed_ms = 1000 * (time.perf_counter() - start)
+
+    print(f"  顔検出: {'✅' if result['face_detected'] else '❌'}")
+    print(f"  感情: {result['emotion']} (確信度 {result.get('confidence', 0):.1%})")
     print(f"  Kotaro用: {result['kotaro_emotion']}")
-    
+    print(f"  処理時間: {elapsed_ms:.1f}ms")
+
     print("=" * 40)
-    
+
     bridge.close()
 
 
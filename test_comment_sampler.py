@@ -0,0 +1,61 @@
+"""
+CommentSampler テスト
+"""
+
+import random
+from collections import Counter
+
+from comment_sampler import CommentSampler, ALL_PATTERNS
+
+
+def _sampler() -> CommentSampler:
+    sampler = CommentSampler({"P01": ["a", "b", "c"], "P02": ["d", "e"]}, rng=random.Random(0))
+    sampler.add_like("P01", "a", 8)
+    return sampler
+
+
+def test_sample_unused_exhausts_and_recovers():
+    """未使用だけを返し、尽きたらNone、期限切れになったものは再び返すこと"""
+    sampler = _sampler()
+    used = set()
+    while True:
+        comment = sampler.sample_unused("P01", lambda c: c in used)
+        if comment is None:
+            break
+        assert comment not in used
+        used.add(comment)
+    assert used == {"a", "b", "c"}
+
+    used.discard("b")
+    assert sampler.sample_unused("P01", lambda c: c in used) == "b"
+
+
+def test_sample_unused_keeps_weights_after_expiry():
+    """使用済みから戻った候補も、いいね数どおりの重みで抽選されること"""
+    sampler = _sampler()
+    used = {"a", "b", "c"}
+    assert sampler.sample_unused("P01", lambda c: c in used) is None
+
+    counts = Counter(sampler.sample_unused("P01", lambda c: False) for _ in range(5000))
+    assert set(counts) == {"a", "b", "c"}
+    assert counts["a"] > 3 * (counts["b"] + counts["c"])  # 重み 9:1:1
+
+
+def test_cross_pattern_excludes_exhausted_pattern():
+    """他パターンから借りるとき、尽きた元パターンの候補は返さないこと"""
+    sampler = _sampler()
+    draws = {sampler.sample_unused(ALL_PATTERNS, lambda c: False, exclude="P01") for _ in range(50)}
+    assert draws == {"d", "e"}
+    assert sampler.sample_unused(ALL_PATTERNS, lambda c: c in {"d", "e"}, exclude="P01") is None
+    # exclude は呼び出しの間だけ。指定しなければ元パターンの候補も引ける
+    assert sampler.sample_unused(ALL_PATTERNS, lambda c: c in {"d", "e"}) in {"a", "b", "c"}
+
+
+def test_validator_filters_likes():
+    """validator に通らないいいね済みコメントは、ログからの一括反映でも候補に入れないこと"""
+    sampler = CommentSampler({"P01": ["a"]}, rng=random.Random(0), validator=lambda c: "NG" not in c)
+    assert sampler.add_like("P01", "good") is True
+    assert sampler.add_like("P01", "NG comment") is False
+    sampler.load_likes([{"pattern": "P01", "comment": "NG again"}, {"pattern": "P01", "comment": "fine"}])
+    assert sampler.rejected_likes == 2
+    assert {sampler.sample("P01") for _ in range(200)} == {"a", "good", "fine"}
@@ -0,0 +1,108 @@
+"""
+FeedbackStore テスト
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from feedback_store import FeedbackStore, FeedbackStats
+
+
+def _entry(i: int, pattern: str = "P01") -> dict:
+    return {"comment": f"コメント{i}", "pattern": pattern, "timestamp": "", "liked_at": "2026-01-05T00:00:00"}
+
+
+def test_concurrent_append():
+    """並行いいねで1件も失われないこと"""
+    with tempfile.TemporaryDirectory() as d:
+        store = FeedbackStore(os.path.join(d, "likes.jsonl"))
+        store.load()
+
+        async def run():
+            await asyncio.gather(*(store.append(_entry(i)) for i in range(200)))
+
+        asyncio.run(run())
+        store.close()
+
+        entries = FeedbackStore(os.path.join(d, "likes.jsonl")).load()
+        assert len(entries) == 200
+        assert {e["comment"] for e in entries} == {f"コメント{i}" for i in range(200)}
+
+
+def test_legacy_migration():
+    """旧形式JSONを取り込み、1000件で切り詰めないこと"""
+    with tempfile.TemporaryDirectory() as d:
+        legacy = os.path.join(d, "likes.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([_entry(i) for i in range(1200)], f, ensure_ascii=False)
+
+        store = FeedbackStore(os.path.join(d, "likes.jsonl"), legacy_path=legacy)
+        assert len(store.load()) == 1200
+        assert store.append_sync(_entry(1200)) == 1201
+        store.close()
+        assert os.path.exists(legacy)
+
+
+def test_broken_line_compaction():
+    """書き込み途中で切れた行は起動時に除去されること"""
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "likes.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(_entry(0), ensure_ascii=False) + "\n")
+            f.write('{"comment": "途中')
+
+        store = FeedbackStore(path)
+        assert len(store.load()) == 1
+        store.append_sync(_entry(1))
+        store.close()
+        assert len(FeedbackStore(path).read_all()) == 2
+
+
+def test_stats_incremental():
+    """差分更新の集計が全件再集計と一致し、時間窓・上位Nが正しいこと"""
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    entries = [_entry(i % 3, "P01") for i in range(7)] + [_entry(9, "P02")]
+    entries.append({"comment": "今日の一枚", "pattern": "P02", "liked_at": now, "event": "TGS"})
+
+    stats = FeedbackStats.from_entries(entries, top_n=2)
+    snap = stats.snapshot()
+
+    assert snap["total"] == 9
+    assert snap["by_pattern"] == {"P01": 7, "P02": 2}
+    assert snap["top_comments"]["P01"] == [
+        {"comment": "コメント0", "likes": 3},
+        {"comment": "コメント1", "likes": 2},
+    ]
+    assert snap["windows"]["last_hour"] == {"total": 1, "by_pattern": {"P02": 1}}
+    assert snap["last_event"] == {"name": "TGS", "total": 1}
+
+    # コメント2が追い越したら上位2件が入れ替わる
+    for _ in range(3):
+        stats.add(_entry(2, "P01"))
+    assert [t["comment"] for t in stats.snapshot(top=2)["top_comments"]["P01"]] == ["コメント2", "コメント0"]
+
+
+def test_stats_windows_out_of_order():
+    """時刻順でない取り込み・読めない時刻・未来の時刻でも時間窓が正しいこと"""
+    fmt = "%Y-%m-%dT%H:%M:%S"
+    now = time.time()
+    recent = {"comment": "新", "pattern": "P01", "liked_at": time.strftime(fmt, time.localtime(now - 60))}
+    old = {"comment": "旧", "pattern": "P02", "liked_at": time.strftime(fmt, time.localtime(now - 7200))}
+    future = {"comment": "未来", "pattern": "P03", "liked_at": time.strftime(fmt, time.localtime(now + 600))}
+    broken = {"comment": "壊れ", "pattern": "P04", "liked_at": "昨日"}
+
+    stats = FeedbackStats.from_entries([recent, old, future, broken, {"comment": "無し", "pattern": "P05"}])
+    snap = stats.snapshot()
+    assert snap["total"] == 5
+    assert snap["windows"]["last_hour"] == {"total": 2, "by_pattern": {"P01": 1, "P03": 1}}
+    assert snap["windows"]["last_day"]["by_pattern"] == {"P01": 1, "P02": 1, "P03": 1}
+
+    try:
+        stats.snapshot(top=-1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("negative top must be rejected")
@@ -0,0 +1,66 @@
+"""
+CandidateCache テスト
+"""
+
+from generation_cache import CandidateCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_no_repeat_window():
+    """期間内は同じ候補を返さず、期間を過ぎたら最も昔に使ったものから再利用すること"""
+    clock = FakeClock()
+    cache = CandidateCache(window_seconds=3600, clock=clock)
+
+    assert cache.take("P01") is None
+    cache.add("P01", "笑顔いいね✨")
+    clock.now = 10
+    cache.add("P01", "目線たまらん✨")
+
+    clock.now = 3000
+    assert cache.take("P01") is None  # 両方とも1時間以内に使用済み
+
+    clock.now = 3605
+    assert cache.take("P01") == "笑顔いいね✨"
+    assert cache.take("P01") is None  # もう一方はまだ期間内
+    clock.now = 3615
+    assert cache.take("P01") == "目線たまらん✨"
+
+    assert cache.take("P02") is None  # キーごとに独立
+    assert cache.stats()["hits"] == 2
+
+
+def test_unused_candidates_first():
+    """未使用として積んだ候補は使用時刻に関係なくすぐ返し、外部の使用済み判定も尊重すること"""
+    clock = FakeClock()
+    cache = CandidateCache(window_seconds=3600, clock=clock)
+    cache.add(("栞", "happy"), "A✨")
+    cache.add(("栞", "happy"), "B✨", used=False)
+    cache.add(("栞", "happy"), "C✨", used=False)
+
+    assert cache.take(("栞", "happy"), is_used=lambda c: c == "B✨") == "C✨"
+    assert cache.take(("栞", "happy")) == "B✨"
+    assert cache.take(("栞", "happy")) is None
+
+
+def test_eviction_and_disabled():
+    """上限を超えたら最も昔に使った候補を捨て、window 0 なら何も保持しないこと"""
+    clock = FakeClock()
+    cache = CandidateCache(window_seconds=60, max_per_key=2, clock=clock)
+    for i, comment in enumerate(["a", "b", "c"]):
+        clock.now = i
+        cache.add("P01", comment)
+    assert cache.size("P01") == 2
+
+    clock.now = 100
+    assert {cache.take("P01"), cache.take("P01")} == {"b", "c"}
+
+    disabled = CandidateCache(window_seconds=0)
+    disabled.add("P01", "a")
+    assert disabled.take("P01") is None and disabled.size() == 0
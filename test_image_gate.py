@@ -0,0 +1,109 @@
+"""
+ImageGate テスト（合成画像で判定・フラット化を確認）
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("PIL")
+
+from image_gate import CONFIG, ImageGate, PASS, FLAT, REJECT, flat_scores, merge_flags
+from kotaro_scoring_v4 import KotaroScorerV4
+
+
+def _noise(mean: int = 128, spread: int = 60, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    img = rng.normal(mean, spread, size=(480, 640, 3))
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def test_reject_unusable_exposure():
+    """レンズキャップ・白飛びは拒否されること"""
+    gate = ImageGate()
+    assert gate.check(np.zeros((480, 640, 3), np.uint8))["reason"] == "uniform"
+    assert gate.check(_noise(mean=4, spread=4))["decision"] == REJECT
+    assert gate.check(_noise(mean=252, spread=4))["decision"] == REJECT
+
+
+def test_reject_undecodable():
+    """画像でないバイト列・途中で切れたJPEGは例外にせず拒否されること"""
+    import cv2
+
+    gate = ImageGate()
+    garbage = gate.check(b"\x00\x01not an image" * 64)
+    assert garbage["decision"] == REJECT
+    assert garbage["reason"] == "undecodable"
+    assert garbage["faces"] == 0
+
+    ok, jpeg = cv2.imencode(".jpg", _noise())
+    assert ok
+    assert gate.check(jpeg.tobytes()[:200])["reason"] == "undecodable"
+
+
+def test_no_face_goes_to_vlm(monkeypatch):
+    """顔が見つからないだけの画像はVLMへ回し、設定でフラット判定にもできること"""
+    result = ImageGate().check(_noise())
+    assert result["decision"] == PASS
+    assert result["reason"] == "no_face"
+    assert result["faces"] == 0
+
+    monkeypatch.setitem(CONFIG, "flat_without_face", True)
+    assert ImageGate().check(_noise())["decision"] == FLAT
+
+
+def test_profile_counts_as_face(monkeypatch):
+    """正面の顔が無くても横顔カスケードに当たればフラットにしないこと"""
+    monkeypatch.setitem(CONFIG, "flat_without_face", True)
+    gate = ImageGate()
+    extract_gray = gate.features.extract_gray
+    monkeypatch.setattr(gate.features, "extract_gray", lambda gray: {**extract_gray(gray), "profile": True})
+
+    result = gate.check(_noise())
+    assert result["decision"] == PASS
+    assert result["reason"] == "profile"
+
+
+def test_blurred_is_flat():
+    """強くぼかした画像はブレとしてフラット判定になること"""
+    import cv2
+
+    # 80pxの市松模様（コントラストは保ったままエッジだけ鈍らせる）
+    ys, xs = np.indices((480, 640)) // 80
+    board = np.where((ys + xs) % 2 == 0, 230, 20).astype(np.uint8)
+    blurred = cv2.GaussianBlur(np.dstack([board] * 3), (0, 0), 10)
+    assert ImageGate().check(blurred)["reason"] == "blurred"
+
+
+def test_concurrent_checks_match_serial():
+    """1つの ImageGate を複数スレッドから同時に呼んでも、1スレッドで順に呼んだ結果と同じになること"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    gate = ImageGate()
+    images = [_noise(seed=i) for i in range(6)]
+    serial = [gate.check(img)["features"] for img in images]
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        concurrent = list(pool.map(lambda img: gate.check(img)["features"], images))
+    assert concurrent == serial
+
+
+def test_flat_scores_land_on_flat_patterns():
+    """フラット用スコアは二次加点後も P11/P12 に落ちること"""
+    scorer = KotaroScorerV4()
+    cases = [
+        ({"faces": 0, "flags": {"group_feeling": False, "crowd_venue": False, "close_dist": False}}, "P12"),
+        ({"faces": 0, "flags": {"group_feeling": False, "crowd_venue": True, "close_dist": False}}, "P12"),
+        ({"faces": 1, "flags": {"group_feeling": False, "crowd_venue": False, "close_dist": True}}, "P11"),
+        ({"faces": 5, "flags": {"group_feeling": True, "crowd_venue": True, "close_dist": False}}, "P12"),
+    ]
+    for gate_result, expected in cases:
+        flags = gate_result["flags"]
+        scores = scorer.apply_secondary_scoring(flat_scores(gate_result), flags)
+        assert scorer.decide_pattern(scores, flags)["pattern_id"] == expected
+
+
+def test_merge_flags():
+    """CVのフラグはVLMのフラグを上書きせず補い、聞いていないフラグは埋めること"""
+    gate_result = {"flags": {"group_feeling": True, "crowd_venue": False, "close_dist": False}}
+    merged = merge_flags({"close_dist": True, "talk_to": True}, gate_result)
+    assert merged == {"close_dist": True, "talk_to": True, "group_feeling": True, "crowd_venue": False}
@@ -0,0 +1,105 @@
+"""
+AsyncKotaroEngine テスト（ローカルのスタブOllamaサーバーに対して実行）
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("ollama")
+
+from kotaro_engine import AsyncKotaroEngine
+
+DELAY = 0.3
+
+
+class StubOllama(BaseHTTPRequestHandler):
+    """/api/generate に DELAY 秒後に応答する。replies を順番に返す"""
+
+    replies = itertools.cycle(["栞さんマジ可愛い、優勝✨"])
+    lock = threading.Lock()
+    requests = 0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        with StubOllama.lock:
+            StubOllama.requests += 1
+            reply = next(StubOllama.replies)
+        time.sleep(DELAY)
+        body = json.dumps({"model": "stub", "response": reply, "done": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    # デフォルトの listen backlog（5）だと同時接続があふれ、SYN再送で約1秒待たされることがある
+    request_queue_size = 64
+
+
+def _run(replies, coro_factory, **engine_kwargs):
+    StubOllama.replies = itertools.cycle(replies)
+    StubOllama.requests = 0
+    server = StubServer(("127.0.0.1", 0), StubOllama)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        async def main():
+            host = f"http://127.0.0.1:{server.server_port}"
+            async with AsyncKotaroEngine(model="stub", host=host, **engine_kwargs) as engine:
+                return await coro_factory(engine)
+        return asyncio.run(main())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_first_valid_wins():
+    """不合格（NGワード）を飛ばして合格した出力を返すこと"""
+    replies = ["悲しげな顔も可愛い✨", "最高すぎる✨", "栞さんいい笑顔もらった📸"]
+    comment = _run(replies, lambda e: e.generate("栞", "happy", max_retries=3))
+    assert comment == "栞さんいい笑顔もらった📸"
+
+
+def test_generate_many_concurrent():
+    """10件を1回分の生成時間の数倍以内で返すこと"""
+    start = time.perf_counter()
+    comments = _run(["栞さん撮れたの優勝✨"], lambda e: e.generate_many(["栞"] * 10, "happy"))
+    elapsed = time.perf_counter() - start
+    assert len(comments) == 10
+    assert all(len(c) <= 18 for c in comments)
+    assert elapsed < DELAY * 3, elapsed
+
+
+def test_fallback_when_all_invalid():
+    """全試行が不合格なら例文にフォールバックすること"""
+    comment = _run(["静寂と光が最高"], lambda e: e.generate("Ely", "neutral", max_retries=2))
+    assert comment.startswith("Elyさん")
+    assert StubOllama.requests == 2
+
+
+def test_fanout():
+    """デフォルトは試行を同時に投げ、fanout=1 なら1本ずつ順番に試すこと"""
+    replies = ["悲しげな顔も可愛い✨", "最高すぎる✨", "栞さんいい笑顔もらった📸"]
+
+    start = time.perf_counter()
+    assert _run(replies, lambda e: e.generate("栞", "happy", max_retries=3)) == "栞さんいい笑顔もらった📸"
+    assert StubOllama.requests == 3
+    assert time.perf_counter() - start < DELAY * 2
+
+    start = time.perf_counter()
+    comment = _run(replies, lambda e: e.generate("栞", "happy", max_retries=3), fanout=1)
+    assert comment == "栞さんいい笑顔もらった📸"
+    assert StubOllama.requests == 3
+    assert time.perf_counter() - start >= DELAY * 3
@@ -0,0 +1,66 @@
+"""
+KotaroEngine 複数候補モード（generate_best）テスト（ollama.generate を固定の出力に差し替えて実行）
+"""
+
+import json
+
+import pytest
+
+pytest.importorskip("ollama")
+
+import kotaro_engine
+from kotaro_engine import KotaroEngine
+
+# 実際に返ってきた形の出力（前置き・番号・鉤括弧・締めの一言が混ざる）
+RAW_OUTPUT = """以下5案です：
+1. 「栞さん、今日もブチ上げ✨」
+2. 栞さんの笑顔に全部持ってかれた
+3. 栞さん撮れたの最高すぎる📸
+4) 栞さん、目線たまらん📸
+- 栞さんの横顔、反則級
+
+18文字以内で5案出力しました。
+---"""
+
+
+def test_split_candidates_drops_preamble():
+    """前置き・指示文の復唱・記号だけの行は候補にしないこと"""
+    candidates = KotaroEngine()._split_candidates(RAW_OUTPUT)
+    assert candidates == [
+        "栞さん、今日もブチ上げ✨",
+        "栞さんの笑顔に全部持ってかれた✨",
+        "栞さん撮れたの最高すぎる📸",
+        "栞さん、目線たまらん📸",
+        "栞さんの横顔、反則級✨",
+    ]
+
+
+def test_generate_best_picks_valid_candidate(monkeypatch):
+    """前置き付きの出力から、NGワードを避けて18文字に近い合格案を選ぶこと"""
+    calls = []
+
+    def fake_generate(**kwargs):
+        calls.append(kwargs)
+        return {"response": RAW_OUTPUT}
+
+    monkeypatch.setattr(kotaro_engine.ollama, "generate", fake_generate)
+    comment = KotaroEngine().generate_best("栞", "happy", candidates=5)
+    assert comment == "栞さんの笑顔に全部持ってかれた✨"
+    assert len(calls) == 1
+    assert "format" not in calls[0]
+
+
+def test_generate_best_constrained(monkeypatch):
+    """制約付きなら配列スキーマを渡し、JSONの comments から選ぶこと"""
+    calls = []
+
+    def fake_generate(**kwargs):
+        calls.append(kwargs)
+        return {"response": json.dumps({"comments": ["栞さん、目線たまらん📸", "静寂が似合う栞さん"]})}
+
+    monkeypatch.setattr(kotaro_engine.ollama, "generate", fake_generate)
+    comment = KotaroEngine(constrained=True).generate_best("栞", "happy", candidates=3)
+    assert comment == "栞さん、目線たまらん📸"
+    schema = calls[0]["format"]["properties"]["comments"]
+    assert schema["maxItems"] == 3 and schema["items"]["maxLength"] == 18
+    assert "JSON" in calls[0]["prompt"]
@@ -0,0 +1,89 @@
+"""
+VisionCore バッチ解析テスト（モデルは呼ばず、_chat を差し替えて前処理・エラー処理だけを確認）
+"""
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+Image = pytest.importorskip("PIL.Image")
+
+from vision_core import BatchDispatcher, VisionCore
+
+
+def _core(chat) -> VisionCore:
+    core = VisionCore(device="cpu")
+    core._loaded = True  # モデルはロードしない
+    core._chat = chat
+    return core
+
+
+def _images(tmp_path):
+    good = []
+    for i, color in enumerate(("red", "blue", "green")):
+        path = tmp_path / f"good{i}.jpg"
+        Image.new("RGB", (64, 48), color).save(path)
+        good.append(str(path))
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not a jpeg")
+    return good, str(broken), str(tmp_path / "missing.jpg")
+
+
+def test_analyze_batch_isolates_bad_images(tmp_path):
+    """読めない・存在しない画像はその位置だけ例外になり、他の画像の結果は返ること"""
+    good, broken, missing = _images(tmp_path)
+    core = _core(lambda keys, images, mode: [f"ok:{image.size}" for image in images])
+
+    results = core.analyze_batch([good[0], broken, good[1], missing, good[2]], batch_size=2)
+    assert len(results) == 5
+    assert [isinstance(r, Exception) for r in results] == [False, True, False, True, False]
+    assert isinstance(results[3], FileNotFoundError)
+    assert results[0] == results[2] == results[4] == "ok:(64, 48)"
+
+
+def test_analyze_batch_retries_failed_chunk_one_by_one(tmp_path):
+    """バッチ推論が失敗したら1枚ずつ推論し直し、失敗した画像だけ例外にすること"""
+    good, _, _ = _images(tmp_path)
+    poison = {}
+
+    def chat(keys, images, mode):
+        if poison["key"] in keys:
+            raise RuntimeError("CUDA error")
+        return ["ok"] * len(keys)
+
+    core = _core(chat)
+    poison["key"] = core._prepare(good[1])[0]
+
+    results = core.analyze_batch(good, batch_size=3)
+    assert results[0] == results[2] == "ok"
+    assert isinstance(results[1], RuntimeError)
+
+
+class FakeCore:
+    """analyze_batch だけを持つ模擬コア（"bad" を含むパスはその位置だけ失敗）"""
+
+    def __init__(self, short: bool = False):
+        self.short = short
+
+    def analyze_batch(self, image_paths, mode="simple", batch_size=None):
+        results = [ValueError(p) if "bad" in p else f"result:{p}" for p in image_paths]
+        return results[:-1] if self.short else results
+
+
+def test_dispatcher_fails_only_the_bad_request():
+    """同じバッチにまとめられても、失敗した要求の Future だけが例外になること"""
+    dispatcher = BatchDispatcher(core_getter=FakeCore, window_ms=200, max_batch=4)
+    futures = [dispatcher.submit(p) for p in ("a.jpg", "bad.jpg", "c.jpg")]
+    assert futures[0].result(timeout=5) == "result:a.jpg"
+    assert futures[2].result(timeout=5) == "result:c.jpg"
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+
+
+def test_dispatcher_resolves_missing_results():
+    """analyze_batch の結果が足りなくても、全ての Future が完了すること"""
+    dispatcher = BatchDispatcher(core_getter=lambda: FakeCore(short=True), window_ms=200, max_batch=4)
+    futures = [dispatcher.submit(p) for p in ("a.jpg", "b.jpg")]
+    assert futures[0].result(timeout=5) == "result:a.jpg"
+    with pytest.raises(RuntimeError):
+        futures[1].result(timeout=5)
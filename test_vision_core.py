@@ -144,6 +144,63 @@ def test_inference(image_path: str):
         return False
 
 
+def test_batch_inference(image_path: str):
+    """バッチ推論テスト（結果が入力順・入力数どおりに返ること）"""
+    print(f"\n📚 バッチ推論テスト: {Path(image_path).name} × 3")
+    
+    try:
+        from vision_core import VisionCore
+        import time
+        
+        vision = VisionCore()
+        
+        start = time.time()
+        results = vision.analyze_batch([image_path] * 3, mode="simple", batch_size=2)
+        elapsed = time.time() - start
+        
+        if len(results) != 3 or not all(isinstance(r, str) and r for r in results):
+            print(f"  ❌ 想定外の結果: {results}")
+            return False
+        
+        print(f"  ✅ 3件の結果を取得")
+        print(f"  ⏱️ 処理時間: {elapsed:.1f}秒")
+        
+        vision.unload()
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ バッチ推論エラー: {e}")
+        return False
+
+
+def test_image_cache(image_path: str):
+    """キャッシュテスト（full → simple で2回目は画像・エンコーダ出力がキャッシュから出ること）"""
+    print(f"\n🗃️ キャッシュテスト: {Path(image_path).name} full → simple")
+    
+    try:
+        from vision_core import VisionCore
+        
+        vision = VisionCore()
+        vision.analyze(image_path)
+        vision.analyze_simple(image_path)
+        stats = vision.cache_stats()
+        
+        print(f"  📊 {stats}")
+        vision.unload()
+        
+        if stats["images"]["hits"] < 1:
+            print("  ❌ 画像キャッシュにヒットしていません")
+            return False
+        if stats["vision_states"]["hits"] < 1:
+            print("  ⚠️ エンコーダ出力はキャッシュされていません（get_vllm_embedding 非対応モデル）")
+        
+        print("  ✅ 2回目の解析でキャッシュを使用")
+        return True
+    except Exception as e:
+        print(f"  ❌ キャッシュテストエラー: {e}")
+        return False
+
+
 def test_api_integration():
     """kotaro_api.py 統合テスト"""
     print("\n🔗 API統合テスト...")
@@ -198,6 +255,8 @@ def main():
     # 6. 推論テスト（画像が指定された場合）
     if args.image:
         results.append(("推論", test_inference(args.image)))
+        results.append(("バッチ推論", test_batch_inference(args.image)))
+        results.append(("キャッシュ", test_image_cache(args.image)))
     
     # 結果サマリー
     print("\n" + "=" * 60)
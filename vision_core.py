@@ -2,10 +2,15 @@
 Vision Core: MiniCPM-V 2.6 int4 画像解析モジュール
 kotarou-engine 視覚認識コア
 
-RTX 4060 (8GB VRAM) 最適化済み
+RTX 4060 (8GB VRAM) 最適化済み / CUDAが無い環境ではCPUで推論
 - 4-bit量子化 (約7GB VRAM使用)
-- 画像リサイズ (512px) によるVRAM節約
-- 推論後VRAM解放
+- 画像リサイズ (512px) によるVRAM節約（JPEGはdraftで縮小デコード）
+- 前処理パイプライン（並列デコード・先読み）
+- アイドル時の自動アンロードと再ロード（ResidencyManager）
+- メモリ圧迫時のみVRAM解放
+- バッチ推論（analyze_batch）
+- full + simple を1回の生成で出す combined モード（analyze_combined）
+- 前処理済み画像・ビジョンエンコーダ出力のキャッシュ（同じ写真の full → simple で再エンコードしない）
 
 使用方法:
     from vision_core import VisionCore
@@ -14,10 +19,23 @@ RTX 4060 (8GB VRAM) 最適化済み
     result = vision.analyze("path/to/image.jpg")
 """
 
+import functools
+import gc
+import hashlib
+import json
+import os
+import re
+import queue
+import threading
+import time
 import torch
 from PIL import Image
 from pathlib import Path
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from image_loader import ImageSource, open_reduced, fit_within
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Iterator, Tuple, Callable, Union
 import logging
 
 # ログ設定
@@ -33,6 +51,15 @@ CONFIG = {
     # モデル設定
     "model_id": "openbmb/MiniCPM-V-2_6-int4",
     
+    # 推論デバイス: "auto"（CUDAがあればGPU、無ければCPU） / "cuda" / "cpu"
+    "device": os.getenv("VISION_DEVICE", "auto"),
+    
+    # CPUモード設定（int4版はbitsandbytes=CUDA専用のため非量子化版を使う）
+    "cpu_model_id": os.getenv("VISION_CPU_MODEL_ID", "openbmb/MiniCPM-V-2_6"),
+    "cpu_dtype": os.getenv("VISION_CPU_DTYPE", "bfloat16"),      # "bfloat16" / "float32"
+    "cpu_quantize": os.getenv("VISION_CPU_QUANTIZE", "none"),    # "none" / "dynamic_int8"
+    "cpu_threads": int(os.getenv("VISION_CPU_THREADS", "0")),    # 0 = torchのデフォルト
+    
     # 画像前処理
     "max_image_size": 512,  # 長辺最大px（VRAM節約）
     
@@ -41,6 +68,24 @@ CONFIG = {
     "top_p": 0.8,            # 確信度低い情報の排除
     "repetition_penalty": 1.2,  # ループ防止
     "max_new_tokens": 512,
+    
+    # バッチ推論
+    "batch_size": 4,            # 1回のmodel.chatに渡す画像数（8GB VRAMで安全な値）
+    "preprocess_workers": 4,    # 前処理（デコード・リサイズ）の並列数
+    "prefetch": 8,              # 推論中に先読みしておく画像数（前処理→推論間のキュー上限）
+    "dispatch_window_ms": 20,   # 動的バッチ: 最初の要求からこの時間内に来た要求をまとめる
+    
+    # メモリ圧迫時のみVRAMキャッシュを解放（毎回のempty_cacheはアロケータ状態を捨てるため）
+    "empty_cache_threshold": 0.90,  # reserved / total がこれを超えたら解放
+    
+    # 常駐管理（共有8GB環境で他モデルと交互に使うため）
+    "idle_unload_minutes": float(os.getenv("VISION_IDLE_UNLOAD_MINUTES", "10")),  # 0で無効
+    "residency_check_seconds": 30,  # アイドル判定の間隔
+    "max_resident": 1,              # 同時にロードしておくVisionCoreの数（超えたらLRUで解放）
+    
+    # 画像キャッシュ（キー = ファイル内容のハッシュ、0で無効）
+    "image_cache_mb": 256,      # 前処理済み画像（RAM）
+    "state_cache_mb": 64,       # ビジョンエンコーダ出力（モデルと同じデバイス上、1枚あたり数MB）
 }
 
 # システムプロンプト（指令書準拠）
@@ -67,32 +112,293 @@ USER_PROMPT = """この写真を以下の4項目で分析してください：
 画像から感じ取れる「切なさ」「希望」「静寂」などの抽象的なキーワードを3つ程度"""
 
 
+# V2.1: 褒め要素のみ抽出（衣装色・背景禁止）
+SIMPLE_PROMPT = """あなたは人物写真の魅力を見つけるプロです。
+
+【タスク】
+この写真の人物の「褒めたくなるポイント」を3つ抽出してください。
+
+【抽出する項目】
+1. expression: 表情の魅力（例: はにかんだ笑顔、キラキラした目、優しい微笑み）
+2. gesture: 仕草・ポーズの魅力（例: 可愛いピースサイン、堂々としたポーズ、セクシーな目線）
+3. atmosphere: 全体の雰囲気（例: 透明感がある、オーラがすごい、癒し系）
+
+【禁止事項】
+- 背景の説明は絶対にしない
+- 衣装の色（青系、赤系、白系など）は言及しない
+- 固有名詞・ブランド名は使わない
+- 英語は使わない
+
+【出力形式】JSON形式で回答
+{"expression": "...", "gesture": "...", "atmosphere": "..."}
+
+日本語のみで回答してください："""
+
+# full（4項目）と simple（褒め要素JSON）を1回の生成で出す（SYSTEM_PROMPTと併用）
+COMBINED_SECTION = "■ 褒めポイント"
+
+COMBINED_PROMPT = f"""この写真を以下の4項目で分析し、最後に褒めポイントをJSONで出力してください：
+
+■ 主役の要素
+人物の表情、ポーズ、視線、衣装の詳細を記述
+
+■ 光と色の空気感
+光の差し方（逆光、サイド光など）、色温度、全体のトーンを記述
+
+■ 背景とシチュエーション
+場所の特定、季節感、周囲のオブジェクトを記述
+
+■ エモーショナル・キーワード
+画像から感じ取れる「切なさ」「希望」「静寂」などの抽象的なキーワードを3つ程度
+
+{COMBINED_SECTION}
+人物の「褒めたくなるポイント」を3つ、次のJSON形式の1行で出力
+{{"expression": "表情の魅力", "gesture": "仕草・ポーズの魅力", "atmosphere": "全体の雰囲気"}}
+- このJSONでは背景の説明・衣装の色・固有名詞・英語を使わない"""
+
+SIMPLE_KEYS = ("expression", "gesture", "atmosphere")
+
+# 解析モード別のデコーディング設定
+GENERATION_KWARGS = {
+    "full": {
+        "sampling": True,
+        "temperature": CONFIG["temperature"],
+        "top_p": CONFIG["top_p"],
+        "repetition_penalty": CONFIG["repetition_penalty"],
+        "max_new_tokens": CONFIG["max_new_tokens"],
+    },
+    "simple": {
+        "sampling": True,
+        "temperature": 0.2,  # V2.1: ハルシネーション抑制
+        "top_p": 0.9,        # V2.1: 確率質量制限
+        "max_new_tokens": 128,
+    },
+    "combined": {
+        "sampling": True,
+        "temperature": CONFIG["temperature"],
+        "top_p": CONFIG["top_p"],
+        "repetition_penalty": CONFIG["repetition_penalty"],
+        "max_new_tokens": CONFIG["max_new_tokens"] + 128,  # full + 褒め要素JSON
+    },
+}
+
+
+def split_combined_output(text: str) -> Tuple[str, Optional[str]]:
+    """
+    combined モードの出力を (full相当の4項目, simple相当のJSON文字列) に分割
+    
+    JSONは「■ 褒めポイント」以降（見出しが無ければ全体）から、3キーを持つ最後の
+    オブジェクトを拾う。見つからなければ simple は None。
+    """
+    head, marker, tail = text.partition(COMBINED_SECTION)
+    if not marker:
+        head, tail = text, text
+    
+    for match in reversed(list(re.finditer(r"\{[^{}]*\}", tail))):
+        try:
+            data = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict) and all(k in data for k in SIMPLE_KEYS):
+            if not marker:
+                head = text[:match.start()] + text[match.end():]
+            simple = json.dumps({k: data[k] for k in SIMPLE_KEYS}, ensure_ascii=False)
+            return head.strip(), simple
+    return head.strip(), None
+
+
+# =============================================================================
+# 画像キャッシュ
+# =============================================================================
+
+class ImageCache:
+    """
+    メモリ予算つきLRUキャッシュ（前処理済み画像・ビジョンエンコーダ出力用）
+    
+    同じ写真を full → simple の順に解析すると、毎回 読み込み・デコード・リサイズ・
+    ビジョンエンコードをやり直していた。キーはファイル内容のハッシュなので、
+    パスが違っても同じ画像ならヒットし、上書きされたファイルはヒットしない。
+    """
+    
+    def __init__(self, budget_mb: float):
+        self.budget = int(budget_mb * 1024 ** 2)
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def key_for(data: bytes) -> str:
+        """ファイル内容 + 前処理設定からキーを作る"""
+        digest = hashlib.blake2b(data, digest_size=16)
+        digest.update(str(CONFIG["max_image_size"]).encode())
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _nbytes(value: Any) -> int:
+        """キャッシュ値のおおよそのメモリ量"""
+        if isinstance(value, Image.Image):
+            return value.width * value.height * len(value.getbands())
+        if torch.is_tensor(value):
+            return value.element_size() * value.nelement()
+        if isinstance(value, (list, tuple)):
+            return sum(ImageCache._nbytes(v) for v in value)
+        return 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+    
+    def put(self, key: str, value: Any):
+        size = self._nbytes(value)
+        if self.budget <= 0 or size > self.budget:
+            return  # 無効（予算0）または単体で予算超え
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.budget:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "used_mb": round(self._bytes / 1024 ** 2, 1),
+                "budget_mb": round(self.budget / 1024 ** 2, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
 # =============================================================================
 # VisionCore クラス
 # =============================================================================
 
+def _memory_in_use(device: str) -> int:
+    """現在のメモリ使用量（bytes）。cudaは確保済みVRAM、cpuはプロセスRSS"""
+    if device == "cuda" and torch.cuda.is_available():
+        return torch.cuda.memory_allocated()
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _uses_model(method):
+    """推論中はモデルを常駐させる（アイドル解放の対象外にする）デコレータ"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._in_use():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class VisionCore:
     """MiniCPM-V 2.6 int4 による画像解析"""
     
-    def __init__(self, model_id: Optional[str] = None):
+    def __init__(self, model_id: Optional[str] = None, device: Optional[str] = None):
         """
         Args:
-            model_id: HuggingFaceモデルID（デフォルト: openbmb/MiniCPM-V-2_6-int4）
+            model_id: HuggingFaceモデルID（デフォルト: GPUはopenbmb/MiniCPM-V-2_6-int4、
+                      CPUはCONFIG["cpu_model_id"]）
+            device: "auto" / "cuda" / "cpu"（デフォルト: CONFIG["device"]）
         """
-        self.model_id = model_id or CONFIG["model_id"]
+        self.device = self._resolve_device(device or CONFIG["device"])
+        if model_id:
+            self.model_id = model_id
+        else:
+            self.model_id = CONFIG["model_id"] if self.device == "cuda" else CONFIG["cpu_model_id"]
         self.model = None
         self.tokenizer = None
         self._loaded = False
+        self._warmed_up = False
+        self.metrics: Dict[str, float] = {}  # 起動時間メトリクス（load_s, warmup_s）
         
+        # 常駐管理: ロードはシングルフライト、推論中カウンタでアイドル解放を抑止
+        self.residency: Optional["ResidencyManager"] = None
+        self.last_used = time.monotonic()
+        self._active = 0
+        self._load_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        
+        # 前処理済み画像とビジョンエンコーダ出力のキャッシュ（キー = ImageCache.key_for）
+        self.image_cache = ImageCache(CONFIG["image_cache_mb"])
+        self.state_cache = ImageCache(CONFIG["state_cache_mb"])
+        self._capture = threading.local()
+        self._states_hooked = False
+        
+    @staticmethod
+    def _resolve_device(device: str) -> str:
+        """"auto" を実デバイスに解決"""
+        if device == "auto":
+            return "cuda" if torch.cuda.is_available() else "cpu"
+        if device == "cuda" and not torch.cuda.is_available():
+            raise RuntimeError("❌ CUDA is not available! Use device='cpu' or VISION_DEVICE=cpu.")
+        if device not in ("cuda", "cpu"):
+            raise ValueError(f"Unknown device: {device}")
+        return device
+    
     def _load_model(self):
-        """モデルを遅延ロード"""
+        """モデルを遅延ロード（同時に呼ばれても1回だけロードする）"""
         if self._loaded:
             return
         
-        # CUDAチェック
-        if not torch.cuda.is_available():
-            raise RuntimeError("❌ CUDA is not available! GPU is required for MiniCPM-V inference.")
+        with self._load_lock:
+            if self._loaded:
+                return  # 待っている間に他スレッドがロード済み
+            
+            start = time.perf_counter()
+            if self.device == "cpu":
+                self._load_model_cpu()
+            else:
+                self._load_model_cuda()
+            self.metrics["load_s"] = round(time.perf_counter() - start, 2)
+            self.metrics["loads"] = self.metrics.get("loads", 0) + 1
+            self._hook_vision_states()
+            logger.info(f"⏱️ モデルロード時間: {self.metrics['load_s']:.1f}秒")
         
+        # 他のVisionCoreの解放はロックの外で（相互ロックを避ける）
+        if self.residency is not None:
+            self.residency.notify_loaded(self)
+    
+    @contextmanager
+    def _in_use(self):
+        """推論中マーク（この間はアイドル解放されない）"""
+        with self._state_lock:
+            self._active += 1
+            self.last_used = time.monotonic()
+        try:
+            self._load_model()
+            yield
+        finally:
+            with self._state_lock:
+                self._active -= 1
+                self.last_used = time.monotonic()
+    
+    def _load_model_cuda(self):
+        """GPU推論用にロード（int4 + FP16）"""
         device_name = torch.cuda.get_device_name(0)
         logger.info(f"🎮 GPU検出: {device_name}")
         logger.info(f"🔄 モデルロード中: {self.model_id}")
@@ -125,27 +431,136 @@ class VisionCore:
         vram_total = torch.cuda.get_device_properties(0).total_memory / (1024 ** 3)
         logger.info(f"📊 VRAM使用量: {vram_gb:.2f} GB / {vram_total:.1f} GB")
     
+    def _load_model_cpu(self):
+        """CPU推論用にロード（bf16/fp32、オプションでLinear層を動的int8量子化）"""
+        if CONFIG["cpu_threads"] > 0:
+            torch.set_num_threads(CONFIG["cpu_threads"])
+        
+        dtype = torch.bfloat16 if CONFIG["cpu_dtype"] == "bfloat16" else torch.float32
+        logger.info(f"🖥️ CPUモード (threads={torch.get_num_threads()}, dtype={CONFIG['cpu_dtype']})")
+        logger.info(f"🔄 モデルロード中: {self.model_id}")
+        
+        from transformers import AutoModel, AutoTokenizer
+        
+        self.model = AutoModel.from_pretrained(
+            self.model_id,
+            trust_remote_code=True,
+            torch_dtype=dtype,
+            low_cpu_mem_usage=True,
+        )
+        self.model.eval()
+        
+        if CONFIG["cpu_quantize"] == "dynamic_int8":
+            # 動的量子化はfp32のLinearのみ対象
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model.float(), {torch.nn.Linear}, dtype=torch.qint8
+            )
+            logger.info("🗜️ 動的int8量子化を適用 (nn.Linear)")
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            self.model_id,
+            trust_remote_code=True,
+        )
+        
+        self._loaded = True
+        logger.info("✅ モデルロード完了 (デバイス: cpu)")
+    
+    def _hook_vision_states(self):
+        """
+        ビジョンエンコーダ出力を横取りするフックを入れる（ロード直後に呼ぶ）
+        
+        MiniCPM-V の generate は get_vllm_embedding() が返す vision_hidden_states を
+        そのまま捨てるため、呼び出しスレッドごとに最後の値を self._capture に残す。
+        次回 chat(vision_hidden_states=...) に渡せばエンコーダを飛ばせる。
+        """
+        original = getattr(self.model, "get_vllm_embedding", None)
+        if original is None:
+            self._states_hooked = False
+            logger.info("ℹ️ get_vllm_embedding が無いモデルのためエンコーダ出力はキャッシュしません")
+            return
+        capture = self._capture
+        
+        def get_vllm_embedding(data):
+            embedding, states = original(data)
+            capture.states = states
+            return embedding, states
+        
+        self.model.get_vllm_embedding = get_vllm_embedding
+        self._states_hooked = True
+    
+    def _read_image(self, image_path: str) -> Tuple[str, bytes]:
+        """ファイルを読み込み、(キャッシュキー, バイト列) を返す"""
+        with open(image_path, "rb") as f:
+            data = f.read()
+        return ImageCache.key_for(data), data
+    
+    def _prepare(self, image_path: str) -> Tuple[str, Image.Image]:
+        """(キャッシュキー, 前処理済み画像) を返す（キャッシュにあればデコードしない）"""
+        key, data = self._read_image(image_path)
+        image = self.image_cache.get(key)
+        if image is None:
+            image = self._resize_image(self._decode_image(data))
+            self.image_cache.put(key, image)
+        return key, image
+    
     def _preprocess_image(self, image_path: str) -> Image.Image:
         """画像の前処理（リサイズでVRAM節約）"""
-        image = Image.open(image_path).convert("RGB")
+        return self._prepare(image_path)[1]
+    
+    def _decode_image(self, source: ImageSource) -> Image.Image:
+        """
+        画像をデコード（共通ローダー: JPEGはdraftで縮小デコード、EXIF回転を反映）
         
-        # 長辺をmax_image_sizeに制限
-        max_size = CONFIG["max_image_size"]
+        6000px級の画像でもフル解像度を展開せずに max_image_size 以上の最小サイズで読む。
+        """
+        return open_reduced(source, CONFIG["max_image_size"])
+    
+    def _resize_image(self, image: Image.Image) -> Image.Image:
+        """長辺をmax_image_sizeに制限"""
         w, h = image.size
+        resized = fit_within(image, CONFIG["max_image_size"])
+        if resized is not image:
+            logger.info(f"📐 画像リサイズ: {w}x{h} → {resized.size[0]}x{resized.size[1]}")
+        return resized
+    
+    def _build_msgs(self, image: Image.Image, mode: str) -> List[Dict[str, Any]]:
+        """解析モードに応じたメッセージを構築"""
+        if mode in ("full", "combined"):
+            return [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": [image, USER_PROMPT if mode == "full" else COMBINED_PROMPT]},
+            ]
+        return [
+            {"role": "user", "content": [image, SIMPLE_PROMPT]},
+        ]
+    
+    def _chat(self, keys: List[str], images: List[Image.Image], mode: str) -> List[str]:
+        """
+        model.chat をバッチで呼ぶ（全画像のエンコーダ出力がキャッシュ済みなら再利用）
         
-        if max(w, h) > max_size:
-            if w > h:
-                new_w = max_size
-                new_h = int(h * max_size / w)
-            else:
-                new_h = max_size
-                new_w = int(w * max_size / h)
-            
-            image = image.resize((new_w, new_h), Image.Resampling.LANCZOS)
-            logger.info(f"📐 画像リサイズ: {w}x{h} → {new_w}x{new_h}")
+        MiniCPM-V は1回の generate でピクセル値とエンコーダ出力を混在できないため、
+        1枚でも未キャッシュならバッチ全体をエンコードし、その出力を画像ごとに保存する。
+        """
+        states = [self.state_cache.get(key) for key in keys] if self._states_hooked else []
+        cached = bool(states) and all(s is not None for s in states)
+        
+        self._capture.states = None
+        answers = self.model.chat(
+            image=None,
+            msgs=[self._build_msgs(image, mode) for image in images],
+            tokenizer=self.tokenizer,
+            vision_hidden_states=states if cached else None,
+            **GENERATION_KWARGS[mode],
+        )
         
-        return image
+        captured = self._capture.states
+        if not cached and captured is not None and len(captured) == len(keys):
+            for key, state in zip(keys, captured):
+                # バッチ全体のテンソルのビューなので、切り出して単体で保持する
+                self.state_cache.put(key, state.clone() if torch.is_tensor(state) else state)
+        return answers
     
+    @_uses_model
     def analyze(self, image_path: str) -> str:
         """
         画像を解析し、4項目のメタデータを生成
@@ -159,36 +574,22 @@ class VisionCore:
         # モデルを遅延ロード
         self._load_model()
         
-        # 画像前処理
-        image = self._preprocess_image(image_path)
+        # 画像前処理（キャッシュ済みならデコードしない）
+        key, image = self._prepare(image_path)
         
         logger.info(f"📸 画像解析中: {Path(image_path).name}")
         
-        # メッセージ構築
-        msgs = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": [image, USER_PROMPT]},
-        ]
-        
-        # 推論実行
-        result = self.model.chat(
-            image=None,
-            msgs=msgs,
-            tokenizer=self.tokenizer,
-            sampling=True,
-            temperature=CONFIG["temperature"],
-            top_p=CONFIG["top_p"],
-            repetition_penalty=CONFIG["repetition_penalty"],
-            max_new_tokens=CONFIG["max_new_tokens"],
-        )
+        # 推論実行（エンコーダ出力がキャッシュ済みなら言語モデルのデコードのみ）
+        result = self._chat([key], [image], "full")[0]
         
-        # VRAM解放
-        self._clear_cache()
+        # メモリ圧迫時のみVRAM解放
+        self._maybe_clear_cache()
         
         logger.info("✅ 解析完了")
         
         return result
     
+    @_uses_model
     def analyze_simple(self, image_path: str) -> str:
         """
         kotaro_api.py互換のシンプルな解析（褒め要素3項目）
@@ -201,47 +602,123 @@ class VisionCore:
             JSON形式の褒め要素（expression, gesture, atmosphere）
         """
         self._load_model()
-        image = self._preprocess_image(image_path)
+        key, image = self._prepare(image_path)
         
-        # V2.1プロンプト: 褒め要素のみ抽出（衣装色・背景禁止）
-        simple_prompt = """あなたは人物写真の魅力を見つけるプロです。
-
-【タスク】
-この写真の人物の「褒めたくなるポイント」を3つ抽出してください。
-
-【抽出する項目】
-1. expression: 表情の魅力（例: はにかんだ笑顔、キラキラした目、優しい微笑み）
-2. gesture: 仕草・ポーズの魅力（例: 可愛いピースサイン、堂々としたポーズ、セクシーな目線）
-3. atmosphere: 全体の雰囲気（例: 透明感がある、オーラがすごい、癒し系）
-
-【禁止事項】
-- 背景の説明は絶対にしない
-- 衣装の色（青系、赤系、白系など）は言及しない
-- 固有名詞・ブランド名は使わない
-- 英語は使わない
-
-【出力形式】JSON形式で回答
-{"expression": "...", "gesture": "...", "atmosphere": "..."}
-
-日本語のみで回答してください："""
+        result = self._chat([key], [image], "simple")[0]
         
-        msgs = [
-            {"role": "user", "content": [image, simple_prompt]},
-        ]
+        self._maybe_clear_cache()
         
-        result = self.model.chat(
-            image=None,
-            msgs=msgs,
-            tokenizer=self.tokenizer,
-            sampling=True,
-            temperature=0.2,  # V2.1: ハルシネーション抑制
-            top_p=0.9,        # V2.1: 確率質量制限
-            max_new_tokens=128,
-        )
+        return result
+    
+    @_uses_model
+    def analyze_combined(self, image_path: str, fallback: bool = True) -> Dict[str, Optional[str]]:
+        """
+        analyze + analyze_simple を1回のエンコード・1回の生成で行う
+        
+        Args:
+            image_path: 画像ファイルのパス
+            fallback: 褒め要素JSONが取り出せなかった場合に analyze_simple で取り直す
+                      （画像・エンコーダ出力はキャッシュ済みなのでデコードのみ）
+            
+        Returns:
+            {"full": 4項目の解析結果, "simple": 褒め要素JSON（取れなければNone）}
+        """
+        self._load_model()
+        key, image = self._prepare(image_path)
         
-        self._clear_cache()
+        logger.info(f"📸 画像解析中 (combined): {Path(image_path).name}")
+        raw = self._chat([key], [image], "combined")[0]
+        full, simple = split_combined_output(raw)
         
-        return result
+        if simple is None and fallback:
+            logger.info("⚠️ combined出力から褒め要素JSONを取り出せず → simpleで再生成")
+            simple = self.analyze_simple(image_path)
+        
+        self._maybe_clear_cache()
+        
+        return {"full": full, "simple": simple}
+    
+    @_uses_model
+    def analyze_batch(
+        self,
+        image_paths: List[str],
+        mode: str = "simple",
+        batch_size: Optional[int] = None,
+    ) -> List[Union[str, Exception]]:
+        """
+        複数画像をまとめて解析（1回のmodel.chatで batch_size 枚を生成）
+        
+        前処理はスレッドプールで並列実行し、結果は入力順で返す。
+        読めない・壊れた画像があってもバッチ全体は止めず、その位置に例外オブジェクトを入れる
+        （バッチ推論自体が失敗した場合は、そのバッチを1枚ずつ推論し直して失敗した画像だけ例外にする）。
+        
+        Args:
+            image_paths: 画像ファイルのパスのリスト
+            mode: "simple"（3項目JSON）、"full"（4項目詳細）、または "combined"
+                  （両方を1回で生成。split_combined_output で分割する）
+            batch_size: 1回の生成に渡す画像数（デフォルト: CONFIG["batch_size"]）
+            
+        Returns:
+            各画像の解析結果（image_pathsと同じ順序。失敗した画像は例外オブジェクト）
+        """
+        if mode not in GENERATION_KWARGS:
+            raise ValueError(f"Unknown mode: {mode}")
+        if not image_paths:
+            return []
+        
+        self._load_model()
+        batch_size = batch_size or CONFIG["batch_size"]
+        
+        # 前処理はパイプラインで先読みし、推論中に次のバッチをデコードしておく
+        pipeline = PreprocessPipeline(self)
+        results: List[Union[str, Exception, None]] = [None] * len(image_paths)
+        indexes: List[int] = []
+        keys: List[str] = []
+        chunk: List[Image.Image] = []
+        
+        def run_chunk():
+            logger.info(f"📸 バッチ解析中: {indexes[0] + 1}-{indexes[-1] + 1} / {len(image_paths)}")
+            
+            try:
+                # msgsをリストのリストで渡すとバッチ生成になり、回答もリストで返る
+                answers: List[Union[str, Exception]] = self._chat(keys, chunk, mode)
+            except Exception as e:
+                if len(chunk) == 1:
+                    answers = [e]
+                else:
+                    logger.warning(f"⚠️ バッチ推論エラー → 1枚ずつ再試行: {e}")
+                    answers = []
+                    for key, image in zip(keys, chunk):
+                        try:
+                            answers.extend(self._chat([key], [image], mode))
+                        except Exception as single_error:
+                            answers.append(single_error)
+            
+            for j, i in enumerate(indexes):
+                results[i] = answers[j] if j < len(answers) else RuntimeError("No answer from model.chat")
+            indexes.clear()
+            keys.clear()
+            chunk.clear()
+            
+            self._maybe_clear_cache()
+        
+        for i, (path, key, image) in enumerate(pipeline.run(image_paths)):
+            if isinstance(image, Exception):
+                logger.warning(f"⚠️ 前処理エラー ({Path(path).name}): {image}")
+                results[i] = image
+                continue
+            indexes.append(i)
+            keys.append(key)
+            chunk.append(image)
+            if len(chunk) == batch_size:
+                run_chunk()
+        if chunk:
+            run_chunk()
+        
+        failed = sum(isinstance(r, Exception) for r in results)
+        logger.info(f"✅ バッチ解析完了 ({len(results)}枚, 失敗 {failed}枚) 前処理: {pipeline.summary()}")
+        
+        return results
     
     def _clear_cache(self):
         """VRAM解放"""
@@ -249,19 +726,275 @@ class VisionCore:
             torch.cuda.empty_cache()
             logger.debug("🧹 VRAM キャッシュクリア")
     
-    def unload(self):
-        """モデルをアンロードしてVRAMを完全解放"""
-        if self._loaded:
-            del self.model
-            del self.tokenizer
-            self.model = None
-            self.tokenizer = None
-            self._loaded = False
-            
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
+    def _maybe_clear_cache(self):
+        """予約済みVRAMが閾値を超えている場合のみ解放（メモリ圧迫ポリシー）"""
+        if not torch.cuda.is_available():
+            return
+        total = torch.cuda.get_device_properties(0).total_memory
+        reserved = torch.cuda.memory_reserved()
+        if reserved / total > CONFIG["empty_cache_threshold"]:
+            logger.info(f"🧹 VRAM圧迫 ({reserved / total:.0%}) → キャッシュクリア")
+            self._clear_cache()
+    
+    @_uses_model
+    def warmup(self) -> Dict[str, float]:
+        """
+        起動時ウォームアップ: 重みのロード + ダミー推論（カーネル初期化・キャッシュ確保）
+        
+        初回の実リクエストが数十秒待たされないよう、サーバー起動時に呼ぶ。
+        
+        Returns:
+            起動時間メトリクス（load_s, warmup_s）
+        """
+        self._load_model()
+        if self._warmed_up:
+            return self.metrics
+        
+        start = time.perf_counter()
+        dummy = Image.new("RGB", (64, 64), (128, 128, 128))
+        self.model.chat(
+            image=None,
+            msgs=[{"role": "user", "content": [dummy, "OK"]}],
+            tokenizer=self.tokenizer,
+            sampling=False,
+            max_new_tokens=4,
+        )
+        self.metrics["warmup_s"] = round(time.perf_counter() - start, 2)
+        self._warmed_up = True
+        logger.info(f"🔥 ウォームアップ完了 ({self.metrics['warmup_s']:.1f}秒)")
+        return self.metrics
+    
+    @property
+    def is_ready(self) -> bool:
+        """ロード済みかつウォームアップ済みか（/ready 判定用）"""
+        return self._loaded and self._warmed_up
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+    
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """画像キャッシュ・エンコーダ出力キャッシュのヒット率とメモリ使用量"""
+        return {"images": self.image_cache.stats(), "vision_states": self.state_cache.stats()}
+    
+    def _unload_locked(self) -> float:
+        """アンロード本体（_load_lock保持中に呼ぶ）。解放量(MB)を返す"""
+        if not self._loaded:
+            return 0.0
+        
+        before = _memory_in_use(self.device)
+        self.state_cache.clear()  # エンコーダ出力はモデルと同じデバイス上にあるため一緒に捨てる
+        self._states_hooked = False
+        del self.model
+        del self.tokenizer
+        self.model = None
+        self.tokenizer = None
+        self._loaded = False
+        self._warmed_up = False
+        
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        
+        reclaimed_mb = max(0, before - _memory_in_use(self.device)) / (1024 ** 2)
+        self.metrics["reclaimed_mb"] = round(reclaimed_mb, 1)
+        logger.info(f"🔌 モデルアンロード完了 (解放: {reclaimed_mb:.0f} MB)")
+        return reclaimed_mb
+    
+    def unload(self) -> float:
+        """
+        モデルをアンロードしてVRAMを完全解放
+        
+        Returns:
+            解放されたメモリ量(MB)
+        """
+        with self._load_lock:
+            return self._unload_locked()
+    
+    def unload_if_idle(self, idle_seconds: float) -> Optional[float]:
+        """
+        推論中でなく idle_seconds 以上使われていなければアンロード
+        
+        判定からアンロード完了まで _state_lock を保持するため、その間に来た推論は
+        アンロード完了を待ってから再ロードする（使用中のモデルを消すことはない）。
+        
+        Returns:
+            解放されたメモリ量(MB)。アンロードしなかった場合はNone
+        """
+        with self._load_lock, self._state_lock:
+            if not self._loaded or self._active:
+                return None
+            if time.monotonic() - self.last_used < idle_seconds:
+                return None
+            return self._unload_locked()
+
+
+# =============================================================================
+# 常駐管理
+# =============================================================================
+
+class ResidencyManager:
+    """
+    VisionCoreの常駐管理（アイドルタイムアウト + LRU）
+    
+    - idle_seconds 以上使われていないモデルをバックグラウンドで解放
+    - ロード済みが max_resident を超えたら、最も長く使われていないものから解放
+    - 再ロードは次の推論時に VisionCore._load_model がシングルフライトで行う
+    """
+    
+    def __init__(
+        self,
+        idle_seconds: float,
+        max_resident: int = 1,
+        check_seconds: float = 30,
+    ):
+        self.idle_seconds = idle_seconds
+        self.max_resident = max_resident
+        self.check_seconds = check_seconds
+        self.cores: List[VisionCore] = []
+        self.reclaimed_mb_total = 0.0
+        self.unloads = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    def register(self, core: VisionCore):
+        with self._lock:
+            if core not in self.cores:
+                self.cores.append(core)
+                core.residency = self
+    
+    def _record(self, reclaimed_mb: Optional[float]):
+        if reclaimed_mb is not None:
+            with self._lock:
+                self.unloads += 1
+                self.reclaimed_mb_total += reclaimed_mb
+    
+    def notify_loaded(self, loaded: VisionCore):
+        """ロード直後に呼ばれ、上限超過分をLRUで解放する"""
+        with self._lock:
+            others = [c for c in self.cores if c is not loaded and c.is_loaded]
+        others.sort(key=lambda c: c.last_used)
+        excess = len(others) + 1 - self.max_resident
+        for core in others[:max(0, excess)]:
+            self._record(core.unload_if_idle(0))
+    
+    def sweep(self):
+        """アイドル中のモデルを解放（1回分）"""
+        with self._lock:
+            cores = list(self.cores)
+        for core in cores:
+            self._record(core.unload_if_idle(self.idle_seconds))
+    
+    def start(self):
+        """バックグラウンドのアイドル監視を開始（idle_seconds <= 0 なら何もしない）"""
+        if self.idle_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        
+        def loop():
+            while not self._stop.wait(self.check_seconds):
+                self.sweep()
+        
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="vision-residency", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "resident": [c.model_id for c in self.cores if c.is_loaded],
+                "unloads": self.unloads,
+                "reclaimed_mb_total": round(self.reclaimed_mb_total, 1),
+            }
+
+
+# =============================================================================
+# 前処理パイプライン
+# =============================================================================
+
+class PreprocessPipeline:
+    """
+    デコード・リサイズをワーカースレッドで先読みするパイプライン
+    
+    [パス] → (スレッドプール: decode/resize) → [有界キュー: prefetch件] → 推論スレッド
+    
+    - 結果は入力順で取り出せる（キューには投入順のFutureを積む）
+    - 1枚の前処理に失敗しても止めず、その画像は (path, None, 例外) として返す
+    - キューが満杯になると投入側がブロックするため、先読みは prefetch 件までに制限される
+    - PILのデコード・リサイズはGILを解放するので、プロセスではなくスレッドで十分
+    """
+    
+    def __init__(self, core: "VisionCore", workers: Optional[int] = None, prefetch: Optional[int] = None):
+        self.core = core
+        self.workers = workers or CONFIG["preprocess_workers"]
+        self.prefetch = prefetch or CONFIG["prefetch"]
+        self.timings: Dict[str, List[float]] = {"decode": [], "resize": [], "wait": []}
+        self._lock = threading.Lock()
+    
+    def _work(self, image_path: str) -> Tuple[str, Image.Image]:
+        key, data = self.core._read_image(image_path)
+        image = self.core.image_cache.get(key)
+        if image is not None:
+            return key, image
+        
+        t0 = time.perf_counter()
+        image = self.core._decode_image(data)
+        t1 = time.perf_counter()
+        image = self.core._resize_image(image)
+        t2 = time.perf_counter()
+        self.core.image_cache.put(key, image)
+        with self._lock:
+            self.timings["decode"].append(t1 - t0)
+            self.timings["resize"].append(t2 - t1)
+        return key, image
+    
+    def run(self, image_paths: List[str]) -> Iterator[Tuple[str, Optional[str], Union[Image.Image, Exception]]]:
+        """(path, キャッシュキー, 前処理済み画像) を入力順に返すジェネレータ（失敗した画像は (path, None, 例外)）"""
+        futures: "queue.Queue" = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preprocess") as pool:
+            def feed():
+                for path in image_paths:
+                    if stop.is_set():
+                        break
+                    futures.put((path, pool.submit(self._work, path)))
+                futures.put(None)
             
-            logger.info("🔌 モデルアンロード完了")
+            feeder = threading.Thread(target=feed, name="preprocess-feeder", daemon=True)
+            feeder.start()
+            try:
+                while True:
+                    t0 = time.perf_counter()
+                    item = futures.get()
+                    if item is None:
+                        break
+                    path, future = item
+                    try:
+                        key, image = future.result()
+                    except Exception as e:
+                        key, image = None, e
+                    # 推論側が前処理を待った時間（0に近いほど先読みが効いている）
+                    self.timings["wait"].append(time.perf_counter() - t0)
+                    yield path, key, image
+            finally:
+                stop.set()
+                # 消費側が途中で抜けた場合もフィーダーを解放する
+                while feeder.is_alive():
+                    try:
+                        futures.get_nowait()
+                    except queue.Empty:
+                        feeder.join(timeout=0.05)
+    
+    def summary(self) -> Dict[str, float]:
+        """ステージ別の平均時間(ms)"""
+        return {
+            f"{stage}_ms": round(1000 * sum(v) / len(v), 1) if v else 0.0
+            for stage, v in self.timings.items()
+        }
 
 
 # =============================================================================
@@ -269,28 +1002,142 @@ class VisionCore:
 # =============================================================================
 
 _vision_core_instance: Optional[VisionCore] = None
+_vision_core_lock = threading.Lock()
+
+# アイドル解放・LRU管理（get_vision_core のインスタンスに適用）
+residency_manager = ResidencyManager(
+    idle_seconds=CONFIG["idle_unload_minutes"] * 60,
+    max_resident=CONFIG["max_resident"],
+    check_seconds=CONFIG["residency_check_seconds"],
+)
 
 
 def get_vision_core() -> VisionCore:
-    """シングルトンインスタンスを取得"""
+    """シングルトンインスタンスを取得（スレッドセーフ）"""
     global _vision_core_instance
     if _vision_core_instance is None:
-        _vision_core_instance = VisionCore()
+        with _vision_core_lock:
+            if _vision_core_instance is None:
+                core = VisionCore()
+                residency_manager.register(core)
+                residency_manager.start()
+                _vision_core_instance = core
     return _vision_core_instance
 
 
+# =============================================================================
+# 動的バッチ（同時リクエストのまとめ上げ）
+# =============================================================================
+
+class BatchDispatcher:
+    """
+    並行する analyze_simple 要求を短い時間窓でまとめ、1回の analyze_batch で処理する
+    
+    呼び出し側は submit() で Future を受け取り、自分の結果だけを待つ。
+    推論は専用スレッド1本で直列に行うため、モデルへの同時アクセスも起きない。
+    analyze_batch は画像ごとに失敗を返すので、読めない画像を送った呼び出し側だけが例外を受け取る
+    （同じバッチにまとめられた他の呼び出し側には影響しない）。
+    """
+    
+    def __init__(
+        self,
+        core_getter: Optional[Callable[[], VisionCore]] = None,
+        mode: str = "simple",
+        window_ms: Optional[float] = None,
+        max_batch: Optional[int] = None,
+    ):
+        self.core_getter = core_getter or get_vision_core
+        self.mode = mode
+        self.window = (window_ms if window_ms is not None else CONFIG["dispatch_window_ms"]) / 1000
+        self.max_batch = max_batch or CONFIG["batch_size"]
+        self.batches = 0
+        self.requests = 0
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="vision-dispatcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, image_path: str) -> Future:
+        """解析要求を登録し、結果を受け取るFutureを返す"""
+        future: Future = Future()
+        self._queue.put((image_path, future))
+        return future
+    
+    def analyze(self, image_path: str, timeout: Optional[float] = None) -> str:
+        """submit() して結果を待つ（同期版）"""
+        return self.submit(image_path).result(timeout=timeout)
+    
+    def _collect(self) -> List[Tuple[str, Future]]:
+        """最初の1件を待ち、時間窓内に届いた要求を max_batch 件まで集める"""
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+    
+    def _run(self):
+        while True:
+            items = [(p, f) for p, f in self._collect() if f.set_running_or_notify_cancel()]
+            if not items:
+                continue
+            try:
+                results = self.core_getter().analyze_batch(
+                    [p for p, _ in items], mode=self.mode, batch_size=len(items)
+                )
+            except Exception as e:
+                # モデルのロード失敗など、画像によらないエラーはバッチ全員に返す
+                results = [e] * len(items)
+            for (_, future), result in zip(items, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            for _, future in items[len(results):]:
+                # 結果が要求数より少なかった場合も、待ち続ける呼び出し側を残さない
+                future.set_exception(RuntimeError("analyze_batch returned fewer results than requests"))
+            self.batches += 1
+            self.requests += len(items)
+    
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+_dispatcher_instance: Optional[BatchDispatcher] = None
+
+
+def get_dispatcher() -> BatchDispatcher:
+    """動的バッチのシングルトンを取得（スレッドセーフ）"""
+    global _dispatcher_instance
+    if _dispatcher_instance is None:
+        with _vision_core_lock:
+            if _dispatcher_instance is None:
+                _dispatcher_instance = BatchDispatcher()
+    return _dispatcher_instance
+
+
 def analyze_image_minicpm(image_path: str) -> str:
     """
     kotaro_api.py からの呼び出し用関数
     
+    複数スレッド（FastAPIのスレッドプール等）から同時に呼ばれても安全。
+    同時に届いた要求は BatchDispatcher がまとめてバッチ推論する。
+    
     Args:
         image_path: 画像ファイルのパス
         
     Returns:
         画像解析結果（3項目）
     """
-    vision = get_vision_core()
-    return vision.analyze_simple(image_path)
+    return get_dispatcher().analyze(image_path)
 
 
 # =============================================================================
@@ -302,8 +1149,11 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description="MiniCPM-V 2.6 Vision Core")
     parser.add_argument("--image", type=str, required=True, help="画像ファイルのパス")
-    parser.add_argument("--mode", type=str, default="simple", choices=["simple", "full"],
-                        help="解析モード: simple=3項目, full=4項目詳細")
+    parser.add_argument("--mode", type=str, default="simple", choices=["simple", "full", "combined"],
+                        help="解析モード: simple=3項目, full=4項目詳細, combined=両方を1回で")
+    parser.add_argument("--device", type=str, default=None, choices=["auto", "cuda", "cpu"],
+                        help="推論デバイス（デフォルト: CONFIG['device']）")
+    parser.add_argument("--warmup", action="store_true", help="解析前にウォームアップして起動時間を表示")
     
     args = parser.parse_args()
     
@@ -311,10 +1161,16 @@ if __name__ == "__main__":
     print("👁️  MiniCPM-V 2.6 Vision Core")
     print("=" * 60)
     
-    vision = VisionCore()
+    vision = VisionCore(device=args.device)
+    
+    if args.warmup:
+        print(f"🔥 起動メトリクス: {vision.warmup()}")
     
     if args.mode == "full":
         result = vision.analyze(args.image)
+    elif args.mode == "combined":
+        combined = vision.analyze_combined(args.image)
+        result = f"{combined['full']}\n\n{COMBINED_SECTION}\n{combined['simple']}"
     else:
         result = vision.analyze_simple(args.image)
     